@@ -0,0 +1,118 @@
+"""
+Measures the latency of the problem preview (ui.preview.MathPreview): the
+time from an edit to the preview showing it. A problem is typed into the
+preview one character at a time, at a steady pace. Each render's latency is
+measured from its last edit and from its first one, which includes the
+debounce; the benchmark exits with status 1 if the median latency from the
+last edit exceeds the budget, or the median from the first edit exceeds
+MAX_PREVIEW_WAIT plus the budget.
+
+Run from the repository's root directory:
+
+    python -m benchmarks.preview [keystroke_interval_ms] [budget_ms]
+
+The benchmark works on a throwaway profile in a temporary directory and
+uses Qt's offscreen platform unless QT_QPA_PLATFORM is set.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+
+# keep the user's data out of reach: ProgramPaths resolves paths from $HOME.
+os.environ["HOME"] = tempfile.mkdtemp(prefix="maths_problems_bench_")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QCoreApplication, Qt, QTimer  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from ui.preview import (  # noqa: E402
+    LATENCY_BUDGET,
+    MAX_PREVIEW_WAIT,
+    PREVIEW_DELAY,
+    MathPreview,
+)
+from ui.web import NoInternetProfile  # noqa: E402
+
+QUESTION = (
+    "Let $f(x) = \\sum_{n=0}^{\\infty} \\frac{x^n}{n!}$. Show that "
+    "$f'(x) = f(x)$ and compute $\\int_0^1 f(x)\\,dx$."
+)
+ANSWER = (
+    "Differentiating term by term, "
+    "$$f'(x) = \\sum_{n=1}^{\\infty} \\frac{x^{n-1}}{(n-1)!} = f(x),$$ "
+    "so $\\int_0^1 f(x)\\,dx = f(1) - f(0) = e - 1$."
+)
+# time (in ms) the benchmark waits for the last edit to be shown.
+SETTLE_TIME = 5000
+
+
+def main() -> None:
+    interval = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else LATENCY_BUDGET
+
+    QCoreApplication.setAttribute(
+        Qt.ApplicationAttribute.AA_ShareOpenGLContexts
+    )
+    app = QApplication()
+    preview = MathPreview(NoInternetProfile())
+    preview.resize(800, 600)
+    preview.show()
+
+    # the question is typed, then the answer.
+    edits = [(QUESTION[:i], "") for i in range(1, len(QUESTION) + 1)] + [
+        (QUESTION, ANSWER[:i]) for i in range(1, len(ANSWER) + 1)
+    ]
+
+    def type_next() -> None:
+        if edits:
+            preview.set_contents(*edits.pop(0))
+            QTimer.singleShot(interval, type_next)
+        else:
+            QTimer.singleShot(SETTLE_TIME, app.quit)
+
+    def start(ok: bool) -> None:
+        preview.loadFinished.disconnect(start)
+        if not ok:
+            print("FAIL: the preview page could not be loaded.")
+            app.exit(1)
+            return
+        type_next()
+
+    preview.loadFinished.connect(start)
+    if app.exec() != 0:
+        sys.exit(1)
+
+    latencies = list(preview.latencies)
+    first_edit_latencies = list(preview.first_edit_latencies)
+    if not latencies:
+        print("FAIL: no edit was shown.")
+        sys.exit(1)
+
+    median = statistics.median(latencies)
+    first_edit_median = statistics.median(first_edit_latencies)
+    first_edit_budget = MAX_PREVIEW_WAIT + budget
+    print(
+        f"{len(latencies)} renders, one edit every {interval} ms, "
+        f"debounced by {PREVIEW_DELAY} ms (at most {MAX_PREVIEW_WAIT} ms)"
+    )
+    print(
+        f"{'median latency':<24}{median:>10.1f} ms   (budget {budget:.0f} ms)"
+    )
+    print(f"{'slowest latency':<24}{max(latencies):>10.1f} ms")
+    print(
+        f"{'median from 1st edit':<24}{first_edit_median:>10.1f} ms   "
+        f"(budget {first_edit_budget:.0f} ms)"
+    )
+    print(
+        f"{'slowest from 1st edit':<24}{max(first_edit_latencies):>10.1f} ms"
+    )
+
+    if median > budget or first_edit_median > first_edit_budget:
+        print("FAIL: the preview is over budget.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares the per-row cost of the Problem records yielded by ProblemDB with
+the per-row dictionaries the generators used to build from sqlite3.Row.
+
+Run from the repository's root directory:
+
+    python -m benchmarks.problem_rows [number_of_rows]
+
+The benchmark works on a throwaway database in a temporary directory.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List
+
+# keep the user's data out of reach: ProgramPaths resolves paths from $HOME.
+os.environ["HOME"] = tempfile.mkdtemp(prefix="maths_problems_bench_")
+
+from db.connection import ConnectionManager  # noqa: E402
+from db.db import check_or_create_user_db  # noqa: E402
+from db.problem_db import ProblemDB  # noqa: E402
+
+QUERY = "SELECT * FROM problems;"
+
+
+def dict_rows() -> Iterator[Dict[str, Any]]:
+    """
+    The previous implementation: sqlite3.Row copied into a new dict.
+    """
+    cursor = ConnectionManager.get_connection().cursor()
+    cursor.row_factory = sqlite3.Row
+    for problem in cursor.execute(QUERY):
+        problem_dict = {}
+        for key in problem.keys():
+            problem_dict[key] = problem[key]
+        yield problem_dict
+
+
+def problem_rows() -> Iterator[Any]:
+    return ProblemDB._iter_problems(QUERY, ())
+
+
+def measure(name: str, rows: Callable[[], Iterator[Any]], n: int) -> None:
+    # time: stream every row, touching one column.
+    start = time.perf_counter()
+    for row in rows():
+        row["problem_deck"]
+    streaming = time.perf_counter() - start
+
+    # memory: keep every row alive at once.
+    tracemalloc.start()
+    kept: List[Any] = list(rows())
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    scale = 100_000 / n
+    print(
+        f"{name:<16}"
+        f"{streaming * scale * 1000:>12.1f} ms"
+        f"{size * scale / 2**20:>12.1f} MiB"
+    )
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    check_or_create_user_db()
+    ProblemDB.add_problems_bulk(
+        (
+            {
+                "question": f"Compute $\\int_0^{i} x^2 \\, dx$. " * 4,
+                "answer": f"$\\frac{{{i}^3}}{{3}}$. " * 4,
+            },
+            f"deck {i % 20}",
+            [f"tag {i % 50}"],
+        )
+        for i in range(n)
+    )
+
+    print(f"per 100k rows ({n} rows measured)")
+    print(f"{'':<16}{'time':>15}{'memory':>16}")
+    measure("dict per row", dict_rows, n)
+    measure("Problem record", problem_rows, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measures the cold start of the GUI: the time to import the main window's
+module and the time from the start of the process to the first paint of the
+main window. Each run is a fresh interpreter; the medians are compared with
+the budgets and the benchmark exits with status 1 if one is exceeded, or if
+QtWebEngine was loaded before the first paint.
+
+Run from the repository's root directory:
+
+    python -m benchmarks.startup [runs] [import_budget_ms] [paint_budget_ms]
+
+The benchmark works on a throwaway database in a temporary directory and
+uses Qt's offscreen platform unless QT_QPA_PLATFORM is set.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# budgets (in ms) of the medians.
+IMPORT_BUDGET = 400.0
+FIRST_PAINT_BUDGET = 1500.0
+
+# marker of the child processes' command line.
+CHILD_FLAG = "--child"
+
+
+def child() -> None:
+    """
+    Starts the GUI the way main.py does, without preloading, and prints the
+    measures as JSON once the main window is first painted.
+    """
+    start = time.perf_counter()
+
+    import db.db as db
+
+    db.check_or_create_user_db()
+
+    before_import = time.perf_counter()
+    from ui import ui
+
+    imported = time.perf_counter()
+
+    from PySide6.QtCore import QCoreApplication, QEvent, QObject, Qt
+    from PySide6.QtWidgets import QApplication
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+            if event.type() == QEvent.Type.Paint:
+                print(
+                    json.dumps(
+                        {
+                            "import": (imported - before_import) * 1000,
+                            "paint": (time.perf_counter() - start) * 1000,
+                            "webengine": any(
+                                name.startswith("PySide6.QtWebEngine")
+                                for name in sys.modules
+                            ),
+                        }
+                    ),
+                    flush=True,
+                )
+                QApplication.quit()
+            return False
+
+    QCoreApplication.setAttribute(
+        Qt.ApplicationAttribute.AA_ShareOpenGLContexts
+    )
+    app = QApplication()
+    window = ui.MainWindow(preload=False)
+    watcher = PaintWatcher()
+    window.installEventFilter(watcher)
+    window.show()
+    app.exec()
+
+
+def run_once(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", CHILD_FLAG],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    import_budget = float(sys.argv[2]) if len(sys.argv) > 2 else IMPORT_BUDGET
+    paint_budget = (
+        float(sys.argv[3]) if len(sys.argv) > 3 else FIRST_PAINT_BUDGET
+    )
+
+    # keep the user's data out of reach: ProgramPaths resolves paths from
+    # $HOME.
+    env = dict(os.environ)
+    env["HOME"] = tempfile.mkdtemp(prefix="maths_problems_bench_")
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    # the first run creates the database; it is not measured.
+    run_once(env)
+    results = [run_once(env) for _ in range(runs)]
+
+    import_time = statistics.median(r["import"] for r in results)
+    paint_time = statistics.median(r["paint"] for r in results)
+    webengine = any(r["webengine"] for r in results)
+
+    print(f"median of {runs} runs")
+    print(
+        f"{'import ui.ui':<24}{import_time:>10.1f} ms"
+        f"   (budget {import_budget:.0f} ms)"
+    )
+    print(
+        f"{'first paint':<24}{paint_time:>10.1f} ms"
+        f"   (budget {paint_budget:.0f} ms)"
+    )
+
+    failures = []
+    if import_time > import_budget:
+        failures.append("the import of ui.ui is over budget")
+    if paint_time > paint_budget:
+        failures.append("the first paint is over budget")
+    if webengine:
+        failures.append("QtWebEngine was loaded before the first paint")
+
+    for failure in failures:
+        print(f"FAIL: {failure}.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    if CHILD_FLAG in sys.argv:
+        child()
+    else:
+        main()
@@ -0,0 +1,283 @@
+import datetime
+import io
+import json
+import os
+import sqlite3
+import zipfile
+from typing import Any, Callable, Dict, Generator, Iterable, List, Tuple
+
+from db.connection import ConnectionManager
+from db.deck_db import DeckDB
+from db.media_db import MediaDB
+from db.migrations import SCHEMA_VERSION
+from db.problem_db import PROBLEM_STATE, ProblemDB
+from db.tag_db import TagDB
+from utils.program_paths import ProgramPaths
+
+# version of the archive layout written by Archive.export_collection:
+#
+#   manifest.json    {"format", "schema_version", "created", "problems"}
+#   decks.ndjson     one {"name"} object per line
+#   tags.ndjson      one {"name"} object per line
+#   problems.ndjson  one {"content", "deck", "tags", "state"} object per
+#                    line (deck is null for a problem without a deck, state
+#                    maps the keys of ProblemDB's PROBLEM_STATE to values)
+#   media/...        files of the media directory used by the problems
+ARCHIVE_FORMAT = 1
+
+# number of decks or tags created per statement when importing.
+IMPORT_CHUNK_SIZE = 1000
+
+
+class Archive:
+    """
+    Exports the current user's collection to a zip archive and imports such
+    archives back. Both directions stream: problems are written and read one
+    line at a time and media files are copied in blocks, so memory use does
+    not grow with the size of the collection.
+    """
+
+    @staticmethod
+    def export_collection(path: str) -> int:
+        """
+        Writes every deck, tag and problem of the db, and the media files the
+        problems refer to, to the archive 'path'. Returns the number of
+        problems exported.
+        """
+        n_problems = 0
+
+        try:
+            with zipfile.ZipFile(
+                path, "w", compression=zipfile.ZIP_DEFLATED
+            ) as archive:
+                Archive._write_lines(
+                    archive,
+                    "decks.ndjson",
+                    ({"name": name} for name in DeckDB.get_decks_all()),
+                )
+                Archive._write_lines(
+                    archive,
+                    "tags.ndjson",
+                    ({"name": name} for name in TagDB.get_all_tags()),
+                )
+
+                with archive.open(
+                    Archive._member_info("problems.ndjson"),
+                    "w",
+                    force_zip64=True,
+                ) as member:
+                    for content, deck, tags, state in Archive._iter_problems():
+                        member.write(
+                            json.dumps(
+                                {
+                                    "content": content,
+                                    "deck": deck,
+                                    "tags": tags,
+                                    "state": state,
+                                }
+                            ).encode()
+                            + b"\n"
+                        )
+                        n_problems += 1
+
+                media_dir = ProgramPaths.get_user_media_dir()
+                for (name,) in ConnectionManager.get_connection().execute(
+                    "SELECT DISTINCT media_name FROM problem_media "
+                    "ORDER BY media_name;"
+                ):
+                    file_path = os.path.join(media_dir, name)
+                    if os.path.isfile(file_path):
+                        archive.write(file_path, f"media/{name}")
+
+                archive.writestr(
+                    "manifest.json",
+                    json.dumps(
+                        {
+                            "format": ARCHIVE_FORMAT,
+                            "schema_version": SCHEMA_VERSION,
+                            "created": datetime.datetime.now().isoformat(
+                                timespec="seconds"
+                            ),
+                            "problems": n_problems,
+                        }
+                    ),
+                )
+
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return n_problems
+
+    @staticmethod
+    def import_collection(
+        path: str,
+        chunk_size: int = 1000,
+        progress: Callable[[int, float], None] | None = None,
+    ) -> int:
+        """
+        Adds the decks, tags, problems and media files of the archive 'path'
+        to the db. Problems go through ProblemDB.add_problems_bulk (see it
+        for 'chunk_size' and 'progress'), so problems already stored are
+        skipped. Media files whose name is already taken are left untouched,
+        and files already stored under another name are not copied again.
+        Returns the number of problems added.
+        """
+        try:
+            archive = zipfile.ZipFile(path)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise Exception(f"Invalid archive '{path}': {e}")
+
+        with archive:
+            Archive._check_manifest(archive)
+
+            # files first, so that the problems' references to them are
+            # recorded as the problems are added.
+            Archive._extract_media(archive)
+
+            for chunk in Archive._chunks(
+                Archive._read_lines(archive, "decks.ndjson")
+            ):
+                DeckDB.get_or_add_decks(record["name"] for record in chunk)
+            for chunk in Archive._chunks(
+                Archive._read_lines(archive, "tags.ndjson")
+            ):
+                TagDB.get_or_add_tags(record["name"] for record in chunk)
+
+            # archives written before decks could be null have '' for
+            # problems without a deck, and those written before problems
+            # kept their state have none: they are imported as new.
+            added = ProblemDB.add_problems_bulk(
+                (
+                    (
+                        record["content"],
+                        record["deck"] or None,
+                        record["tags"],
+                        record.get("state") or {},
+                    )
+                    for record in Archive._read_lines(
+                        archive, "problems.ndjson"
+                    )
+                ),
+                chunk_size=chunk_size,
+                progress=progress,
+            )
+
+        return added
+
+    @staticmethod
+    def _iter_problems() -> (
+        Generator[
+            Tuple[Dict, str | None, List[str], Dict[str, Any]], None, None
+        ]
+    ):
+        """
+        Generator function that returns a (content, deck_name, tags, state)
+        tuple for every problem, read with a single query. deck_name is None
+        for problems without a deck; state maps the keys of PROBLEM_STATE to
+        the problem's values.
+        """
+        state_columns = [column for column, _ in PROBLEM_STATE.values()]
+        cursor = ConnectionManager.get_connection().execute(f"""
+            SELECT
+                problems.problem_content,
+                decks.deck_name,
+                (
+                    SELECT json_group_array(tags.tag_name)
+                    FROM problems_tags
+                    JOIN tags ON tags.tag_id = problems_tags.tag_id
+                    WHERE problems_tags.problem_id = problems.problem_id
+                ),
+                {", ".join(f"problems.{column}" for column in state_columns)}
+            FROM problems
+            LEFT JOIN decks ON decks.deck_id = problems.problem_deck
+            ORDER BY problems.problem_id;
+            """)
+        for content, deck, tags, *state in cursor:
+            yield (
+                json.loads(content),
+                deck,
+                json.loads(tags),
+                dict(zip(PROBLEM_STATE, state)),
+            )
+
+    @staticmethod
+    def _write_lines(
+        archive: zipfile.ZipFile, name: str, records: Iterable[Dict]
+    ) -> None:
+        with archive.open(
+            Archive._member_info(name), "w", force_zip64=True
+        ) as member:
+            for record in records:
+                member.write(json.dumps(record).encode() + b"\n")
+
+    @staticmethod
+    def _member_info(name: str) -> zipfile.ZipInfo:
+        # members written through ZipFile.open() get no timestamp otherwise.
+        info = zipfile.ZipInfo(
+            name, date_time=datetime.datetime.now().timetuple()[:6]
+        )
+        info.compress_type = zipfile.ZIP_DEFLATED
+        return info
+
+    @staticmethod
+    def _read_lines(
+        archive: zipfile.ZipFile, name: str
+    ) -> Generator[Dict, None, None]:
+        try:
+            member = archive.open(name)
+        except KeyError:
+            raise Exception(f"Invalid archive: '{name}' is missing.")
+
+        with io.TextIOWrapper(member, encoding="utf-8") as lines:
+            for line_number, line in enumerate(lines, start=1):
+                if line.strip() == "":
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise Exception(
+                        f"Invalid archive: line {line_number} of '{name}': {e}"
+                    )
+
+    @staticmethod
+    def _chunks(
+        records: Iterable[Dict],
+    ) -> Generator[List[Dict], None, None]:
+        chunk: List[Dict] = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _check_manifest(archive: zipfile.ZipFile) -> Dict:
+        try:
+            manifest = json.loads(archive.read("manifest.json"))
+        except KeyError:
+            raise Exception("Invalid archive: 'manifest.json' is missing.")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid archive: 'manifest.json': {e}")
+
+        if manifest.get("format") != ARCHIVE_FORMAT:
+            raise Exception(
+                f"Unsupported archive format: {manifest.get('format')}."
+            )
+        return manifest
+
+    @staticmethod
+    def _extract_media(archive: zipfile.ZipFile) -> None:
+        """
+        Adds the media files of the archive to the media store, one block at
+        a time (see MediaDB.add_named_stream).
+        """
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.startswith("media/"):
+                continue
+
+            with archive.open(info) as source:
+                MediaDB.add_named_stream(
+                    source, info.filename[len("media/") :]
+                )
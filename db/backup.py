@@ -0,0 +1,185 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import List
+
+from db.connection import ConnectionManager
+from db.migrations import upgrade
+from utils.program_paths import ProgramPaths
+
+# pages copied per backup step, and pause between steps (in seconds). Other
+# connections can write to the db between steps.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+
+# defaults of Backup.configure.
+BACKUP_EVERY_N_WRITES = 200
+BACKUP_RETENTION = 10
+
+# with microseconds, so backups made within the same second do not collide.
+BACKUP_DATE_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+
+class Backup:
+    """
+    Online backups of the current user's database, made with the SQLite
+    backup API in small steps so the db stays usable while it runs. Once
+    enabled, a backup is started in a background thread after every
+    'every_n_writes' committed transactions, and only the newest
+    'retention' backups are kept.
+    """
+
+    _lock = threading.Lock()
+    _running = threading.Lock()
+    _every_n_writes = BACKUP_EVERY_N_WRITES
+    _retention = BACKUP_RETENTION
+    _writes = 0
+
+    @staticmethod
+    def configure(
+        every_n_writes: int = BACKUP_EVERY_N_WRITES,
+        retention: int = BACKUP_RETENTION,
+    ) -> None:
+        """
+        Sets how many committed transactions trigger an automatic backup
+        (0 disables them) and how many backups are kept.
+        """
+        with Backup._lock:
+            Backup._every_n_writes = every_n_writes
+            Backup._retention = max(retention, 1)
+
+    @staticmethod
+    def enable() -> None:
+        """
+        Starts counting committed transactions for automatic backups.
+        """
+        ConnectionManager.add_commit_hook(Backup._count_write)
+
+    @staticmethod
+    def create_backup(wait: bool = False) -> str | None:
+        """
+        Writes a backup of the db to the backups directory, removes the
+        oldest backups beyond the retention limit and returns the backup's
+        path. If another backup is already running, waits for it to finish
+        if 'wait', otherwise returns None.
+        """
+        if not Backup._running.acquire(blocking=wait):
+            return None
+
+        try:
+            start = time.perf_counter()
+            backups_dir = ProgramPaths.get_user_backups_dir()
+            date = datetime.datetime.now().strftime(BACKUP_DATE_FORMAT)
+            name = f"{ProgramPaths.get_username()}-{date}.db"
+            sequence = 1
+            while os.path.exists(os.path.join(backups_dir, name)):
+                sequence += 1
+                name = f"{ProgramPaths.get_username()}-{date}-{sequence}.db"
+            path = os.path.join(backups_dir, name)
+            temp_path = os.path.join(backups_dir, f".tmp-{name}")
+
+            Backup._copy(ProgramPaths.get_user_db_path(), temp_path)
+            os.replace(temp_path, path)
+            Backup._rotate()
+
+            print(
+                f"Backup '{path}' written in "
+                f"{time.perf_counter() - start:.2f} s "
+                f"({os.path.getsize(path) / 2**20:.1f} MiB)."
+            )
+            return path
+
+        except (OSError, sqlite3.Error) as e:
+            raise Exception("Failed to back up database:", e)
+        finally:
+            Backup._running.release()
+
+    @staticmethod
+    def list_backups() -> List[str]:
+        """
+        Returns the paths of the current user's backups, newest first.
+        """
+        backups_dir = ProgramPaths.get_user_backups_dir()
+        prefix = f"{ProgramPaths.get_username()}-"
+        return [
+            os.path.join(backups_dir, name)
+            for name in sorted(os.listdir(backups_dir), reverse=True)
+            if name.startswith(prefix) and name.endswith(".db")
+        ]
+
+    @staticmethod
+    def restore_backup(path: str) -> None:
+        """
+        Replaces the contents of the db with the backup 'path'. A backup of
+        the current contents is made first (after any backup already
+        running); the db is left untouched if it fails. The backup is copied
+        through the calling thread's connection in a single step, hence a
+        single write transaction: the connections of other threads stay
+        open and see the restored contents on their next read. Backups made
+        by older versions of the program are upgraded to the current schema.
+        """
+        if not os.path.isfile(path):
+            raise Exception(f"The backup '{path}' does not exist.")
+
+        if Backup.create_backup(wait=True) is None:
+            raise Exception(
+                "Failed to restore database: the current contents could not "
+                "be backed up."
+            )
+
+        try:
+            source = sqlite3.connect(path)
+            try:
+                source.backup(ConnectionManager.get_connection())
+            finally:
+                source.close()
+        except sqlite3.Error as e:
+            raise Exception("Failed to restore database:", e)
+
+        upgrade()
+        print(f"Restored backup '{path}'.")
+
+    @staticmethod
+    def _copy(source_path: str, target_path: str) -> None:
+        """
+        Copies the database 'source_path' into 'target_path' with the backup
+        API, BACKUP_PAGES_PER_STEP pages at a time.
+        """
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(
+                target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP
+            )
+        finally:
+            target.close()
+            source.close()
+
+    @staticmethod
+    def _rotate() -> None:
+        backups = Backup.list_backups()
+        for path in backups[Backup._retention :]:
+            os.remove(path)
+
+    @staticmethod
+    def _count_write() -> None:
+        with Backup._lock:
+            if Backup._every_n_writes <= 0:
+                return
+            Backup._writes += 1
+            if Backup._writes < Backup._every_n_writes:
+                return
+            Backup._writes = 0
+
+        threading.Thread(
+            target=Backup._background_backup, name="backup", daemon=True
+        ).start()
+
+    @staticmethod
+    def _background_backup() -> None:
+        try:
+            Backup.create_backup()
+        except Exception as e:
+            print(e)
@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from db.connection import ConnectionManager
+
+# minimum time (in seconds) between two checks of PRAGMA data_version.
+DATA_VERSION_CHECK_INTERVAL = 1.0
+
+
+class Catalog:
+    """
+    Process-wide cache of the decks and tags of the current user's db: their
+    names sorted, and id -> name and name -> id maps. Reads are served from
+    memory; the cache is reloaded, with one query, after it is invalidated.
+
+    DeckDB and TagDB invalidate it whenever they change decks or tags (once
+    more when their transaction commits), and the UI does so when the whole
+    collection is replaced (before it publishes CollectionReplaced, e.g.
+    after an import or a restore), so changes made by this process show up
+    at once. Changes made by other processes are noticed through PRAGMA
+    data_version, checked at most every DATA_VERSION_CHECK_INTERVAL seconds
+    on the calling thread's connection (see ConnectionManager). It does not
+    change for that connection's own commits, so the reviews and edits the
+    DBWorker writes do not reload the cache; data_version can not tell
+    which tables changed, so a commit from any other connection does.
+    """
+
+    _lock = threading.RLock()
+    _local = threading.local()
+    _loaded = False
+    _deck_items: List[Tuple[int, str]] = []
+    _tag_items: List[Tuple[int, str]] = []
+    _deck_ids: Dict[str, int] = {}
+    _deck_names: Dict[int, str] = {}
+    _tag_ids: Dict[str, int] = {}
+    _tag_names: Dict[int, str] = {}
+    _checked_at = 0.0
+
+    @staticmethod
+    def decks() -> List[str]:
+        """
+        Returns the names of every deck, sorted.
+        """
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return [name for _, name in Catalog._deck_items]
+
+    @staticmethod
+    def tags() -> List[str]:
+        """
+        Returns the names of every tag, sorted.
+        """
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return [name for _, name in Catalog._tag_items]
+
+    @staticmethod
+    def deck_items() -> List[Tuple[int, str]]:
+        """
+        Returns a (deck_id, deck_name) tuple for every deck, sorted by name.
+        """
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return list(Catalog._deck_items)
+
+    @staticmethod
+    def tag_items() -> List[Tuple[int, str]]:
+        """
+        Returns a (tag_id, tag_name) tuple for every tag, sorted by name.
+        """
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return list(Catalog._tag_items)
+
+    @staticmethod
+    def deck_exists(deck_name: str) -> bool:
+        return Catalog.deck_id(deck_name) is not None
+
+    @staticmethod
+    def deck_id(deck_name: str) -> int | None:
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return Catalog._deck_ids.get(deck_name)
+
+    @staticmethod
+    def deck_name(deck_id: int) -> str | None:
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return Catalog._deck_names.get(deck_id)
+
+    @staticmethod
+    def tag_id(tag_name: str) -> int | None:
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return Catalog._tag_ids.get(tag_name)
+
+    @staticmethod
+    def tag_name(tag_id: int) -> str | None:
+        with Catalog._lock:
+            Catalog._ensure_loaded()
+            return Catalog._tag_names.get(tag_id)
+
+    @staticmethod
+    def invalidate() -> None:
+        """
+        Drops the cached decks and tags; the next read reloads them.
+        """
+        with Catalog._lock:
+            Catalog._loaded = False
+
+    @staticmethod
+    def mark_changed() -> None:
+        """
+        Called by the methods that add or remove decks or tags. Inside a
+        transaction, the cache is invalidated again once it commits, so that
+        a reload in between cannot keep the uncommitted state.
+        """
+        Catalog.invalidate()
+        if ConnectionManager.get_connection().in_transaction:
+            Catalog._local.dirty = True
+            ConnectionManager.add_commit_hook(Catalog._committed)
+
+    @staticmethod
+    def _committed() -> None:
+        if getattr(Catalog._local, "dirty", False):
+            Catalog._local.dirty = False
+            Catalog.invalidate()
+
+    @staticmethod
+    def _ensure_loaded() -> None:
+        """
+        Reloads the cache if it was invalidated or if another connection
+        changed the db since the calling thread last checked. Must hold
+        Catalog._lock.
+        """
+        now = time.monotonic()
+        if Catalog._loaded and now - Catalog._checked_at < (
+            DATA_VERSION_CHECK_INTERVAL
+        ):
+            return
+
+        try:
+            connection = ConnectionManager.get_connection()
+            (data_version,) = connection.execute(
+                "PRAGMA data_version;"
+            ).fetchone()
+            Catalog._checked_at = now
+            # versions of different connections can not be compared.
+            seen = (connection, data_version)
+            last_seen = getattr(Catalog._local, "seen", None)
+            if Catalog._loaded and last_seen == seen:
+                return
+
+            decks = connection.execute(
+                "SELECT deck_id, deck_name FROM decks ORDER BY deck_name;"
+            ).fetchall()
+            tags = connection.execute(
+                "SELECT tag_id, tag_name FROM tags ORDER BY tag_name;"
+            ).fetchall()
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        Catalog._deck_items = decks
+        Catalog._tag_items = tags
+        Catalog._deck_ids = {name: id for id, name in decks}
+        Catalog._deck_names = dict(decks)
+        Catalog._tag_ids = {name: id for id, name in tags}
+        Catalog._tag_names = dict(tags)
+        Catalog._local.seen = seen
+        # decks or tags this thread changed in a transaction not committed
+        # yet could be rolled back: they are served once, not cached.
+        Catalog._loaded = not (
+            connection.in_transaction
+            and getattr(Catalog._local, "dirty", False)
+        )
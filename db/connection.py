@@ -0,0 +1,168 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Generator, List
+
+from utils.program_paths import ProgramPaths
+
+# PRAGMA profiles. "interactive" is applied once, when a thread opens its
+# connection; "bulk" is layered on top of it for large imports and restored
+# afterwards (see ConnectionManager.profile).
+PRAGMA_PROFILES: Dict[str, Dict[str, str | int]] = {
+    "interactive": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16384,  # negative values are KiB: 16 MiB
+        "mmap_size": 268435456,  # 256 MiB
+        "busy_timeout": 5000,  # ms
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    "bulk": {
+        "synchronous": "OFF",
+        "cache_size": -65536,  # 64 MiB
+    },
+}
+
+# number of prepared statements kept by each connection.
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionManager:
+    """
+    Owns the connections to the current user's database. Each thread gets
+    one long-lived connection, opened on first use with the 'interactive'
+    PRAGMA profile applied. Connections run in autocommit mode; writes that
+    span several statements go through ConnectionManager.transaction().
+
+    A connection is only ever closed by the thread that owns it: once the
+    current user changes (see db.db.switch_user), each thread closes its
+    connection to the previous user's db on its next call and opens one to
+    the new db.
+    """
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _connections: List[sqlite3.Connection] = []
+    _commit_hooks: List[Callable[[], None]] = []
+
+    @staticmethod
+    def get_connection() -> sqlite3.Connection:
+        """
+        Returns the calling thread's connection, opening it if needed.
+        """
+        path = ProgramPaths.get_user_db_path()
+        conn: sqlite3.Connection | None = getattr(
+            ConnectionManager._local, "connection", None
+        )
+        if conn is not None:
+            if ConnectionManager._local.path == path:
+                return conn
+            ConnectionManager._close(conn)
+
+        try:
+            conn = sqlite3.connect(
+                path,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE,
+            )
+            ConnectionManager._apply_profile(
+                conn, PRAGMA_PROFILES["interactive"]
+            )
+        except sqlite3.OperationalError as e:
+            raise Exception("Failed to open database:", e)
+
+        ConnectionManager._local.connection = conn
+        ConnectionManager._local.path = path
+        with ConnectionManager._lock:
+            ConnectionManager._connections.append(conn)
+
+        return conn
+
+    @staticmethod
+    @contextmanager
+    def transaction() -> Generator[sqlite3.Connection, None, None]:
+        """
+        Context manager that runs its block inside a single write
+        transaction, committing on success and rolling back on error. Nested
+        uses join the outermost transaction.
+        """
+        conn = ConnectionManager.get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        else:
+            conn.execute("COMMIT;")
+            for hook in ConnectionManager._commit_hooks:
+                hook()
+
+    @staticmethod
+    def add_commit_hook(hook: Callable[[], None]) -> None:
+        """
+        Registers 'hook' to be called, on the committing thread, after every
+        transaction committed through ConnectionManager.transaction().
+        """
+        if hook not in ConnectionManager._commit_hooks:
+            ConnectionManager._commit_hooks.append(hook)
+
+    @staticmethod
+    @contextmanager
+    def profile(name: str) -> Generator[sqlite3.Connection, None, None]:
+        """
+        Context manager that switches the calling thread's connection to the
+        PRAGMA profile 'name' and restores the 'interactive' profile on exit.
+        Inside an open transaction the profile is left untouched, as SQLite
+        does not allow changing the safety level there.
+        """
+        conn = ConnectionManager.get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        ConnectionManager._apply_profile(conn, PRAGMA_PROFILES[name])
+        try:
+            yield conn
+        finally:
+            interactive = PRAGMA_PROFILES["interactive"]
+            ConnectionManager._apply_profile(
+                conn,
+                {key: interactive[key] for key in PRAGMA_PROFILES[name]},
+            )
+
+    @staticmethod
+    def close() -> None:
+        """
+        Closes the calling thread's connection, if it has one. The thread
+        opens a new one on its next call to get_connection().
+        """
+        conn: sqlite3.Connection | None = getattr(
+            ConnectionManager._local, "connection", None
+        )
+        if conn is not None:
+            ConnectionManager._close(conn)
+
+    @staticmethod
+    def _close(conn: sqlite3.Connection) -> None:
+        """
+        Closes 'conn', the calling thread's connection.
+        """
+        ConnectionManager._local.connection = None
+        ConnectionManager._local.path = None
+        with ConnectionManager._lock:
+            ConnectionManager._connections.remove(conn)
+        conn.close()
+
+    @staticmethod
+    def _apply_profile(
+        conn: sqlite3.Connection, pragmas: Dict[str, str | int]
+    ) -> None:
+        for pragma, value in pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value};").fetchall()
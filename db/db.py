@@ -1,69 +1,45 @@
 import sqlite3
+from db.backup import Backup
+from db.catalog import Catalog
+from db.connection import ConnectionManager
+from db.migrations import upgrade
 from utils.program_paths import ProgramPaths
 
 
 def check_or_create_user_db() -> None:
     """
     Connects to user database. If there is no database, creates one following
-    a given schema.
+    the program's schema; an existing one is upgraded to the latest schema
+    version (see db/migrations.py). Automatic backups are enabled (see
+    db/backup.py).
     """
     try:
-        with sqlite3.connect(ProgramPaths.get_user_db_path()) as conn:
-            print(
-                f"Opened SQLite3 database with version {sqlite3.sqlite_version} successfully."
-            )
-            cursor = conn.cursor()
-
-        # TODO: move definition of program's schema to another file (a 'Constants' module)
-        # TODO: resolve the structure of tags in the db (maybe using a middle table?)
-
-        # enable foreign keys constraints
-        cursor.execute("PRAGMA foreign_keys = ON;")
-
-        # add tables
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS problems(
-                    problem_id                 INTEGER PRIMARY KEY,
-                    problem_topic              TEXT,
-                    problem_review_count       INTEGER,
-                    problem_last_review_date   TEXT,
-                    problem_feedback           INTEGER,
-                    problem_src                TEXT,
-                    problem_deck               INTEGER,
-                    problem_content            TEXT UNIQUE NOT NULL,
-                    problem_creation_date      TEXT,
-                    FOREIGN KEY (problem_deck) REFERENCES decks(deck_id) ON DELETE RESTRICT ON UPDATE CASCADE 
-                    ); 
-        """
+        ConnectionManager.get_connection()
+        print(
+            f"Opened SQLite3 database with version {sqlite3.sqlite_version} successfully."
         )
 
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS decks(
-                    deck_id                 INTEGER PRIMARY KEY,
-                    deck_name               TEXT UNIQUE NOT NULL
-                    ); 
-        """
-        )
+        applied = upgrade()
+        if applied > 0:
+            print(f"Applied {applied} database migration(s).")
 
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS tags(
-                        tag_id                 INTEGER PRIMARY KEY,
-                        tag_name               TEXT UNIQUE NOT NULL
-                        );
-            """
-        )
-
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS problems_tags(
-                    problem_id              INTEGER NOT NULL,
-                    tag_id                  INTEGER NOT NULL,
-                    FOREIGN KEY (problem_id) REFERENCES problems(problem_id),
-                    FOREIGN KEY (tag_id)    REFERENCES tags(tag_id)
-                    );
-        """
-        )
-
-        conn.commit()
+        Backup.enable()
 
     except sqlite3.OperationalError as e:
         raise Exception("Failed to open database:", e)
+
+
+def switch_user(username: str) -> None:
+    """
+    Makes 'username' the current user: selects the profile (creating it if
+    needed, see ProgramPaths.select_user) and opens its db. Other threads
+    close their connection to the previous user's db themselves, on their
+    next call (see ConnectionManager). The Catalog follows the new db path
+    on its next read.
+    """
+    if username == ProgramPaths.get_username():
+        return
+
+    ProgramPaths.select_user(username)
+    Catalog.invalidate()
+    check_or_create_user_db()
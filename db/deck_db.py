@@ -1,6 +1,7 @@
 import sqlite3
-from utils.program_paths import ProgramPaths
-from typing import List, Tuple
+from db.catalog import Catalog
+from db.connection import ConnectionManager
+from typing import Dict, Iterable, List, Tuple
 
 
 class DeckDB:
@@ -13,14 +14,11 @@ class DeckDB:
 
         # connect to user's database.
         try:
-            with sqlite3.connect(ProgramPaths.get_user_db_path()) as conn:
-                cur = conn.cursor()
-
-            cur.execute(
+            cur = ConnectionManager.get_connection().execute(
                 "SELECT deck_name FROM decks WHERE deck_name = ?", (deck_name,)
             )
 
-            if len(cur.fetchall()) == 0:
+            if cur.fetchone() is None:
                 return False
             else:
                 return True
@@ -35,34 +33,64 @@ class DeckDB:
         """
         # connect to user's database.
         try:
-            with sqlite3.connect(ProgramPaths.get_user_db_path()) as conn:
-                cur = conn.cursor()
-                cur.execute(
+            with ConnectionManager.transaction() as conn:
+                conn.execute(
                     "INSERT INTO decks (deck_name) VALUES (?)", (deck_name,)
                 )
-                conn.commit()
+                Catalog.mark_changed()
         except sqlite3.OperationalError as e:
             raise Exception("Failed to open database:", e)
         except sqlite3.Error as e:
             raise Exception(f"Error adding new deck to DB: {e}.")
 
+    @staticmethod
+    def get_or_add_decks(deck_names: Iterable[str]) -> Dict[str, int]:
+        """
+        Adds every deck in 'deck_names' that is not in the DB yet and returns
+        a dictionary mapping each deck name to its deck_id.
+        """
+        names = list(set(deck_names))
+        deck_ids: Dict[str, int] = {}
+        if not names:
+            return deck_ids
+
+        try:
+            with ConnectionManager.transaction() as conn:
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO decks (deck_name) VALUES (?)",
+                    ((name,) for name in names),
+                )
+                if cursor.rowcount > 0:
+                    Catalog.mark_changed()
+                for i in range(0, len(names), 500):
+                    chunk = names[i : i + 500]
+                    rows = conn.execute(
+                        "SELECT deck_name, deck_id FROM decks WHERE deck_name "
+                        f"IN ({', '.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                    deck_ids.update(rows)
+        except sqlite3.Error as e:
+            raise Exception(f"Error adding new decks to DB: {e}.")
+
+        return deck_ids
+
     @staticmethod
     def get_decks_all() -> List[str]:
         # connect to user's database.
         try:
-            with sqlite3.connect(ProgramPaths.get_user_db_path()) as conn:
-                cur = conn.cursor()
-
-                cur.execute("SELECT deck_name FROM decks")
+            cur = ConnectionManager.get_connection().execute(
+                "SELECT deck_name FROM decks"
+            )
 
-                decks: List[Tuple[str]] = cur.fetchall()
+            decks: List[Tuple[str]] = cur.fetchall()
 
-                decks_list: List[str] = []
+            decks_list: List[str] = []
 
-                for tuple in decks:
-                    decks_list.append(tuple[0])
+            for tuple in decks:
+                decks_list.append(tuple[0])
 
-                return decks_list
+            return decks_list
 
         except sqlite3.OperationalError as e:
             raise Exception("Failed to open database:", e)
@@ -71,12 +99,11 @@ class DeckDB:
     def remove_deck(deck_name: str):
         # connect to user's database
         try:
-            with sqlite3.connect(ProgramPaths.get_user_db_path()) as conn:
-                cursor = conn.cursor()
-                cursor.execute("PRAGMA foreign_keys = on;")
-                cursor.execute(
+            with ConnectionManager.transaction() as conn:
+                conn.execute(
                     "DELETE FROM decks WHERE deck_name = ?", (deck_name,)
                 )
+                Catalog.mark_changed()
 
         except sqlite3.IntegrityError as e:
             raise Exception(
@@ -88,15 +115,10 @@ class DeckDB:
     @staticmethod
     def get_deck_by_id(id: int):
         try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = on;")
-                cursor.execute(
-                    "SELECT deck_name FROM decks WHERE deck_id = ?",
-                    (id,),
-                )
+            cursor = ConnectionManager.get_connection().execute(
+                "SELECT deck_name FROM decks WHERE deck_id = ?",
+                (id,),
+            )
 
             return cursor.fetchone()[0]
 
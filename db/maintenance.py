@@ -0,0 +1,161 @@
+import os
+import sqlite3
+from typing import Generator, Tuple
+
+from db.connection import ConnectionManager
+from utils.program_paths import ProgramPaths
+
+# number of issues of each kind reported by Maintenance.verify, beyond which
+# only their count is given.
+MAX_REPORTED = 20
+
+
+class Maintenance:
+    """
+    Whole-database maintenance of the current user's db: compaction and
+    consistency checks.
+    """
+
+    @staticmethod
+    def vacuum() -> Tuple[int, int]:
+        """
+        Rebuilds the db file without its free pages, then refreshes the
+        query planner's statistics. Returns the size of the db (in bytes)
+        before and after.
+        """
+        path = ProgramPaths.get_user_db_path()
+        try:
+            connection = ConnectionManager.get_connection()
+            # the WAL holds pages that are not in the db file yet.
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchall()
+            before = os.path.getsize(path)
+
+            connection.execute("VACUUM;")
+            connection.execute("PRAGMA optimize;").fetchall()
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchall()
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return (before, os.path.getsize(path))
+
+    @staticmethod
+    def verify() -> Generator[str, None, None]:
+        """
+        Generator function that checks the db and returns a description of
+        each issue found, as it is found: SQLite's integrity check, foreign
+        keys, the full-text index, the aggregates kept by triggers (see
+        migration 8) and the media files referenced by problems. Nothing is
+        returned for a sound db.
+        """
+        try:
+            connection = ConnectionManager.get_connection()
+
+            for (message,) in connection.execute("PRAGMA integrity_check;"):
+                if message != "ok":
+                    yield f"integrity: {message}"
+
+            for table, rowid, parent, _ in connection.execute(
+                "PRAGMA foreign_key_check;"
+            ):
+                yield (
+                    f"foreign key: row {rowid} of '{table}' refers to a "
+                    f"missing row of '{parent}'"
+                )
+
+            yield from Maintenance._verify_full_text_search(connection)
+            yield from Maintenance._verify_aggregates(connection)
+            yield from Maintenance._verify_media(connection)
+
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+    @staticmethod
+    def _verify_full_text_search(
+        connection: sqlite3.Connection,
+    ) -> Generator[str, None, None]:
+        try:
+            connection.execute(
+                "INSERT INTO problems_fts (problems_fts) "
+                "VALUES ('integrity-check');"
+            )
+        except sqlite3.DatabaseError as e:
+            yield f"full-text index: {e}"
+
+        (missing,) = connection.execute(
+            """
+            SELECT COUNT(*) FROM problems
+            WHERE problem_id NOT IN (SELECT rowid FROM problems_fts);
+            """
+        ).fetchone()
+        if missing > 0:
+            yield f"full-text index: {missing} problems are not indexed"
+
+    @staticmethod
+    def _verify_aggregates(
+        connection: sqlite3.Connection,
+    ) -> Generator[str, None, None]:
+        # aggregates left at zero (e.g. of a deck emptied since) are not
+        # deleted, so rows are compared on the non-zero ones only.
+        rows = connection.execute(
+            """
+            WITH
+                expected (kind, id, problems, new) AS (
+                    SELECT 'deck', problem_deck, COUNT(*),
+                        SUM(problem_due = 0)
+                    FROM problems WHERE problem_deck IS NOT NULL
+                    GROUP BY problem_deck
+                    UNION ALL
+                    SELECT 'tag', problems_tags.tag_id, COUNT(*),
+                        SUM(problems.problem_due = 0)
+                    FROM problems_tags
+                    JOIN problems
+                        ON problems.problem_id = problems_tags.problem_id
+                    GROUP BY problems_tags.tag_id
+                ),
+                stored (kind, id, problems, new) AS (
+                    SELECT aggregate_kind, aggregate_id, aggregate_problems,
+                        aggregate_new
+                    FROM aggregates WHERE aggregate_problems != 0
+                        OR aggregate_new != 0
+                )
+            SELECT expected.kind, expected.id, expected.problems,
+                expected.new, stored.problems, stored.new
+            FROM expected LEFT JOIN stored
+                ON stored.kind = expected.kind AND stored.id = expected.id
+            WHERE stored.problems IS NOT expected.problems
+                OR stored.new IS NOT expected.new
+            UNION ALL
+            SELECT stored.kind, stored.id, 0, 0, stored.problems, stored.new
+            FROM stored LEFT JOIN expected
+                ON expected.kind = stored.kind AND expected.id = stored.id
+            WHERE expected.id IS NULL;
+            """
+        ).fetchall()
+
+        for kind, id, problems, new, stored_problems, stored_new in rows[
+            :MAX_REPORTED
+        ]:
+            yield (
+                f"aggregates: {kind} {id} has {problems} problems ({new} "
+                f"new), {stored_problems or 0} ({stored_new or 0}) recorded"
+            )
+        if len(rows) > MAX_REPORTED:
+            yield f"aggregates: {len(rows) - MAX_REPORTED} more mismatches"
+
+    @staticmethod
+    def _verify_media(
+        connection: sqlite3.Connection,
+    ) -> Generator[str, None, None]:
+        media_dir = ProgramPaths.get_user_media_dir()
+        missing = 0
+        for (name,) in connection.execute(
+            "SELECT DISTINCT media_name FROM problem_media;"
+        ):
+            if os.path.isfile(os.path.join(media_dir, name)):
+                continue
+            missing += 1
+            if missing <= MAX_REPORTED:
+                yield f"media: '{name}' is used by problems but missing"
+
+        if missing > MAX_REPORTED:
+            yield f"media: {missing - MAX_REPORTED} more files are missing"
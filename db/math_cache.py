@@ -0,0 +1,253 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from utils.program_paths import ProgramPaths
+
+# total size (in bytes) of the cached renders beyond which the least recently
+# used ones are evicted, down to CACHE_TARGET_SIZE.
+MAX_CACHE_SIZE = 64 << 20  # 64 MiB
+CACHE_TARGET_SIZE = MAX_CACHE_SIZE * 3 // 4
+
+# maximum number of keys per query of MathCache.get_many.
+KEYS_PER_QUERY = 500
+
+
+class MathCache:
+    """
+    Persistent cache of typeset math: the html of a region of a problem (its
+    question or its answer) once MathJax has typeset it, keyed by the
+    SHA-256 of the region's source and of the MathJax configuration (see
+    MathCache.key), so a change to either is a miss. Problems shown again
+    are displayed from the cache without typesetting.
+
+    The cache lives in a db file of its own, next to the user's db (see
+    ProgramPaths.get_user_math_cache_path): it is rebuilt on demand, so it
+    is left out of backups and its writes do not count towards them. Once
+    the renders add up to more than MAX_CACHE_SIZE bytes, the least
+    recently used ones are evicted.
+
+    A single connection, opened on first use, is shared by the threads that
+    use the cache; calls are serialized.
+    """
+
+    _lock = threading.Lock()
+    _connection: sqlite3.Connection | None = None
+    _path: str | None = None
+    # total size of the cached renders, read when the cache is opened.
+    _size = 0
+    _last_used = 0
+
+    @staticmethod
+    def key(source: str, config_version: str) -> bytes:
+        """
+        Returns the key of the render of 'source' with the MathJax
+        configuration 'config_version'.
+        """
+        return hashlib.sha256(
+            f"{config_version}\0{source}".encode("utf-8")
+        ).digest()
+
+    @staticmethod
+    def get_many(
+        keys: Iterable[bytes], touch: bool = True, wait: bool = True
+    ) -> Dict[bytes, str]:
+        """
+        Returns the cached render of each of 'keys' that is in the cache,
+        marking them as just used if 'touch'. If not 'wait' and another
+        thread is using the cache, nothing is returned instead of waiting
+        for it: lookups made from the GUI thread never block.
+        """
+        keys = list(set(keys))
+        found: Dict[bytes, str] = {}
+        if not keys or not MathCache._lock.acquire(blocking=wait):
+            return found
+
+        try:
+            connection = MathCache._get_connection()
+            for i in range(0, len(keys), KEYS_PER_QUERY):
+                chunk = keys[i : i + KEYS_PER_QUERY]
+                found.update(
+                    connection.execute(
+                        "SELECT cache_key, cache_html FROM math_cache "
+                        "WHERE cache_key IN "
+                        f"({', '.join('?' * len(chunk))});",
+                        chunk,
+                    )
+                )
+            if touch:
+                connection.executemany(
+                    "UPDATE math_cache SET cache_last_used = ? "
+                    "WHERE cache_key = ?;",
+                    ((MathCache._now(), key) for key in found),
+                )
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+        finally:
+            MathCache._lock.release()
+
+        return found
+
+    @staticmethod
+    def put_many(renders: Iterable[Tuple[bytes, str]]) -> None:
+        """
+        Caches each (key, html) of 'renders', then evicts the least recently
+        used renders if the cache is over MAX_CACHE_SIZE.
+        """
+        with MathCache._lock:
+            try:
+                connection = MathCache._get_connection()
+                connection.execute("BEGIN IMMEDIATE;")
+                try:
+                    for key, html in renders:
+                        size = len(html.encode("utf-8"))
+                        inserted = connection.execute(
+                            "INSERT OR IGNORE INTO math_cache (cache_key, "
+                            "cache_html, cache_size, cache_last_used) "
+                            "VALUES (?, ?, ?, ?);",
+                            (key, html, size, MathCache._now()),
+                        ).rowcount
+                        if inserted:
+                            MathCache._size += size
+                        else:
+                            # same key, same render: it is only used again.
+                            connection.execute(
+                                "UPDATE math_cache SET cache_last_used = ? "
+                                "WHERE cache_key = ?;",
+                                (MathCache._now(), key),
+                            )
+
+                    if MathCache._size > MAX_CACHE_SIZE:
+                        MathCache._evict(connection)
+                except BaseException:
+                    connection.execute("ROLLBACK;")
+                    MathCache._size = MathCache._read_size(connection)
+                    raise
+                else:
+                    connection.execute("COMMIT;")
+
+            except sqlite3.Error as e:
+                raise Exception("Failed to open database:", e)
+
+    @staticmethod
+    def size() -> Tuple[int, int]:
+        """
+        Returns the number of cached renders and their total size in bytes.
+        """
+        with MathCache._lock:
+            try:
+                (count,) = (
+                    MathCache._get_connection()
+                    .execute("SELECT COUNT(*) FROM math_cache;")
+                    .fetchone()
+                )
+            except sqlite3.Error as e:
+                raise Exception("Failed to open database:", e)
+
+            return (count, MathCache._size)
+
+    @staticmethod
+    def clear() -> None:
+        """
+        Empties the cache.
+        """
+        with MathCache._lock:
+            try:
+                MathCache._get_connection().execute("DELETE FROM math_cache;")
+            except sqlite3.Error as e:
+                raise Exception("Failed to open database:", e)
+            MathCache._size = 0
+
+    @staticmethod
+    def close() -> None:
+        """
+        Closes the cache's connection. It is opened again on next use, for
+        the user current by then.
+        """
+        with MathCache._lock:
+            if MathCache._connection is not None:
+                MathCache._connection.close()
+            MathCache._connection = None
+            MathCache._path = None
+
+    @staticmethod
+    def _get_connection() -> sqlite3.Connection:
+        """
+        Returns the connection to the current user's cache, opening it (and
+        closing the previous user's) if needed. Called with the lock held.
+        """
+        path = ProgramPaths.get_user_math_cache_path()
+        if MathCache._connection is not None and MathCache._path == path:
+            return MathCache._connection
+
+        if MathCache._connection is not None:
+            MathCache._connection.close()
+            MathCache._connection = None
+
+        connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        # a cache can afford to lose its last writes.
+        connection.execute("PRAGMA journal_mode = WAL;").fetchall()
+        connection.execute("PRAGMA synchronous = OFF;")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS math_cache(
+                cache_key               BLOB PRIMARY KEY,
+                cache_html              TEXT NOT NULL,
+                cache_size              INTEGER NOT NULL,
+                cache_last_used         INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """)
+        # covers both the eviction order and the total size.
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_math_cache_last_used "
+            "ON math_cache(cache_last_used, cache_size);"
+        )
+
+        MathCache._connection = connection
+        MathCache._path = path
+        MathCache._size = MathCache._read_size(connection)
+        return connection
+
+    @staticmethod
+    def _evict(connection: sqlite3.Connection) -> None:
+        """
+        Deletes the least recently used renders until the cache is down to
+        CACHE_TARGET_SIZE, inside the caller's transaction.
+        """
+        evicted: List[Tuple[bytes]] = []
+        size = MathCache._size
+        for key, entry_size in connection.execute(
+            "SELECT cache_key, cache_size FROM math_cache "
+            "ORDER BY cache_last_used;"
+        ):
+            if size <= CACHE_TARGET_SIZE:
+                break
+            evicted.append((key,))
+            size -= entry_size
+
+        connection.executemany(
+            "DELETE FROM math_cache WHERE cache_key = ?;", evicted
+        )
+        MathCache._size = size
+
+    @staticmethod
+    def _read_size(connection: sqlite3.Connection) -> int:
+        (size,) = connection.execute(
+            "SELECT COALESCE(SUM(cache_size), 0) FROM math_cache;"
+        ).fetchone()
+        return size
+
+    @staticmethod
+    def _now() -> int:
+        """
+        Returns the time of use of a render: the Unix time in ms, made
+        strictly increasing so renders used within the same ms keep their
+        order. Called with the lock held.
+        """
+        MathCache._last_used = max(
+            time.time_ns() // 1_000_000, MathCache._last_used + 1
+        )
+        return MathCache._last_used
@@ -0,0 +1,430 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from typing import BinaryIO, Dict, Iterable, List, Set, Tuple
+
+from db.connection import ConnectionManager
+from utils.program_paths import ProgramPaths
+
+# relative references (src="...", href="...") to files of the media
+# directory inside the html of a problem.
+_MEDIA_REF_RE = re.compile(r"""(?:src|href)\s*=\s*["']([^"':#?]+)["']""")
+
+# block size used when hashing and copying files.
+BLOCK_SIZE = 1 << 20
+
+# files modified less than this many seconds ago are never deleted by
+# MediaDB.collect_garbage: they may belong to a problem not saved yet.
+MIN_GARBAGE_AGE = 24 * 60 * 60
+
+
+class MediaDB:
+    """
+    Content-addressed store for the files of the user's media directory.
+    Files added through MediaDB are named after the SHA-256 of their bytes
+    (e.g. '3f5a...9c.png'), so adding the same image twice stores it once.
+    The media table indexes every known file by name and by hash, and
+    problem_media records which problems refer to which files, which is what
+    MediaDB.collect_garbage relies on.
+
+    Files copied into the media directory by hand keep their names; they are
+    registered the first time a problem refers to them (or by
+    MediaDB.sync).
+    """
+
+    @staticmethod
+    def add_file(path: str) -> str:
+        """
+        Stores a copy of the file 'path' in the media directory, unless a
+        file with the same contents is already stored, and returns the name
+        to refer to it by (relative to the media directory).
+        """
+        with open(path, "rb") as source:
+            return MediaDB.add_stream(source, os.path.splitext(path)[1])
+
+    @staticmethod
+    def add_stream(source: BinaryIO, extension: str = "") -> str:
+        """
+        Same as MediaDB.add_file, for the contents of the binary stream
+        'source'. 'extension' (e.g. '.png') is appended to the hash to build
+        the name, so that web views still recognize the file type.
+        """
+        media_dir = ProgramPaths.get_user_media_dir()
+        temp_path, digest, size = MediaDB._copy_to_temp(source, media_dir)
+        try:
+            existing = MediaDB.get_name_by_hash(digest)
+            if existing is not None and os.path.isfile(
+                os.path.join(media_dir, existing)
+            ):
+                return existing
+
+            name = digest.hex() + extension.lower()
+            os.replace(temp_path, os.path.join(media_dir, name))
+            MediaDB._register(
+                ConnectionManager.get_connection(), name, digest, size
+            )
+            return name
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def add_named_stream(source: BinaryIO, name: str) -> bool:
+        """
+        Stores the contents of 'source' as the file 'name' (relative to the
+        media directory), as problems imported from elsewhere refer to their
+        files by name. Nothing is written if 'name' is already taken; if the
+        same contents are stored under another name, 'name' becomes a hard
+        link to that file. Returns whether 'name' now holds the contents.
+        """
+        media_dir = os.path.realpath(ProgramPaths.get_user_media_dir())
+        target = os.path.realpath(os.path.join(media_dir, name))
+        if os.path.commonpath([media_dir, target]) != media_dir:
+            return False
+        if MediaDB.exists(name) or os.path.exists(target):
+            return False
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path, digest, size = MediaDB._copy_to_temp(
+            source, os.path.dirname(target)
+        )
+        try:
+            existing = MediaDB.get_name_by_hash(digest)
+            if existing is None or not MediaDB._link(
+                os.path.join(media_dir, existing), target
+            ):
+                os.replace(temp_path, target)
+            MediaDB._register(
+                ConnectionManager.get_connection(),
+                os.path.relpath(target, media_dir),
+                digest,
+                size,
+            )
+            return True
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def exists(name: str) -> bool:
+        """
+        Returns True if 'name' is a file known to the media store. It is a
+        primary key lookup; the file system is not touched.
+        """
+        try:
+            row = (
+                ConnectionManager.get_connection()
+                .execute(
+                    "SELECT 1 FROM media WHERE media_name = ?;",
+                    (os.path.normpath(name),),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return row is not None
+
+    @staticmethod
+    def get_name_by_hash(digest: bytes) -> str | None:
+        """
+        Returns the name of a stored file whose SHA-256 is 'digest', or None
+        if there is none.
+        """
+        try:
+            row = (
+                ConnectionManager.get_connection()
+                .execute(
+                    "SELECT media_name FROM media WHERE media_hash = ? "
+                    "LIMIT 1;",
+                    (digest,),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return None if row is None else row[0]
+
+    @staticmethod
+    def media_references(content: Dict) -> Set[str]:
+        """
+        Returns the paths, relative to the media directory, of the files
+        referred to by the html of 'content'.
+        """
+        references: Set[str] = set()
+        for text in content.values():
+            if not isinstance(text, str):
+                continue
+            for reference in _MEDIA_REF_RE.findall(text):
+                name = os.path.normpath(reference.strip())
+                if not name.startswith("..") and not os.path.isabs(name):
+                    references.add(name)
+        return references
+
+    @staticmethod
+    def link_problems(
+        connection: sqlite3.Connection,
+        problems: Iterable[Tuple[int, Dict]],
+    ) -> None:
+        """
+        Records in problem_media the files referred to by each (problem_id,
+        content) of 'problems', inside the caller's transaction. Referenced
+        files that are in the media directory but not in the store yet are
+        registered first; references to missing files are ignored.
+        """
+        rows: List[Tuple[int, str]] = []
+        for problem_id, content in problems:
+            for name in MediaDB.media_references(content):
+                rows.append((problem_id, name))
+        if not rows:
+            return
+
+        media_dir = ProgramPaths.get_user_media_dir()
+        known: Set[str] = set()
+        names = list({name for _, name in rows})
+        for i in range(0, len(names), 500):
+            chunk = names[i : i + 500]
+            known.update(
+                name
+                for (name,) in connection.execute(
+                    "SELECT media_name FROM media WHERE media_name IN "
+                    f"({', '.join('?' * len(chunk))});",
+                    chunk,
+                )
+            )
+        for name in names:
+            path = os.path.join(media_dir, name)
+            if name not in known and os.path.isfile(path):
+                digest, size = MediaDB._hash_file(path)
+                MediaDB._register(connection, name, digest, size)
+                known.add(name)
+
+        connection.executemany(
+            "INSERT OR IGNORE INTO problem_media (problem_id, media_name) "
+            "VALUES (?, ?);",
+            ((problem_id, name) for problem_id, name in rows if name in known),
+        )
+
+    @staticmethod
+    def sync() -> int:
+        """
+        Brings the store in line with the media directory: files that are
+        not registered yet are hashed and registered, and rows of files that
+        no longer exist are dropped. Returns the number of files registered.
+        """
+        media_dir = ProgramPaths.get_user_media_dir()
+        registered = 0
+        try:
+            with ConnectionManager.transaction() as conn:
+                rows = conn.execute("SELECT media_name FROM media;")
+                known: Dict[str, bool] = {name: False for (name,) in rows}
+                for name in MediaDB._walk(media_dir):
+                    if name in known:
+                        known[name] = True
+                        continue
+                    digest, size = MediaDB._hash_file(
+                        os.path.join(media_dir, name)
+                    )
+                    MediaDB._register(conn, name, digest, size)
+                    registered += 1
+
+                missing = [name for name, found in known.items() if not found]
+                conn.executemany(
+                    "DELETE FROM problem_media WHERE media_name = ?;",
+                    ((name,) for name in missing),
+                )
+                conn.executemany(
+                    "DELETE FROM media WHERE media_name = ?;",
+                    ((name,) for name in missing),
+                )
+
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return registered
+
+    @staticmethod
+    def backfill() -> None:
+        """
+        Registers the files of the media directory and records the files
+        referred to by every problem (see MediaDB.link_problems). It fills
+        the media store of dbs created before it existed; running it again
+        changes nothing.
+        """
+        MediaDB.sync()
+        try:
+            with ConnectionManager.transaction() as conn:
+                last_id = 0
+                while True:
+                    rows = conn.execute(
+                        """
+                        SELECT problem_id, problem_content FROM problems
+                        WHERE problem_id > ?
+                            AND (problem_content LIKE '%src%'
+                                OR problem_content LIKE '%href%')
+                        ORDER BY problem_id LIMIT 1000;
+                        """,
+                        (last_id,),
+                    ).fetchall()
+                    if not rows:
+                        break
+                    MediaDB.link_problems(
+                        conn,
+                        (
+                            (problem_id, json.loads(content))
+                            for problem_id, content in rows
+                        ),
+                    )
+                    last_id = rows[-1][0]
+
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+    @staticmethod
+    def collect_garbage(
+        dry_run: bool = False, min_age: float = MIN_GARBAGE_AGE
+    ) -> Tuple[int, int, List[str]]:
+        """
+        Deletes the media files that no problem refers to, after
+        registering any file of the media directory the store did not know
+        about. Only files the store named after their hash (see
+        MediaDB.add_stream) are deleted: references are only recognized in
+        quoted src and href attributes, so other files may still be used in
+        ways problem_media does not record. Files modified less than
+        'min_age' seconds ago are kept too, as images inserted into a
+        problem that is not saved yet are not referred to by any problem.
+
+        Returns the number of files and of bytes freed (or that would be
+        freed, if 'dry_run') and the names of the unreferenced files kept
+        because the store did not name them.
+        """
+        MediaDB.sync()
+        media_dir = ProgramPaths.get_user_media_dir()
+        newest = time.time() - min_age
+        victims: List[Tuple[str, int]] = []
+        kept: List[str] = []
+        try:
+            with ConnectionManager.transaction() as connection:
+                unreferenced = connection.execute("""
+                    SELECT media_name, media_hash, media_size FROM media
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM problem_media
+                        WHERE problem_media.media_name = media.media_name
+                    );
+                    """).fetchall()
+
+                for name, digest, size in unreferenced:
+                    if os.path.splitext(name)[0] != digest.hex():
+                        kept.append(name)
+                        continue
+                    path = os.path.join(media_dir, name)
+                    if (
+                        os.path.isfile(path)
+                        and os.path.getmtime(path) > newest
+                    ):
+                        continue
+                    victims.append((name, size))
+
+                if not dry_run:
+                    connection.executemany(
+                        "DELETE FROM media WHERE media_name = ?;",
+                        ((name,) for name, _ in victims),
+                    )
+
+            if dry_run:
+                return (len(victims), sum(size for _, size in victims), kept)
+
+            # files are only deleted once their rows are, and not if another
+            # connection registered or referred to them since.
+            n_files = 0
+            n_bytes = 0
+            connection = ConnectionManager.get_connection()
+            for name, size in victims:
+                if connection.execute(
+                    """
+                    SELECT 1 FROM media WHERE media_name = ?
+                    UNION ALL
+                    SELECT 1 FROM problem_media WHERE media_name = ?
+                    LIMIT 1;
+                    """,
+                    (name, name),
+                ).fetchone():
+                    continue
+                path = os.path.join(media_dir, name)
+                if os.path.isfile(path):
+                    os.remove(path)
+                n_files += 1
+                n_bytes += size
+
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return (n_files, n_bytes, kept)
+
+    @staticmethod
+    def _register(
+        connection: sqlite3.Connection, name: str, digest: bytes, size: int
+    ) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO media "
+            "(media_name, media_hash, media_size) VALUES (?, ?, ?);",
+            (os.path.normpath(name), digest, size),
+        )
+
+    @staticmethod
+    def _copy_to_temp(
+        source: BinaryIO, directory: str
+    ) -> Tuple[str, bytes, int]:
+        """
+        Copies 'source' to a temporary file in 'directory' (so it can later
+        be renamed into place) while hashing it. Returns the temporary
+        file's path, the SHA-256 digest and the size in bytes.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as temp:
+            while block := source.read(BLOCK_SIZE):
+                sha256.update(block)
+                temp.write(block)
+                size += len(block)
+        return (temp_path, sha256.digest(), size)
+
+    @staticmethod
+    def _hash_file(path: str) -> Tuple[bytes, int]:
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as file:
+            while block := file.read(BLOCK_SIZE):
+                sha256.update(block)
+                size += len(block)
+        return (sha256.digest(), size)
+
+    @staticmethod
+    def _link(source: str, target: str) -> bool:
+        """
+        Makes 'target' a hard link to 'source', so both names share the same
+        bytes on disk. Returns False if the file system does not allow it.
+        """
+        try:
+            os.link(source, target)
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def _walk(media_dir: str) -> Iterable[str]:
+        """
+        Yields the path, relative to 'media_dir', of every file below it,
+        skipping temporary files left by interrupted copies.
+        """
+        for root, _, files in os.walk(media_dir):
+            for file_name in files:
+                if file_name.startswith(".tmp-"):
+                    continue
+                yield os.path.relpath(os.path.join(root, file_name), media_dir)
@@ -0,0 +1,490 @@
+import hashlib
+import json
+import sqlite3
+import unicodedata
+from typing import Any, Callable, Dict, List, Set
+
+from db.connection import ConnectionManager
+from db.media_db import MediaDB
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    """
+    Version 1: the original schema. Databases created before migrations
+    existed already have these tables, hence the 'IF NOT EXISTS'.
+    """
+    conn.execute("""CREATE TABLE IF NOT EXISTS problems(
+                problem_id                 INTEGER PRIMARY KEY,
+                problem_topic              TEXT,
+                problem_review_count       INTEGER,
+                problem_last_review_date   TEXT,
+                problem_feedback           INTEGER,
+                problem_src                TEXT,
+                problem_deck               INTEGER,
+                problem_content            TEXT UNIQUE NOT NULL,
+                problem_creation_date      TEXT,
+                FOREIGN KEY (problem_deck) REFERENCES decks(deck_id) ON DELETE RESTRICT ON UPDATE CASCADE 
+                ); 
+    """)
+
+    conn.execute("""CREATE TABLE IF NOT EXISTS decks(
+                deck_id                 INTEGER PRIMARY KEY,
+                deck_name               TEXT UNIQUE NOT NULL
+                ); 
+    """)
+
+    conn.execute("""CREATE TABLE IF NOT EXISTS tags(
+                tag_id                 INTEGER PRIMARY KEY,
+                tag_name               TEXT UNIQUE NOT NULL
+                );
+    """)
+
+    conn.execute("""CREATE TABLE IF NOT EXISTS problems_tags(
+                problem_id              INTEGER NOT NULL,
+                tag_id                  INTEGER NOT NULL,
+                FOREIGN KEY (problem_id) REFERENCES problems(problem_id),
+                FOREIGN KEY (tag_id)    REFERENCES tags(tag_id)
+                );
+    """)
+
+
+def _add_filter_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Version 2: indexes for the browser's deck and tag filters. Every index
+    implicitly ends with the rowid, so 'idx_problems_deck' already yields a
+    deck's problems in problem_id order. The problems_tags indexes cover
+    tag -> problems and problem -> tags lookups without touching the table.
+    """
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_problems_deck "
+        "ON problems(problem_deck);"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_problems_tags_tag "
+        "ON problems_tags(tag_id, problem_id);"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_problems_tags_problem "
+        "ON problems_tags(problem_id, tag_id);"
+    )
+
+
+def _content_hash_v3(content: Dict) -> bytes:
+    """
+    ProblemDB.content_hash as of version 3, frozen here so that the
+    migration writes the same hashes whatever later versions of it do. A
+    change to ProblemDB.content_hash needs a migration rehashing problems.
+    """
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            value = value.replace("\r\n", "\n").strip()
+            return unicodedata.normalize("NFC", value)
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    normalized = json.dumps(
+        normalize(content),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).digest()
+
+
+def _add_content_hash(conn: sqlite3.Connection) -> None:
+    """
+    Version 3: identifies problems by a SHA-256 hash of their normalized
+    content (see _content_hash_v3) instead of a UNIQUE constraint on the
+    full JSON text. SQLite cannot drop a column constraint, so the problems
+    table is rebuilt and the hash is backfilled from Python.
+    """
+    conn.execute("""CREATE TABLE problems_new(
+                problem_id                 INTEGER PRIMARY KEY,
+                problem_topic              TEXT,
+                problem_review_count       INTEGER,
+                problem_last_review_date   TEXT,
+                problem_feedback           INTEGER,
+                problem_src                TEXT,
+                problem_deck               INTEGER,
+                problem_content            TEXT NOT NULL,
+                problem_content_hash       BLOB NOT NULL,
+                problem_creation_date      TEXT,
+                FOREIGN KEY (problem_deck) REFERENCES decks(deck_id) ON DELETE RESTRICT ON UPDATE CASCADE 
+                );
+    """)
+
+    seen: Set[bytes] = set()
+    rows = conn.execute("SELECT * FROM problems ORDER BY problem_id;")
+    while batch := rows.fetchmany(1000):
+        new_rows = []
+        for row in batch:
+            content_hash = _content_hash_v3(json.loads(row[7]))
+            if content_hash in seen:
+                # the old constraint only rejected byte-identical JSON: keep
+                # problems that are equal once normalized as distinct rows.
+                content_hash += row[0].to_bytes(8, "big")
+            seen.add(content_hash)
+            new_rows.append(row[:8] + (content_hash,) + row[8:])
+
+        conn.executemany(
+            "INSERT INTO problems_new VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            new_rows,
+        )
+
+    conn.execute("DROP TABLE problems;")
+    conn.execute("ALTER TABLE problems_new RENAME TO problems;")
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_problems_content_hash "
+        "ON problems(problem_content_hash);"
+    )
+    conn.execute("CREATE INDEX idx_problems_deck ON problems(problem_deck);")
+
+
+def _add_full_text_search(conn: sqlite3.Connection) -> None:
+    """
+    Version 4: FTS5 index over the question and answer of every problem,
+    kept in sync with the problems table by triggers. The backslash is a
+    token character, so LaTeX control sequences such as \\int or \\frac
+    are indexed as tokens of their own. Prefix indexes on 2 and 3
+    characters keep search-as-you-type queries fast.
+    """
+    conn.execute("""CREATE VIRTUAL TABLE problems_fts USING fts5(
+                question,
+                answer,
+                tokenize = "unicode61 tokenchars '\\'",
+                prefix = '2 3'
+                );
+    """)
+
+    conn.execute("""CREATE TRIGGER problems_fts_insert AFTER INSERT ON problems
+           BEGIN
+                INSERT INTO problems_fts (rowid, question, answer)
+                VALUES (
+                    new.problem_id,
+                    json_extract(new.problem_content, '$.question'),
+                    json_extract(new.problem_content, '$.answer')
+                );
+           END;
+    """)
+
+    conn.execute("""CREATE TRIGGER problems_fts_delete AFTER DELETE ON problems
+           BEGIN
+                DELETE FROM problems_fts WHERE rowid = old.problem_id;
+           END;
+    """)
+
+    conn.execute("""CREATE TRIGGER problems_fts_update
+           AFTER UPDATE OF problem_content ON problems
+           BEGIN
+                UPDATE problems_fts SET
+                    question = json_extract(new.problem_content, '$.question'),
+                    answer = json_extract(new.problem_content, '$.answer')
+                WHERE rowid = new.problem_id;
+           END;
+    """)
+
+    conn.execute("""INSERT INTO problems_fts (rowid, question, answer)
+           SELECT
+                problem_id,
+                json_extract(problem_content, '$.question'),
+                json_extract(problem_content, '$.answer')
+           FROM problems;
+    """)
+
+
+def _add_sort_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Version 5: indexes for keyset pagination ordered by creation date, for
+    all problems and within a deck.
+    """
+    conn.execute(
+        "CREATE INDEX idx_problems_creation_date "
+        "ON problems(problem_creation_date);"
+    )
+    conn.execute(
+        "CREATE INDEX idx_problems_deck_creation_date "
+        "ON problems(problem_deck, problem_creation_date);"
+    )
+
+
+def _add_review_schedule(conn: sqlite3.Connection) -> None:
+    """
+    Version 6: scheduling state for spaced repetition (see db/scheduler.py).
+    problem_due is the Unix time at which the problem is next due (0 for
+    problems never reviewed), problem_interval the current interval in days
+    and problem_ease the SM-2 ease factor. The due indexes turn "next N due
+    problems (in deck X)" into an index range scan.
+    """
+    conn.execute(
+        "ALTER TABLE problems "
+        "ADD COLUMN problem_due INTEGER NOT NULL DEFAULT 0;"
+    )
+    conn.execute(
+        "ALTER TABLE problems "
+        "ADD COLUMN problem_interval REAL NOT NULL DEFAULT 0;"
+    )
+    conn.execute(
+        "ALTER TABLE problems "
+        "ADD COLUMN problem_ease REAL NOT NULL DEFAULT 2.5;"
+    )
+    conn.execute(
+        "CREATE INDEX idx_problems_deck_due "
+        "ON problems(problem_deck, problem_due);"
+    )
+    conn.execute("CREATE INDEX idx_problems_due ON problems(problem_due);")
+
+
+def _add_media_store(conn: sqlite3.Connection) -> None:
+    """
+    Version 7: the media store (see db/media_db.py). media indexes the files
+    of the media directory by name and by SHA-256; problem_media records the
+    files each problem refers to. Existing files and references are
+    registered by upgrade, outside of the migration, as that reads the media
+    directory.
+    """
+    conn.execute("""
+        CREATE TABLE media(
+            media_name              TEXT PRIMARY KEY,
+            media_hash              BLOB NOT NULL,
+            media_size              INTEGER NOT NULL
+        );
+        """)
+    conn.execute("CREATE INDEX idx_media_hash ON media(media_hash);")
+    conn.execute("""
+        CREATE TABLE problem_media(
+            problem_id              INTEGER NOT NULL,
+            media_name              TEXT NOT NULL,
+            PRIMARY KEY (problem_id, media_name),
+            FOREIGN KEY (problem_id) REFERENCES problems(problem_id)
+                ON DELETE CASCADE,
+            FOREIGN KEY (media_name) REFERENCES media(media_name)
+        ) WITHOUT ROWID;
+        """)
+    conn.execute(
+        "CREATE INDEX idx_problem_media_name ON problem_media(media_name);"
+    )
+
+
+def _add_aggregates(conn: sqlite3.Connection) -> None:
+    """
+    Version 8: per-deck and per-tag counts (see db/stats_db.py), kept
+    current by triggers. For each deck ('deck', deck_id) and tag ('tag',
+    tag_id), aggregates holds its number of problems, how many of them were
+    never reviewed (problem_due = 0, hence due) and the Unix time of the
+    last change to them.
+
+    Due counts themselves are not kept: a reviewed problem becomes due when
+    the clock passes its problem_due, which changes no row, so no trigger
+    can count it. StatsDB adds the reviewed problems that are due with a
+    range scan of idx_problems_due, which only visits those problems.
+    """
+    conn.execute("""
+        CREATE TABLE aggregates(
+            aggregate_kind          TEXT NOT NULL,
+            aggregate_id            INTEGER NOT NULL,
+            aggregate_problems      INTEGER NOT NULL DEFAULT 0,
+            aggregate_new           INTEGER NOT NULL DEFAULT 0,
+            aggregate_modified      INTEGER,
+            PRIMARY KEY (aggregate_kind, aggregate_id)
+        ) WITHOUT ROWID;
+        """)
+
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+    def change(kind: str, owner: str, problems: str, new: str) -> str:
+        # adds 'problems' and 'new' to the counts of 'owner' (if any)
+        return f"""
+            INSERT INTO aggregates
+            SELECT '{kind}', {owner}, ({problems}), ({new}), {now}
+            WHERE {owner} IS NOT NULL
+            ON CONFLICT (aggregate_kind, aggregate_id) DO UPDATE SET
+                aggregate_problems = aggregate_problems + ({problems}),
+                aggregate_new = aggregate_new + ({new}),
+                aggregate_modified = {now};
+        """
+
+    add_to_new_deck = change(
+        "deck", "new.problem_deck", "1", "new.problem_due = 0"
+    )
+    remove_from_old_deck = change(
+        "deck", "old.problem_deck", "-1", "-(old.problem_due = 0)"
+    )
+    conn.execute(f"""
+        CREATE TRIGGER aggregates_problems_insert AFTER INSERT ON problems
+        BEGIN
+            {add_to_new_deck}
+        END;
+        """)
+    conn.execute(f"""
+        CREATE TRIGGER aggregates_problems_delete AFTER DELETE ON problems
+        BEGIN
+            {remove_from_old_deck}
+        END;
+        """)
+    # a review only matters here the first time, when the problem stops
+    # being new.
+    conn.execute(f"""
+        CREATE TRIGGER aggregates_problems_update
+        AFTER UPDATE OF problem_deck, problem_due ON problems
+        WHEN old.problem_deck IS NOT new.problem_deck
+            OR (old.problem_due = 0) != (new.problem_due = 0)
+        BEGIN
+            {remove_from_old_deck}
+            {add_to_new_deck}
+            UPDATE aggregates SET
+                aggregate_new = aggregate_new
+                    + (new.problem_due = 0) - (old.problem_due = 0),
+                aggregate_modified = {now}
+            WHERE aggregate_kind = 'tag' AND aggregate_id IN (
+                SELECT tag_id FROM problems_tags
+                WHERE problem_id = new.problem_id
+            );
+        END;
+        """)
+    conn.execute(f"""
+        CREATE TRIGGER aggregates_problems_edit
+        AFTER UPDATE OF problem_content ON problems
+        BEGIN
+            UPDATE aggregates SET aggregate_modified = {now}
+            WHERE (aggregate_kind = 'deck'
+                    AND aggregate_id = new.problem_deck)
+                OR (aggregate_kind = 'tag' AND aggregate_id IN (
+                    SELECT tag_id FROM problems_tags
+                    WHERE problem_id = new.problem_id
+                ));
+        END;
+        """)
+
+    # whether the problem of the problems_tags row 'row' is new.
+    def is_new(row: str) -> str:
+        return (
+            "COALESCE((SELECT problem_due = 0 FROM problems "
+            f"WHERE problem_id = {row}.problem_id), 0)"
+        )
+
+    add_to_new_tag = change("tag", "new.tag_id", "1", is_new("new"))
+    remove_from_old_tag = change(
+        "tag", "old.tag_id", "-1", f"-{is_new('old')}"
+    )
+    conn.execute(f"""
+        CREATE TRIGGER aggregates_problems_tags_insert
+        AFTER INSERT ON problems_tags
+        BEGIN
+            {add_to_new_tag}
+        END;
+        """)
+    conn.execute(f"""
+        CREATE TRIGGER aggregates_problems_tags_delete
+        AFTER DELETE ON problems_tags
+        BEGIN
+            {remove_from_old_tag}
+        END;
+        """)
+    for kind, table in (("deck", "decks"), ("tag", "tags")):
+        conn.execute(f"""
+            CREATE TRIGGER aggregates_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM aggregates
+                WHERE aggregate_kind = '{kind}'
+                    AND aggregate_id = old.{kind}_id;
+            END;
+            """)
+
+    # backfill
+    conn.execute(f"""
+        INSERT INTO aggregates
+        SELECT 'deck', problem_deck, COUNT(*), SUM(problem_due = 0), {now}
+        FROM problems WHERE problem_deck IS NOT NULL GROUP BY problem_deck;
+        """)
+    conn.execute(f"""
+        INSERT INTO aggregates
+        SELECT 'tag', problems_tags.tag_id, COUNT(*),
+            SUM(problems.problem_due = 0), {now}
+        FROM problems_tags
+        JOIN problems ON problems.problem_id = problems_tags.problem_id
+        GROUP BY problems_tags.tag_id;
+        """)
+
+
+# MIGRATIONS[i] upgrades a database from user_version i to i + 1. New
+# migrations are only ever appended to this list.
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _create_schema,
+    _add_filter_indexes,
+    _add_content_hash,
+    _add_full_text_search,
+    _add_sort_indexes,
+    _add_review_schedule,
+    _add_media_store,
+    _add_aggregates,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+# version that added the media store (see upgrade).
+MEDIA_STORE_VERSION = MIGRATIONS.index(_add_media_store) + 1
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Returns the schema version stored in the database's user_version.
+    """
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate() -> int:
+    """
+    Upgrades the current user's database to SCHEMA_VERSION, applying all
+    pending migrations inside a single transaction. On an up-to-date database
+    no DDL is run. Returns the number of migrations applied.
+    """
+    conn = ConnectionManager.get_connection()
+    if get_schema_version(conn) == SCHEMA_VERSION:
+        return 0
+
+    # migrations may rebuild tables, which requires foreign key enforcement
+    # to be off; it cannot be toggled inside a transaction. Integrity is
+    # checked before committing instead.
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        with ConnectionManager.transaction() as conn:
+            # read it again under the write lock: another process may have
+            # migrated the database in the meantime.
+            version = get_schema_version(conn)
+            if version > SCHEMA_VERSION:
+                raise Exception(
+                    f"The database's schema version ({version}) is newer "
+                    f"than the one supported by this program "
+                    f"({SCHEMA_VERSION})."
+                )
+
+            for migration in MIGRATIONS[version:]:
+                migration(conn)
+
+            if conn.execute("PRAGMA foreign_key_check;").fetchone():
+                raise Exception(
+                    "Database migration failed: foreign key check failed."
+                )
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON;")
+
+    return SCHEMA_VERSION - version
+
+
+def upgrade() -> int:
+    """
+    Migrates the current user's database (see migrate), then fills the media
+    store if the db predates it (see MediaDB.backfill). That step reads and
+    hashes the files of the media directory, so it runs after the migration
+    is committed rather than inside it. Returns the number of migrations
+    applied.
+    """
+    version = get_schema_version(ConnectionManager.get_connection())
+    applied = migrate()
+    if version < MEDIA_STORE_VERSION:
+        MediaDB.backfill()
+    return applied
@@ -0,0 +1,72 @@
+import json
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+
+class Problem:
+    """
+    Read-only record of a row of the problems table. It keeps the row tuple
+    returned by sqlite3 and a column -> position map shared by every row of
+    the same query, so no per-row dictionary is built. Columns are read as
+    attributes (problem.problem_deck) or by key (problem["problem_deck"]),
+    and problem_content is only decoded from JSON the first time
+    Problem.content is used.
+    """
+
+    __slots__ = ("_row", "_columns", "_content")
+
+    def __init__(self, row: Tuple[Any, ...], columns: Dict[str, int]):
+        self._row = row
+        self._columns = columns
+        self._content: Dict | None = None
+
+    @staticmethod
+    def row_factory(
+        cursor: sqlite3.Cursor,
+    ) -> Callable[[sqlite3.Cursor, Tuple[Any, ...]], "Problem"]:
+        """
+        Returns a row factory producing Problem records for the statement
+        that 'cursor' has just executed.
+        """
+        columns = {
+            description[0]: i
+            for i, description in enumerate(cursor.description)
+        }
+        return lambda _, row: Problem(row, columns)
+
+    @property
+    def content(self) -> Dict:
+        """
+        The decoded problem_content (e.g. {"question": ..., "answer": ...}).
+        """
+        if self._content is None:
+            self._content = json.loads(self["problem_content"])
+        return self._content
+
+    def keys(self) -> List[str]:
+        return list(self._columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self._row[i] for key, i in self._columns.items()}
+
+    def __getitem__(self, key: str) -> Any:
+        return self._row[self._columns[key]]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._row[self._columns[name]]
+        except KeyError:
+            raise AttributeError(
+                f"'Problem' object has no attribute '{name}'"
+            ) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def __repr__(self) -> str:
+        return f"Problem({self.to_dict()!r})"
@@ -1,41 +1,114 @@
 import datetime
+import hashlib
+import itertools
 import json
 import sqlite3
-from typing import Any, Dict, Generator, List
+import time
+import unicodedata
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+)
 
+from db.connection import ConnectionManager
+from db.deck_db import DeckDB
+from db.media_db import MediaDB
+from db.problem import Problem
 from db.tag_db import TagDB
-from utils.program_paths import ProgramPaths
+from db.tag_query import TagQuery
+
+# keyset cursors hold the sort key values of the last problem of a page.
+Cursor = Tuple[Any, ...]
+
+# columns each sort key orders by. problem_id always comes last, so that
+# every cursor points to exactly one position.
+SORT_KEYS: Dict[str, Tuple[str, ...]] = {
+    "id": ("problem_id",),
+    "creation_date": ("problem_creation_date", "problem_id"),
+}
+
+PAGE_SIZE = 500
+
+# history of a problem that add_problems_bulk can restore (e.g. from an
+# archive), by record key: its column and its value for a new problem. The
+# creation date of a new problem is the date it is added.
+PROBLEM_STATE: Dict[str, Tuple[str, Any]] = {
+    "creation_date": ("problem_creation_date", None),
+    "review_count": ("problem_review_count", None),
+    "last_review_date": ("problem_last_review_date", None),
+    "feedback": ("problem_feedback", None),
+    "due": ("problem_due", 0),
+    "interval": ("problem_interval", 0.0),
+    "ease": ("problem_ease", 2.5),
+}
+
+# (content, deck, tags) or (content, deck, tags, state) records of
+# add_problems_bulk; 'state' maps keys of PROBLEM_STATE to their values.
+ProblemRecord = (
+    Tuple[Dict, str | None, List[str] | None]
+    | Tuple[Dict, str | None, List[str] | None, Dict[str, Any]]
+)
+
+# columns shown when listing problems (see ProblemDB.get_problems_listing).
+LISTING_SELECT = """
+    SELECT
+        problems.problem_id,
+        COALESCE(json_extract(problems.problem_content, '$.question'), ''),
+        COALESCE(json_extract(problems.problem_content, '$.answer'), ''),
+        COALESCE(decks.deck_name, ''),
+        problems.problem_creation_date
+    FROM problems
+    LEFT JOIN decks ON decks.deck_id = problems.problem_deck
+"""
+
+# positions of each sort key's columns in a listing tuple.
+LISTING_CURSORS: Dict[str, Tuple[int, ...]] = {
+    "id": (0,),
+    "creation_date": (4, 0),
+}
 
 
 class ProblemDB:
     @staticmethod
-    def add_problem(content: Dict, deck: str, tags: List[str] | None = None):
+    def add_problem(
+        content: Dict, deck: str, tags: List[str] | None = None
+    ) -> int:
+        """
+        Adds a problem to the deck 'deck' with the tags 'tags' (created if
+        needed) and returns its problem_id.
+        """
         content_json = json.dumps(content)
+        content_hash = ProblemDB.content_hash(content)
         now = datetime.datetime.now()
         date_str = now.strftime("%Y-%m-%d")
 
-        # add new tags:
-        if tags:
-            for tag in tags:
-                # add tag to db if it does not exists there yet.
-                TagDB.add_tag(tag)
-
-        # add the rest
         try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON;")
+            with ConnectionManager.transaction() as connection:
+                # add new tags:
+                if tags:
+                    for tag in tags:
+                        # add tag to db if it does not exists there yet.
+                        TagDB.add_tag(tag)
 
+                # add the rest
+                cursor = connection.cursor()
                 cursor.execute(
                     """
                     INSERT INTO problems (
                         problem_content, 
+                        problem_content_hash,
                         problem_deck, 
                         problem_creation_date
                     )
                     VALUES(
+                        ?,
                         ?,
                         (SELECT deck_id FROM decks WHERE deck_name = ?),
                         ?
@@ -43,151 +116,612 @@ class ProblemDB:
                     """,
                     (
                         content_json,
+                        content_hash,
                         deck,
                         date_str,
                     ),
                 )
 
+                problem_id = cursor.lastrowid
+                assert problem_id is not None
+                MediaDB.link_problems(connection, [(problem_id, content)])
+
                 if tags:
-                    for tag in tags:
+                    # each tag once, however many times it was given
+                    for tag in dict.fromkeys(tag.strip() for tag in tags):
                         # add info th problems_tags table
                         cursor.execute(
                             """
                             INSERT INTO problems_tags (problem_id, tag_id)
                             VALUES (
-                                (
-                                    SELECT problem_id FROM problems
-                                    WHERE problem_content = ? 
-                                ),
+                                ?,
                                 (
                                     SELECT tag_id FROM tags
                                     WHERE tag_name = ?
                                 )
                             );
                             """,
-                            (content_json, tag),
+                            (problem_id, tag),
                         )
 
-                connection.commit()
-
         except sqlite3.OperationalError as e:
             raise Exception("Failed to open database:", e)
         except sqlite3.Error as e:
             raise Exception("Failed to open database:", e)
 
+        return problem_id
+
     @staticmethod
-    def get_all_problems() -> Generator[dict[str, Any], None, None]:
+    def content_hash(content: Dict) -> bytes:
         """
-        Generator function that returns a dictionary containing all the data of
-        a single problem for each iteration.
+        Returns the SHA-256 digest identifying a problem's content. Contents
+        that only differ in key order, line endings, surrounding whitespace
+        or Unicode normalization form share the same hash.
         """
-        try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                connection.row_factory = sqlite3.Row
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON;")
-
-                problems = cursor.execute("SELECT * FROM problems;")
 
-                # iteration process:
-                for problem in problems:
-                    problem_dict = {}
-                    for key in problem.keys():
-                        problem_dict[key] = problem[key]
+        def normalize(value: Any) -> Any:
+            if isinstance(value, str):
+                value = value.replace("\r\n", "\n").strip()
+                return unicodedata.normalize("NFC", value)
+            if isinstance(value, dict):
+                return {key: normalize(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [normalize(item) for item in value]
+            return value
 
-                    yield problem_dict
+        normalized = json.dumps(
+            normalize(content),
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).digest()
 
-        except sqlite3.OperationalError as e:
-            raise Exception("Failed to open database:", e)
+    @staticmethod
+    def get_problem_id_by_content(content: Dict) -> int | None:
+        """
+        Returns the problem_id of the problem whose content is 'content'
+        (compared through ProblemDB.content_hash), or None if there is none.
+        """
+        try:
+            row = (
+                ConnectionManager.get_connection()
+                .execute(
+                    "SELECT problem_id FROM problems "
+                    "WHERE problem_content_hash = ?;",
+                    (ProblemDB.content_hash(content),),
+                )
+                .fetchone()
+            )
         except sqlite3.Error as e:
             raise Exception("Failed to open database:", e)
 
+        return None if row is None else row[0]
+
     @staticmethod
-    def get_problems_by_deck(
-        deck_name: str,
-    ) -> Generator[dict[str, Any], None, None]:
+    def add_problems_bulk(
+        problems: Iterable[ProblemRecord],
+        chunk_size: int = 1000,
+        progress: Callable[[int, float], None] | None = None,
+    ) -> int:
         """
-        Generator function that returns a dictionary containing all the data of
-        a single problem for each iteration, where the problem's deck is
-        'deck_name'.
+        Adds every (content, deck, tags) record of 'problems' to the db.
+        Records are consumed lazily and written in transactions of
+        'chunk_size' problems. Decks and tags that do not exist yet are
+        created (a deck of None adds the problem without a deck), and
+        problems whose content is already stored are skipped. A record may
+        carry a fourth item, the problem's state (see PROBLEM_STATE): keys
+        that are missing or None get the values of a new problem.
+        After each chunk 'progress' (if given) is called with the number of
+        problems added so far and the chunk's throughput in problems per
+        second. Returns the number of problems added.
         """
+        defaults = {
+            key: default for key, (_, default) in PROBLEM_STATE.items()
+        }
+        defaults["creation_date"] = datetime.datetime.now().strftime(
+            "%Y-%m-%d"
+        )
+        deck_ids: Dict[str, int] = {}
+        tag_ids: Dict[str, int] = {}
+        added = 0
+
+        records = iter(problems)
         try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                connection.row_factory = sqlite3.Row
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON;")
+            with ConnectionManager.profile("bulk"):
+                while True:
+                    chunk = list(itertools.islice(records, chunk_size))
+                    if not chunk:
+                        break
+                    start = time.perf_counter()
 
-                problems = cursor.execute(
-                    """
-                    SELECT * FROM problems WHERE problem_deck =
-                        (
-                            SELECT deck_id FROM decks
-                            WHERE deck_name = ?
+                    with ConnectionManager.transaction() as connection:
+                        added_in_chunk = ProblemDB._add_chunk(
+                            connection, chunk, defaults, deck_ids, tag_ids
                         )
-                    """,
-                    (deck_name,),
-                )
 
-                # iteration process:
-                for problem in problems:
-                    problem_dict = {}
-                    for key in problem.keys():
-                        problem_dict[key] = problem[key]
-                    yield problem_dict
+                    added += added_in_chunk
+                    if progress is not None:
+                        elapsed = time.perf_counter() - start
+                        progress(added, added_in_chunk / max(elapsed, 1e-9))
+
         except sqlite3.Error as e:
             raise Exception("Failed to open database:", e)
 
+        return added
+
+    @staticmethod
+    def _add_chunk(
+        connection: sqlite3.Connection,
+        chunk: List[ProblemRecord],
+        defaults: Dict[str, Any],
+        deck_ids: Dict[str, int],
+        tag_ids: Dict[str, int],
+    ) -> int:
+        """
+        Writes one chunk of add_problems_bulk inside the caller's
+        transaction. 'defaults' holds the state of new problems (see
+        PROBLEM_STATE). 'deck_ids' and 'tag_ids' are caches shared between
+        chunks and are updated in place.
+        """
+        # serialize and drop duplicated contents (in the chunk and in the db)
+        pending: Dict[
+            bytes, Tuple[Dict, str, str | None, List[str], List[Any]]
+        ] = {}
+        for record in chunk:
+            content, deck, tags = record[:3]
+            state = record[3] if len(record) > 3 else {}
+            content_hash = ProblemDB.content_hash(content)
+            if content_hash not in pending:
+                pending[content_hash] = (
+                    content,
+                    json.dumps(content),
+                    deck,
+                    [tag.strip() for tag in tags or []],
+                    [
+                        default if state.get(key) is None else state[key]
+                        for key, default in defaults.items()
+                    ],
+                )
+
+        hashes = list(pending)
+        for i in range(0, len(hashes), 500):
+            sub_chunk = hashes[i : i + 500]
+            existing = connection.execute(
+                "SELECT problem_content_hash FROM problems "
+                "WHERE problem_content_hash "
+                f"IN ({', '.join('?' * len(sub_chunk))});",
+                sub_chunk,
+            )
+            for (content_hash,) in existing:
+                del pending[content_hash]
+
+        if not pending:
+            return 0
+
+        # resolve decks and tags
+        new_decks = {
+            deck for _, _, deck, _, _ in pending.values() if deck is not None
+        } - deck_ids.keys()
+        deck_ids.update(DeckDB.get_or_add_decks(new_decks))
+        new_tags = {
+            tag for _, _, _, tags, _ in pending.values() for tag in tags
+        } - tag_ids.keys()
+        tag_ids.update(TagDB.get_or_add_tags(new_tags))
+
+        # the transaction holds the write lock, so ids after the current
+        # maximum are free to be assigned here.
+        (last_id,) = connection.execute(
+            "SELECT COALESCE(MAX(problem_id), 0) FROM problems;"
+        ).fetchone()
+
+        problem_rows = []
+        problem_tag_rows = []
+        linked_contents = []
+        for problem_id, (content_hash, record) in enumerate(
+            pending.items(), start=last_id + 1
+        ):
+            content, content_json, deck, tags, state = record
+            linked_contents.append((problem_id, content))
+            problem_rows.append(
+                (
+                    problem_id,
+                    content_json,
+                    content_hash,
+                    deck_ids[deck] if deck is not None else None,
+                    *state,
+                )
+            )
+            for tag in set(tags):
+                problem_tag_rows.append((problem_id, tag_ids[tag]))
+
+        state_columns = [PROBLEM_STATE[key][0] for key in defaults]
+        connection.executemany(
+            f"""
+            INSERT INTO problems (
+                problem_id,
+                problem_content,
+                problem_content_hash,
+                problem_deck,
+                {", ".join(state_columns)}
+            )
+            VALUES ({", ".join("?" * (4 + len(state_columns)))});
+            """,
+            problem_rows,
+        )
+        connection.executemany(
+            "INSERT INTO problems_tags (problem_id, tag_id) VALUES (?, ?);",
+            problem_tag_rows,
+        )
+        MediaDB.link_problems(connection, linked_contents)
+
+        return len(problem_rows)
+
+    @staticmethod
+    def get_all_problems() -> Generator[Problem, None, None]:
+        """
+        Generator function that returns a Problem record containing all the
+        data of a single problem for each iteration.
+        """
+        return ProblemDB._iter_pages(None)
+
+    @staticmethod
+    def get_problems_by_deck(
+        deck_name: str,
+    ) -> Generator[Problem, None, None]:
+        """
+        Generator function that returns a Problem record containing all the
+        data of a single problem for each iteration, where the problem's deck
+        is 'deck_name'.
+        """
+        return ProblemDB._iter_pages(("deck", deck_name))
+
     @staticmethod
     def get_problems_by_tag(
         tag_name: str,
-    ) -> Generator[dict[str, Any], None, None]:
+    ) -> Generator[Problem, None, None]:
         """
-        Generator function that returns a dictionary containing all the data of
-        a single problem for each iteration, where one of the problem's tag is
-        'tag_name'.
+        Generator function that returns a Problem record containing all the
+        data of a single problem for each iteration, where one of the
+        problem's tag is 'tag_name'.
         """
-        try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                connection.row_factory = sqlite3.Row
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON;")
+        return ProblemDB._iter_pages(("tag", tag_name))
 
-                rows = cursor.execute(
-                    """
-                    SELECT problem_id FROM problems_tags WHERE tag_id =
-                       (
-                           SELECT tag_id FROM tags WHERE tag_name = ?
-                       ) 
-                    """,
-                    (tag_name,),
+    @staticmethod
+    def get_problems_by_tag_query(
+        query: str,
+    ) -> Generator[Problem, None, None]:
+        """
+        Generator function that returns a Problem record containing all the
+        data of a single problem for each iteration, where the problem's tags
+        match the boolean expression 'query' (see TagQuery). Raises an
+        Exception right away if 'query' is not well formed.
+        """
+        TagQuery.parse(query)
+        return ProblemDB._iter_pages(("tag_query", query))
+
+    @staticmethod
+    def get_problems_page(
+        filter: Tuple[str, str] | None = None,
+        sort: str = "id",
+        after: Cursor | None = None,
+        page_size: int = PAGE_SIZE,
+    ) -> Tuple[List[Problem], Cursor | None]:
+        """
+        Returns a page of at most 'page_size' problems (as Problem records)
+        and the cursor of the next page, or None if this is the last one.
+
+        'filter' is None (all problems), ("deck", deck_name), ("tag",
+        tag_name) or ("tag_query", query) (see TagQuery). 'sort' is one of
+        SORT_KEYS. 'after' is the cursor returned with the previous page, or
+        None for the first one. Pages are read with keyset pagination, so
+        every page costs the same however deep it is.
+        """
+        join, where, order_by, params = ProblemDB._page_clauses(
+            filter, sort, after
+        )
+
+        # one extra row tells whether there is a next page.
+        rows = list(
+            ProblemDB._iter_problems(
+                f"""
+                SELECT problems.* FROM problems
+                {join}
+                {where}
+                ORDER BY {order_by}
+                LIMIT ?;
+                """,
+                params + [page_size + 1],
+            )
+        )
+
+        if len(rows) <= page_size:
+            return (rows, None)
+
+        rows = rows[:page_size]
+        next_cursor = tuple(rows[-1][key] for key in SORT_KEYS[sort])
+        return (rows, next_cursor)
+
+    @staticmethod
+    def get_problems_listing(
+        filter: Tuple[str, str] | None = None, sort: str = "id"
+    ) -> Generator[Tuple[int, str, str, str, str], None, None]:
+        """
+        Generator function that returns, for each problem matching 'filter'
+        (see get_problems_page), a (problem_id, question, answer, deck_name,
+        creation_date) tuple. Everything is read with a single query: the
+        deck name is joined in SQL and question and answer are extracted from
+        problem_content by SQLite, without decoding it in Python.
+        """
+        join, where, order_by, params = ProblemDB._page_clauses(
+            filter, sort, None
+        )
+        return ProblemDB._iter_listing(
+            f"{LISTING_SELECT} {join} {where} ORDER BY {order_by};", params
+        )
+
+    @staticmethod
+    def get_problems_listing_page(
+        filter: Tuple[str, str] | None = None,
+        sort: str = "id",
+        after: Cursor | None = None,
+        page_size: int = PAGE_SIZE,
+    ) -> Tuple[List[Tuple[int, str, str, str, str]], Cursor | None]:
+        """
+        Same as get_problems_page, but each problem is a listing tuple (see
+        get_problems_listing).
+        """
+        join, where, order_by, params = ProblemDB._page_clauses(
+            filter, sort, after
+        )
+        rows = list(
+            ProblemDB._iter_listing(
+                f"{LISTING_SELECT} {join} {where} "
+                f"ORDER BY {order_by} LIMIT ?;",
+                params + [page_size + 1],
+            )
+        )
+
+        if len(rows) <= page_size:
+            return (rows, None)
+
+        rows = rows[:page_size]
+        next_cursor = tuple(rows[-1][i] for i in LISTING_CURSORS[sort])
+        return (rows, next_cursor)
+
+    @staticmethod
+    def get_problems_listing_by_ids(
+        ids: Iterable[int], filter: Tuple[str, str] | None = None
+    ) -> List[Tuple[int, str, str, str, str]]:
+        """
+        Returns the listing tuples (see get_problems_listing) of the
+        problems of 'ids' that match 'filter' (see get_problems_page), sorted
+        by id. Ids of problems that do not exist are ignored.
+        """
+        ids = sorted(set(ids))
+        join, where, order_by, params = ProblemDB._page_clauses(
+            filter, "id", None
+        )
+
+        rows: List[Tuple[int, str, str, str, str]] = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            condition = (
+                f"problems.problem_id IN ({', '.join('?' * len(chunk))})"
+            )
+            clause = (
+                f"{where} AND {condition}" if where else f"WHERE {condition}"
+            )
+            rows.extend(
+                ProblemDB._iter_listing(
+                    f"{LISTING_SELECT} {join} {clause} "
+                    f"ORDER BY {order_by};",
+                    params + chunk,
                 )
+            )
+        return rows
 
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                connection.row_factory = sqlite3.Row
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON;")
-                for row in rows:
-                    problem_id = row[0]
-                    problem_row = cursor.execute(
-                        """
-                        SELECT * FROM problems where problem_id = ?
-                        """,
-                        (problem_id,),
+    @staticmethod
+    def search_listing(
+        query: str, limit: int = 50, offset: int = 0
+    ) -> Iterator[Tuple[int, str, str, str, str]]:
+        """
+        Same as ProblemDB.search, but each problem is a listing tuple (see
+        get_problems_listing).
+        """
+        fts_query = ProblemDB._fts_query(query)
+        if fts_query is None:
+            return iter(())
+
+        return ProblemDB._iter_listing(
+            f"""
+            {LISTING_SELECT}
+            JOIN (
+                SELECT rowid, rank FROM problems_fts
+                WHERE problems_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            ) AS matches ON matches.rowid = problems.problem_id
+            ORDER BY matches.rank;
+            """,
+            (fts_query, limit, offset),
+        )
+
+    @staticmethod
+    def _page_clauses(
+        filter: Tuple[str, str] | None, sort: str, after: Cursor | None
+    ) -> Tuple[str, str, str, List[Any]]:
+        """
+        Returns the JOIN and WHERE clauses, the ORDER BY columns and the
+        parameters selecting the page after 'after' (see get_problems_page).
+
+        A query on a single tag is driven from problems_tags: the page is
+        read from 'idx_problems_tags_tag', so it costs the same however many
+        problems have the tag. Other tag queries select the problems among
+        those matching the compiled query.
+        """
+        if sort not in SORT_KEYS:
+            raise Exception(f"Unknown sort key '{sort}'.")
+
+        join = ""
+        conditions: List[str] = []
+        params: List[Any] = []
+        # table whose problem_id orders the page.
+        id_table = "problems"
+
+        if filter is not None:
+            kind, value = filter
+            if kind == "deck":
+                conditions.append(
+                    "problems.problem_deck = "
+                    "(SELECT deck_id FROM decks WHERE deck_name = ?)"
+                )
+                params.append(value)
+            elif kind in ("tag", "tag_query"):
+                node = (
+                    TagQuery.tag(value)
+                    if kind == "tag"
+                    else TagQuery.parse(value)
+                )
+                if node[0] == "tag":
+                    join = (
+                        "JOIN problems_tags "
+                        "ON problems_tags.problem_id = problems.problem_id"
+                    )
+                    conditions.append(
+                        "problems_tags.tag_id = "
+                        "(SELECT tag_id FROM tags WHERE tag_name = ?)"
+                    )
+                    params.append(node[1])
+                    id_table = "problems_tags"
+                else:
+                    matches_sql, matches_params = TagQuery.compile(node)
+                    conditions.append(
+                        f"problems.problem_id IN ({matches_sql})"
                     )
-                    problem_dict = {}
-                    for problem in problem_row:
-                        for key in problem.keys():
-                            problem_dict[key] = problem[key]
+                    params.extend(matches_params)
+            else:
+                raise Exception(f"Unknown filter '{kind}'.")
+
+        if after is not None:
+            if sort == "id":
+                conditions.append(f"{id_table}.problem_id > ?")
+                params.extend(after)
+            elif after[0] is None:
+                # NULL dates sort first: finish them, then go on with the
+                # rest.
+                conditions.append(
+                    "((problems.problem_creation_date IS NULL "
+                    "AND problems.problem_id > ?) "
+                    "OR problems.problem_creation_date IS NOT NULL)"
+                )
+                params.append(after[1])
+            else:
+                conditions.append(
+                    "(problems.problem_creation_date, problems.problem_id) "
+                    "> (?, ?)"
+                )
+                params.extend(after)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order_by = ", ".join(
+            f"{id_table if key == 'problem_id' else 'problems'}.{key}"
+            for key in SORT_KEYS[sort]
+        )
+        return (join, where, order_by, params)
+
+    @staticmethod
+    def _iter_pages(
+        filter: Tuple[str, str] | None, sort: str = "id"
+    ) -> Generator[Problem, None, None]:
+        """
+        Generator function that walks every page of get_problems_page, so no
+        statement stays open while the caller consumes the problems.
+        """
+        after: Cursor | None = None
+        while True:
+            problems, after = ProblemDB.get_problems_page(filter, sort, after)
+            yield from problems
+            if after is None:
+                return
 
-                    yield problem_dict
+    @staticmethod
+    def search(
+        query: str, limit: int = 50, offset: int = 0
+    ) -> Iterator[Problem]:
+        """
+        Returns an iterator over the Problem records, with all the data of
+        each problem, of the problems whose question or answer contain every
+        word of 'query', best matches first. LaTeX control sequences (e.g.
+        \\int) are matched as words and the last word (if it has two
+        characters or more) is matched as a prefix, so partial input already
+        finds results.
+        """
+        fts_query = ProblemDB._fts_query(query)
+        if fts_query is None:
+            return iter(())
 
+        return ProblemDB._iter_problems(
+            """
+            SELECT problems.* FROM (
+                SELECT rowid, rank FROM problems_fts
+                WHERE problems_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            ) AS matches
+            JOIN problems ON problems.problem_id = matches.rowid
+            ORDER BY matches.rank;
+            """,
+            (fts_query, limit, offset),
+        )
+
+    @staticmethod
+    def _fts_query(query: str) -> str | None:
+        """
+        Turns the user's search input into an FTS5 query, or None if there is
+        nothing to search for.
+        """
+        terms = query.split()
+        if not terms:
+            return None
+
+        # quote every term so that FTS5 operators and punctuation in the
+        # user's input are searched for literally.
+        fts_query = " ".join(
+            '"' + term.replace('"', '""') + '"' for term in terms
+        )
+        if len(terms[-1]) >= 2:
+            fts_query += "*"
+        return fts_query
+
+    @staticmethod
+    def _iter_listing(
+        sql: str, params: Sequence[Any]
+    ) -> Generator[Tuple[int, str, str, str, str], None, None]:
+        """
+        Generator function that runs a listing query and returns its rows.
+        """
+        try:
+            yield from ConnectionManager.get_connection().execute(sql, params)
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+    @staticmethod
+    def _iter_problems(
+        sql: str, params: Sequence[Any]
+    ) -> Generator[Problem, None, None]:
+        """
+        Generator function that runs 'sql' and returns a Problem record for
+        each problem row it selects.
+        """
+        try:
+            cursor = ConnectionManager.get_connection().cursor()
+            problems = cursor.execute(sql, params)
+            cursor.row_factory = Problem.row_factory(cursor)
+
+            yield from problems
+
+        except sqlite3.OperationalError as e:
+            raise Exception("Failed to open database:", e)
         except sqlite3.Error as e:
             raise Exception("Failed to open database:", e)
@@ -0,0 +1,173 @@
+import datetime
+import sqlite3
+import time
+from typing import Any, Collection, List, Tuple
+
+from db.connection import ConnectionManager
+from db.problem import Problem
+from db.problem_db import ProblemDB
+
+# Review feedback, as SM-2 quality grades (0 to 5). Grades below
+# FEEDBACK_HARD count as a failed recall.
+FEEDBACK_AGAIN = 0
+FEEDBACK_HARD = 3
+FEEDBACK_GOOD = 4
+FEEDBACK_EASY = 5
+
+MIN_EASE = 1.3
+# a failed problem comes back within the same session.
+RELEARN_DELAY = 10 * 60  # seconds
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class Scheduler:
+    """
+    SM-2 spaced repetition over the problems table. Each review turns the
+    feedback into a new interval and ease factor and stores the time at
+    which the problem is next due in problem_due.
+    """
+
+    @staticmethod
+    def next_state(
+        interval: float, ease: float, feedback: int
+    ) -> Tuple[float, float]:
+        """
+        Returns the (interval, ease) that follow a review with 'feedback'
+        of a problem whose current interval (in days) and ease are
+        'interval' and 'ease'. An interval of 0 means the problem has to be
+        learned again.
+        """
+        if not FEEDBACK_AGAIN <= feedback <= FEEDBACK_EASY:
+            raise Exception(f"Invalid review feedback: {feedback}.")
+
+        ease = max(
+            MIN_EASE,
+            ease + 0.1 - (5 - feedback) * (0.08 + (5 - feedback) * 0.02),
+        )
+
+        if feedback < FEEDBACK_HARD:
+            return (0, ease)
+        if interval < 1:
+            return (1, ease)
+        if interval < 6:
+            return (6, ease)
+        return (round(interval * ease), ease)
+
+    @staticmethod
+    def review(
+        problem_id: int, feedback: int, now: float | None = None
+    ) -> int:
+        """
+        Records a review of the problem 'problem_id' with 'feedback' (one of
+        the FEEDBACK_* grades) at Unix time 'now' (defaults to the current
+        time). Returns the Unix time at which the problem is next due.
+        """
+        now = time.time() if now is None else now
+        try:
+            with ConnectionManager.transaction() as conn:
+                row = conn.execute(
+                    "SELECT problem_interval, problem_ease FROM problems "
+                    "WHERE problem_id = ?;",
+                    (problem_id,),
+                ).fetchone()
+                if row is None:
+                    raise Exception(f"There is no problem {problem_id}.")
+
+                interval, ease = Scheduler.next_state(row[0], row[1], feedback)
+                if interval == 0:
+                    due = int(now) + RELEARN_DELAY
+                else:
+                    due = int(now + interval * SECONDS_PER_DAY)
+
+                conn.execute(
+                    """
+                    UPDATE problems SET
+                        problem_review_count =
+                            COALESCE(problem_review_count, 0) + 1,
+                        problem_last_review_date = ?,
+                        problem_feedback = ?,
+                        problem_interval = ?,
+                        problem_ease = ?,
+                        problem_due = ?
+                    WHERE problem_id = ?;
+                    """,
+                    (
+                        datetime.datetime.fromtimestamp(now).isoformat(
+                            sep=" ", timespec="seconds"
+                        ),
+                        feedback,
+                        interval,
+                        ease,
+                        due,
+                        problem_id,
+                    ),
+                )
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return due
+
+    @staticmethod
+    def get_due(
+        deck_name: str | None = None,
+        limit: int = 20,
+        now: float | None = None,
+        exclude: Collection[int] = (),
+    ) -> List[Problem]:
+        """
+        Returns up to 'limit' problems due at Unix time 'now' (defaults to
+        the current time), most overdue first, leaving out the problems whose
+        problem_id is in 'exclude'. If 'deck_name' is given, only problems of
+        that deck are considered.
+        """
+        now = time.time() if now is None else now
+        conditions = ["problem_due <= ?"]
+        params: List[Any] = [int(now)]
+
+        if deck_name is not None:
+            conditions.append(
+                "problem_deck = (SELECT deck_id FROM decks WHERE deck_name = ?)"
+            )
+            params.append(deck_name)
+
+        if exclude:
+            conditions.append(
+                f"problem_id NOT IN ({', '.join('?' * len(exclude))})"
+            )
+            params.extend(exclude)
+
+        return list(
+            ProblemDB._iter_problems(
+                f"""
+                SELECT * FROM problems
+                WHERE {' AND '.join(conditions)}
+                ORDER BY problem_due
+                LIMIT ?;
+                """,
+                params + [limit],
+            )
+        )
+
+    @staticmethod
+    def count_due(deck_name: str, now: float | None = None) -> int:
+        """
+        Returns the number of problems of 'deck_name' due at Unix time 'now'
+        (defaults to the current time).
+        """
+        now = time.time() if now is None else now
+        try:
+            return (
+                ConnectionManager.get_connection()
+                .execute(
+                    """
+                    SELECT COUNT(*) FROM problems
+                    WHERE problem_deck =
+                        (SELECT deck_id FROM decks WHERE deck_name = ?)
+                    AND problem_due <= ?;
+                    """,
+                    (deck_name, int(now)),
+                )
+                .fetchone()[0]
+            )
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
@@ -0,0 +1,99 @@
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+from db.catalog import Catalog
+from db.connection import ConnectionManager
+
+# (name, number of problems, number of due problems, Unix time of the last
+# change or None)
+Counts = Tuple[str, int, int, int | None]
+
+
+class StatsDB:
+    """
+    Per-deck and per-tag problem counts. Names come from the Catalog and
+    totals from the aggregates table, which triggers keep current (see
+    migration 8), so reading them costs O(decks + tags) whatever the size of
+    the collection.
+
+    Due counts depend on the current time, which no trigger can follow:
+    they are the problems never reviewed (counted in aggregates) plus the
+    reviewed problems whose due time has passed, counted with a range scan
+    of idx_problems_due. The latter only visits problems that are due.
+    """
+
+    @staticmethod
+    def get_deck_counts(now: float | None = None) -> List[Counts]:
+        """
+        Returns the counts of every deck (including empty ones) at Unix time
+        'now' (defaults to the current time), sorted by deck name.
+        """
+        return StatsDB._counts(
+            "deck",
+            Catalog.deck_items(),
+            """
+            SELECT problem_deck, COUNT(*) FROM problems
+            WHERE problem_due BETWEEN 1 AND ?
+            GROUP BY problem_deck;
+            """,
+            now,
+        )
+
+    @staticmethod
+    def get_tag_counts(now: float | None = None) -> List[Counts]:
+        """
+        Returns the counts of every tag at Unix time 'now' (defaults to the
+        current time), sorted by tag name.
+        """
+        return StatsDB._counts(
+            "tag",
+            Catalog.tag_items(),
+            """
+            SELECT problems_tags.tag_id, COUNT(*) FROM problems
+            JOIN problems_tags
+                ON problems_tags.problem_id = problems.problem_id
+            WHERE problems.problem_due BETWEEN 1 AND ?
+            GROUP BY problems_tags.tag_id;
+            """,
+            now,
+        )
+
+    @staticmethod
+    def _counts(
+        kind: str,
+        items: List[Tuple[int, str]],
+        due_sql: str,
+        now: float | None,
+    ) -> List[Counts]:
+        """
+        Joins the names of 'items' (the catalog's sorted (id, name) tuples)
+        with their aggregates of 'kind' and the due counts of 'due_sql'.
+        """
+        now = time.time() if now is None else now
+        try:
+            connection = ConnectionManager.get_connection()
+            aggregates: Dict[int, Tuple[int, int, int | None]] = {
+                owner: (n_problems, n_new, modified)
+                for owner, n_problems, n_new, modified in connection.execute(
+                    """
+                    SELECT
+                        aggregate_id,
+                        aggregate_problems,
+                        aggregate_new,
+                        aggregate_modified
+                    FROM aggregates WHERE aggregate_kind = ?;
+                    """,
+                    (kind,),
+                )
+            }
+            due = dict(connection.execute(due_sql, (int(now),)).fetchall())
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        counts: List[Counts] = []
+        for owner, name in items:
+            n_problems, n_new, modified = aggregates.get(owner, (0, 0, None))
+            n_due = n_new + due.get(owner, 0)
+            counts.append((name, n_problems, n_due, modified))
+        return counts
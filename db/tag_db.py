@@ -1,6 +1,7 @@
 import sqlite3
-from utils.program_paths import ProgramPaths
-from typing import Generator
+from db.catalog import Catalog
+from db.connection import ConnectionManager
+from typing import Dict, Generator, Iterable
 
 
 class TagDB:
@@ -11,42 +12,65 @@ class TagDB:
         """
         tag_name = tag.strip()
         try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                cursor = connection.cursor()
-                cursor.execute("PRAGMA foreign_keys = ON;")
-
-                cursor.execute(
+            with ConnectionManager.transaction() as connection:
+                cursor = connection.execute(
                     "INSERT OR IGNORE INTO tags(tag_name) VALUES(?);",
                     (tag_name,),
                 )
-
-                connection.commit()
+                if cursor.rowcount > 0:
+                    Catalog.mark_changed()
 
         except sqlite3.OperationalError as e:
             raise Exception("Failed to open database:", e)
         except sqlite3.Error as e:
             raise Exception("Failed to open database:", e)
 
+    @staticmethod
+    def get_or_add_tags(tags: Iterable[str]) -> Dict[str, int]:
+        """
+        Adds every tag in 'tags' that is not in the db yet and returns a
+        dictionary mapping each (stripped) tag name to its tag_id.
+        """
+        tag_names = list({tag.strip() for tag in tags})
+        tag_ids: Dict[str, int] = {}
+        if not tag_names:
+            return tag_ids
+
+        try:
+            with ConnectionManager.transaction() as connection:
+                cursor = connection.executemany(
+                    "INSERT OR IGNORE INTO tags(tag_name) VALUES(?);",
+                    ((tag_name,) for tag_name in tag_names),
+                )
+                if cursor.rowcount > 0:
+                    Catalog.mark_changed()
+                for i in range(0, len(tag_names), 500):
+                    chunk = tag_names[i : i + 500]
+                    rows = connection.execute(
+                        "SELECT tag_name, tag_id FROM tags WHERE tag_name IN "
+                        f"({', '.join('?' * len(chunk))});",
+                        chunk,
+                    )
+                    tag_ids.update(rows)
+
+        except sqlite3.Error as e:
+            raise Exception("Failed to open database:", e)
+
+        return tag_ids
+
     @staticmethod
     def get_all_tags() -> Generator[str, None, None]:
         try:
-            with sqlite3.connect(
-                ProgramPaths.get_user_db_path()
-            ) as connection:
-                cursor = connection.cursor()
-                connection.row_factory = sqlite3.Row
-                cursor.execute("PRAGMA foreign_keys = ON;")
-
-                tags = cursor.execute("SELECT tag_name FROM tags;")
-
-                for tag in tags:
-                    tag_str = tag[0]
-                    if isinstance(tag_str, str):
-                        yield tag_str
-                    else:
-                        raise Exception("tag is not str in genfunc")
+            tags = ConnectionManager.get_connection().execute(
+                "SELECT tag_name FROM tags;"
+            )
+
+            for tag in tags:
+                tag_str = tag[0]
+                if isinstance(tag_str, str):
+                    yield tag_str
+                else:
+                    raise Exception("tag is not str in genfunc")
 
         except sqlite3.Error as e:
             raise Exception("Failed to access db: ", e)
@@ -0,0 +1,201 @@
+import re
+from typing import List, Tuple
+
+# A parsed query is a tree of tuples:
+#   ("tag", name) | ("not", node) | ("and", [nodes]) | ("or", [nodes])
+Node = Tuple
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_OPERATORS = ("AND", "OR", "NOT")
+
+
+class TagQuery:
+    """
+    Boolean expressions over tags, e.g.
+
+        algebra AND (proof OR induction) AND NOT easy
+
+    Operators are AND, OR and NOT (case-insensitive) and parentheses group
+    sub-expressions. Consecutive words form a single tag name, so
+    'linear algebra AND proof' matches the tags 'linear algebra' and
+    'proof'. Tag names containing operators or parentheses can be written
+    between double quotes.
+    """
+
+    @staticmethod
+    def tag(tag_name: str) -> Node:
+        """
+        Returns the query that matches the problems tagged with 'tag_name'.
+        """
+        return ("tag", tag_name.strip())
+
+    @staticmethod
+    def parse(query: str) -> Node:
+        """
+        Parses 'query' into a query tree. Raises an Exception if the query is
+        not well formed.
+        """
+        tokens = TagQuery._tokenize(query)
+        if not tokens:
+            raise Exception("Invalid tag query: the query is empty.")
+
+        node, position = TagQuery._parse_or(tokens, 0)
+        if position != len(tokens):
+            raise Exception(
+                f"Invalid tag query: unexpected '{tokens[position][1]}'."
+            )
+        return node
+
+    @staticmethod
+    def compile(node: Node) -> Tuple[str, List[str]]:
+        """
+        Compiles a query tree into a single SELECT statement returning the
+        distinct problem_id of every matching problem, and its parameters.
+        """
+        kind = node[0]
+
+        if kind == "tag":
+            return (
+                """
+                SELECT DISTINCT problems_tags.problem_id FROM problems_tags
+                JOIN tags ON tags.tag_id = problems_tags.tag_id
+                WHERE tags.tag_name = ?
+                """,
+                [node[1]],
+            )
+
+        if kind == "not":
+            sql, params = TagQuery.compile(node[1])
+            return (
+                f"SELECT problem_id FROM problems EXCEPT {_wrap(sql)}",
+                params,
+            )
+
+        if kind == "or":
+            parts = [TagQuery.compile(child) for child in node[1]]
+            return (
+                " UNION ".join(_wrap(sql) for sql, _ in parts),
+                [param for _, params in parts for param in params],
+            )
+
+        # "and": intersect the positive terms, then subtract the negated
+        # ones, so 'a AND NOT b' becomes 'a EXCEPT b'.
+        positives = [child for child in node[1] if child[0] != "not"]
+        negatives = [child[1] for child in node[1] if child[0] == "not"]
+        if not positives:
+            positives = [("all",)]
+
+        sql_parts: List[str] = []
+        params: List[str] = []
+        for child in positives:
+            if child[0] == "all":
+                sql_parts.append("SELECT problem_id FROM problems")
+                continue
+            child_sql, child_params = TagQuery.compile(child)
+            sql_parts.append(_wrap(child_sql))
+            params.extend(child_params)
+        sql = " INTERSECT ".join(sql_parts)
+
+        for child in negatives:
+            child_sql, child_params = TagQuery.compile(child)
+            sql += f" EXCEPT {_wrap(child_sql)}"
+            params.extend(child_params)
+
+        return (sql, params)
+
+    @staticmethod
+    def _tokenize(query: str) -> List[Tuple[str, str]]:
+        """
+        Splits 'query' into ("(" | ")" | "op" | "tag", text) tokens, joining
+        consecutive unquoted words into a single tag name.
+        """
+        tokens: List[Tuple[str, str]] = []
+        position = 0
+        query = query.strip()
+        while position < len(query):
+            match = _TOKEN_RE.match(query, position)
+            if match is None or match.end() == position:
+                raise Exception(
+                    f"Invalid tag query: unexpected '{query[position:]}'."
+                )
+            position = match.end()
+            opening, closing, quoted, word = match.groups()
+
+            if opening:
+                tokens.append(("(", opening))
+            elif closing:
+                tokens.append((")", closing))
+            elif quoted is not None:
+                tokens.append(("tag", re.sub(r"\\(.)", r"\1", quoted)))
+            elif word.upper() in _OPERATORS:
+                tokens.append(("op", word.upper()))
+            elif tokens and tokens[-1][0] == "word":
+                tokens[-1] = ("word", f"{tokens[-1][1]} {word}")
+            else:
+                tokens.append(("word", word))
+
+        return [
+            ("tag", text) if kind == "word" else (kind, text)
+            for kind, text in tokens
+        ]
+
+    @staticmethod
+    def _parse_or(
+        tokens: List[Tuple[str, str]], position: int
+    ) -> Tuple[Node, int]:
+        children = []
+        node, position = TagQuery._parse_and(tokens, position)
+        children.append(node)
+        while position < len(tokens) and tokens[position] == ("op", "OR"):
+            node, position = TagQuery._parse_and(tokens, position + 1)
+            children.append(node)
+
+        if len(children) == 1:
+            return (children[0], position)
+        return (("or", children), position)
+
+    @staticmethod
+    def _parse_and(
+        tokens: List[Tuple[str, str]], position: int
+    ) -> Tuple[Node, int]:
+        children = []
+        node, position = TagQuery._parse_not(tokens, position)
+        children.append(node)
+        while position < len(tokens) and tokens[position] == ("op", "AND"):
+            node, position = TagQuery._parse_not(tokens, position + 1)
+            children.append(node)
+
+        if len(children) == 1:
+            return (children[0], position)
+        return (("and", children), position)
+
+    @staticmethod
+    def _parse_not(
+        tokens: List[Tuple[str, str]], position: int
+    ) -> Tuple[Node, int]:
+        if position >= len(tokens):
+            raise Exception("Invalid tag query: unexpected end of query.")
+
+        kind, text = tokens[position]
+        if (kind, text) == ("op", "NOT"):
+            node, position = TagQuery._parse_not(tokens, position + 1)
+            return (("not", node), position)
+
+        if kind == "(":
+            node, position = TagQuery._parse_or(tokens, position + 1)
+            if position >= len(tokens) or tokens[position][0] != ")":
+                raise Exception("Invalid tag query: missing ')'.")
+            return (node, position + 1)
+
+        if kind == "tag":
+            return (TagQuery.tag(text), position + 1)
+
+        raise Exception(f"Invalid tag query: unexpected '{text}'.")
+
+
+def _wrap(sql: str) -> str:
+    """
+    Wraps a compound SELECT so it can be used as one operand of another
+    compound SELECT (SQLite evaluates compound operators left to right).
+    """
+    return f"SELECT problem_id FROM ({sql})"
@@ -0,0 +1,5 @@
+import sys
+
+from maths_problems.cli import main
+
+sys.exit(main())
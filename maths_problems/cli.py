@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+from typing import Callable, Dict, List, TextIO
+
+from db.archive import Archive
+from db.backup import Backup
+from db.db import check_or_create_user_db
+from db.maintenance import Maintenance
+from db.problem_db import ProblemDB
+from db.stats_db import StatsDB
+from utils.constants import PROGRAM_NAME
+from utils.program_paths import ProgramPaths
+
+# number of results of 'search QUERY' when --limit is not given.
+SEARCH_LIMIT = 50
+
+
+def main(argv: List[str] | None = None) -> int:
+    """
+    Runs the command line 'argv' (defaults to sys.argv[1:]) and returns the
+    exit status. Results go to stdout as they are read; messages and
+    progress go to stderr, so the output can be piped.
+    """
+    args = _parser().parse_args(argv)
+
+    try:
+        # the db layer reports on stdout: keep it out of the results.
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.profile is not None:
+                # select_user would create a profile that does not exist.
+                if args.profile not in ProgramPaths.get_list_of_users():
+                    raise Exception(f"No profile named '{args.profile}'.")
+                ProgramPaths.select_user(args.profile, remember=False)
+            # a short-lived process could be killed in the middle of an
+            # automatic backup.
+            Backup.configure(every_n_writes=0)
+            check_or_create_user_db()
+
+        return COMMANDS[args.command](args, sys.stdout)
+
+    except BrokenPipeError:
+        # the reader (e.g. head) is gone: stop quietly.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+def _import(args: argparse.Namespace, out: TextIO) -> int:
+    def progress(added: int, rate: float) -> None:
+        print(
+            f"{added} problems added ({rate:.0f} problems/s)",
+            file=sys.stderr,
+        )
+
+    with contextlib.redirect_stdout(sys.stderr):
+        added = Archive.import_collection(
+            args.path, chunk_size=args.chunk_size, progress=progress
+        )
+    print(added, file=out)
+    return 0
+
+
+def _export(args: argparse.Namespace, out: TextIO) -> int:
+    print(Archive.export_collection(args.path), file=out)
+    return 0
+
+
+def _search(args: argparse.Namespace, out: TextIO) -> int:
+    if args.query is not None and (
+        args.deck is not None or args.tags is not None
+    ):
+        raise Exception("A text query cannot be combined with --deck/--tags.")
+
+    if args.query is not None:
+        rows = ProblemDB.search_listing(
+            args.query, limit=args.limit or SEARCH_LIMIT
+        )
+    else:
+        if args.deck is not None:
+            filter = ("deck", args.deck)
+        elif args.tags is not None:
+            filter = ("tag_query", args.tags)
+        else:
+            filter = None
+        rows = ProblemDB.get_problems_listing(filter, args.sort)
+
+    n_rows = 0
+    for id, question, answer, deck, creation_date in rows:
+        if args.limit is not None and n_rows == args.limit:
+            break
+        if args.json:
+            line = json.dumps(
+                {
+                    "id": id,
+                    "deck": deck,
+                    "creation_date": creation_date,
+                    "question": question,
+                    "answer": answer,
+                },
+                ensure_ascii=False,
+            )
+        else:
+            line = "\t".join(
+                _escape(str(value))
+                for value in (id, deck, creation_date, question, answer)
+            )
+        print(line, file=out)
+        n_rows += 1
+
+    return 0
+
+
+def _stats(args: argparse.Namespace, out: TextIO) -> int:
+    counts = (
+        StatsDB.get_tag_counts() if args.tags else StatsDB.get_deck_counts()
+    )
+
+    for name, n_problems, n_due, _ in counts:
+        if args.json:
+            line = json.dumps(
+                {"name": name, "problems": n_problems, "due": n_due},
+                ensure_ascii=False,
+            )
+        else:
+            line = f"{_escape(name)}\t{n_problems}\t{n_due}"
+        print(line, file=out)
+
+    return 0
+
+
+def _vacuum(args: argparse.Namespace, out: TextIO) -> int:
+    before, after = Maintenance.vacuum()
+    print(f"{before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB", file=out)
+    return 0
+
+
+def _verify(args: argparse.Namespace, out: TextIO) -> int:
+    n_issues = 0
+    for issue in Maintenance.verify():
+        print(issue, file=out, flush=True)
+        n_issues += 1
+
+    if n_issues > 0:
+        print(f"{n_issues} issue(s) found.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _escape(value: str) -> str:
+    """
+    Escapes the characters that would break a line of tab separated values.
+    """
+    return (
+        value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+    )
+
+
+COMMANDS: Dict[str, Callable[[argparse.Namespace, TextIO], int]] = {
+    "import": _import,
+    "export": _export,
+    "search": _search,
+    "stats": _stats,
+    "vacuum": _vacuum,
+    "verify": _verify,
+}
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m maths_problems",
+        description=f"Batch operations on a {PROGRAM_NAME} collection.",
+    )
+    parser.add_argument(
+        "--profile",
+        help="profile to work on (defaults to the last one used)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "import", help="add the contents of an exported collection"
+    )
+    command.add_argument("path")
+    command.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1000,
+        help="problems written per transaction",
+    )
+
+    command = commands.add_parser(
+        "export", help="write the collection to a zip archive"
+    )
+    command.add_argument("path")
+
+    command = commands.add_parser(
+        "search",
+        help="list problems as tab separated values: id, deck, creation "
+        "date, question and answer",
+    )
+    command.add_argument(
+        "query", nargs="?", help="words to search for, best matches first"
+    )
+    filters = command.add_mutually_exclusive_group()
+    filters.add_argument("--deck", help="only the problems of this deck")
+    filters.add_argument(
+        "--tags", help="only the problems matching this tag expression"
+    )
+    command.add_argument(
+        "--sort", choices=("id", "creation_date"), default="id"
+    )
+    command.add_argument("--limit", type=int)
+    command.add_argument(
+        "--json", action="store_true", help="one JSON object per line"
+    )
+
+    command = commands.add_parser(
+        "stats", help="number of problems and of due problems per deck"
+    )
+    command.add_argument(
+        "--tags", action="store_true", help="per tag instead of per deck"
+    )
+    command.add_argument(
+        "--json", action="store_true", help="one JSON object per line"
+    )
+
+    commands.add_parser(
+        "vacuum", help="compact the database and refresh its statistics"
+    )
+    commands.add_parser(
+        "verify",
+        help="check the database, printing each issue found (exit status 1 "
+        "if any)",
+    )
+
+    return parser
@@ -1,11 +1,11 @@
 import re
-from typing import override, List
+from typing import Dict, Iterable, List
 
 from PySide6.QtCore import Qt, Signal, QTimer
-from PySide6.QtGui import QCloseEvent, QFont, QFontMetrics, QMouseEvent
-from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtGui import QCloseEvent, QFont, QFontMetrics
 from PySide6.QtWidgets import (
     QComboBox,
+    QFileDialog,
     QHBoxLayout,
     QLabel,
     QLayout,
@@ -19,22 +19,24 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
-from db.deck_db import DeckDB
+from db.catalog import Catalog
+from db.media_db import MediaDB
 from db.problem_db import ProblemDB
-from ui.ui_utils import (
-    NoInternetProfile,
-    DeckUpdReciever,
-    ProblemsUpdEmitter,
-    TagsUpdEmitter,
+from ui.db_worker import DBWorker
+from ui.event_bus import (
+    CollectionReplaced,
+    DeckAdded,
+    DeckRemoved,
+    Event,
+    EventBus,
+    ProblemsChanged,
+    TagsAdded,
 )
+from ui.preview import MathPreview
+from ui.web import NoInternetProfile
 
 # CONSTANTS
-from utils.constants import (
-    MAIN_DIR,
-    MATHJAX3_PATH,
-    PROGRAM_NAME,
-    USER_MEDIA_QURL,
-)
+from utils.constants import PROGRAM_NAME
 
 
 class TagSelectorWidget(QWidget):
@@ -142,22 +144,21 @@ class TagSelectorWidget(QWidget):
         return tags
 
 
-class AddProblemWindow(
-    QWidget, DeckUpdReciever, ProblemsUpdEmitter, TagsUpdEmitter
-):
+class AddProblemWindow(QWidget):
     """
     Window for adding new 'exercises' to the database.
     """
 
     closed = Signal(bool)
-    problem_added = Signal(bool)
-    tags_updated = Signal(bool)
 
     def __init__(self):
         """ """
         super().__init__()
         self.setWindowTitle(f"{PROGRAM_NAME} - Add New")
 
+        for event_type in (DeckAdded, DeckRemoved, CollectionReplaced):
+            EventBus.subscribe(event_type, self._decks_changed)
+
         layout = QVBoxLayout()
 
         # Deck selection --------------------------------
@@ -187,12 +188,21 @@ class AddProblemWindow(
         # html preview ---------------------------------
         self.html_label = QLabel("Preview")
         self.profile = NoInternetProfile()
-        self.html_viewer = QWebEngineView(self.profile)
-        self.html_viewer.setHtml("<br>")
-        # self.html_viewer.load(QUrl("https://www.google.com"))
+        self.html_viewer = MathPreview(self.profile)
         self.front_edit.textChanged.connect(self.update_preview)
         self.back_edit.textChanged.connect(self.update_preview)
 
+        # insert image button
+        self.last_edit = self.front_edit
+        self.front_edit.cursorPositionChanged.connect(
+            lambda: setattr(self, "last_edit", self.front_edit)
+        )
+        self.back_edit.cursorPositionChanged.connect(
+            lambda: setattr(self, "last_edit", self.back_edit)
+        )
+        self.insert_image_button = QPushButton("Insert image...")
+        self.insert_image_button.clicked.connect(self.insert_image)
+
         # add deck button
         self.button = QPushButton("Add Problem")
         self.button.clicked.connect(self.add_problem)
@@ -213,6 +223,9 @@ class AddProblemWindow(
         # -- back -------------------------
         layout.addWidget(self.back_label)
         layout.addWidget(self.back_edit)
+        layout.addWidget(
+            self.insert_image_button, alignment=Qt.AlignmentFlag.AlignLeft
+        )
 
         # -- preview ----------------------
         layout.addWidget(self.html_label)
@@ -227,56 +240,69 @@ class AddProblemWindow(
 
     def update_preview(self) -> None:
         """
-        Updates html preview with contents of self.front_edit and self.back_edit
-        """
-        self.html_viewer.setHtml("<br>")
-        html_header: str = (
-            """<head>
-        <script>
-        MathJax = {
-          tex: {
-            inlineMath: {'[+]': [['$', '$']]}
-          },
-          svg: {
-            fontCache: 'global'
-          }
-        };
-        </script>
+        Updates html preview with contents of self.front_edit and
+        self.back_edit. The preview is typeset once the edits stop (see
+        MathPreview).
         """
-            + f'<script src="file://{MAIN_DIR}/{MATHJAX3_PATH}"></script>'
-            + "</head>"
+        self.html_viewer.set_contents(
+            self.front_edit.toPlainText(), self.back_edit.toPlainText()
         )
 
-        html_content: str = (
-            f"<!DOCTYPE html>\n<html>\n{html_header}\n"
-            f"<body>\n{self.front_edit.toPlainText()}\n"
-            + "<hr>\n"
-            + f"{self.back_edit.toPlainText()}\n</body>\n</html>"
+    def insert_image(self) -> None:
+        """
+        Adds an image file to the media store in the background and inserts
+        an <img> tag referring to it where the cursor of the last edited
+        text box is.
+        """
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Insert image", "", "Images (*.png *.jpg *.jpeg *.gif *.svg)"
+        )
+        if path == "":
+            return
+
+        edit = self.last_edit
+        DBWorker.submit(
+            MediaDB.add_file,
+            path,
+            on_result=lambda name: edit.insertPlainText(f'<img src="{name}">'),
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The image could not be added: {e}"
+            ),
         )
-
-        self.html_viewer.setHtml(html_content, baseUrl=USER_MEDIA_QURL)
-        self.html_viewer.update()
 
     def add_problem(self) -> None:
+        """
+        Adds the problem to the db in the background. The input is cleared
+        once it has been stored.
+        """
         content = {
             "question": self.front_edit.toPlainText(),
             "answer": self.back_edit.toPlainText(),
         }
         tags = self.tags_selector.tags()
-        if len(tags) > 0:
-            ProblemDB.add_problem(
-                content=content,
-                deck=self.deck_selector.currentText(),
-                tags=tags,
-            )
-            self.tags_updated_emitter()
 
-        else:
-            ProblemDB.add_problem(
-                content=content, deck=self.deck_selector.currentText()
-            )
+        self.button.setEnabled(False)
+        DBWorker.submit(
+            ProblemDB.add_problem,
+            content,
+            self.deck_selector.currentText(),
+            tags if len(tags) > 0 else None,
+            on_result=lambda problem_id: self._problem_stored(
+                problem_id, content, tags
+            ),
+            on_error=self._problem_not_stored,
+        )
+
+    def _problem_stored(
+        self, problem_id: int, content: Dict[str, str], tags: List[str]
+    ) -> None:
+        self.button.setEnabled(True)
+        # the preview's renders of the problem are shown again on review.
+        self.html_viewer.store_renders(content["question"], content["answer"])
+        if tags:
+            EventBus.publish(TagsAdded(tags))
 
-        self.problem_added.emit(True)
+        EventBus.publish(ProblemsChanged(inserted=[problem_id]))
         # clean all data:
         self.front_edit.clear()
         self.back_edit.clear()
@@ -291,6 +317,12 @@ class AddProblemWindow(
         # self.closed.emit(True)
         # self.close()
 
+    def _problem_not_stored(self, error: Exception) -> None:
+        self.button.setEnabled(True)
+        QMessageBox.critical(
+            self, "Error", f"The problem could not be added: {error}"
+        )
+
     def closeEvent(self, event: QCloseEvent, /) -> None:
         if not (
             re.fullmatch(r"\s*", self.front_edit.toPlainText())
@@ -305,6 +337,7 @@ class AddProblemWindow(
             )
 
             if reply == QMessageBox.StandardButton.Yes:
+                EventBus.unsubscribe(self._decks_changed)
                 self.html_view_cleanup()
                 self.closed.emit(True)
                 event.accept()
@@ -313,10 +346,12 @@ class AddProblemWindow(
                 event.ignore()
 
         else:
+            EventBus.unsubscribe(self._decks_changed)
             self.closed.emit(True)
             self.html_view_cleanup()
 
     def html_view_cleanup(self):
+        self.html_viewer.timer.stop()
         self.html_viewer.stop()
         # self.html_viewer.loadFinished.disconnect() # not necessary
         page = self.html_viewer.page()
@@ -326,20 +361,18 @@ class AddProblemWindow(
             0, lambda: self.html_viewer.deleteLater()
         )  # give some time to delete the WebEnginePage Object before the QWebEngineView One
 
-    @override
-    def decks_updated_reciever(self):
-        self.deck_selector.decks_updated_reciever()
-
-    @override
-    def problems_updated_emitter(self):
-        self.problem_added.emit(True)
-
-    @override
-    def tags_updated_emitter(self) -> None:
-        self.tags_updated.emit(True)
+    def _decks_changed(self, event: Event) -> None:
+        if isinstance(event, DeckAdded):
+            self.deck_selector.add_decks(event.names)
+        elif isinstance(event, DeckRemoved):
+            self.deck_selector.remove_decks(event.names)
+        else:
+            self.deck_selector.update_list_of_decks()
+            # the user, thus the media directory, may have changed.
+            self.html_viewer.reload_page()
 
 
-class DeckSelector(QComboBox, DeckUpdReciever):
+class DeckSelector(QComboBox):
     def __init__(self):
         super().__init__()
 
@@ -347,26 +380,44 @@ class DeckSelector(QComboBox, DeckUpdReciever):
 
     def update_list_of_decks(self):
         """
-        Checks if the decks table in the db has been modified. If true, update
-        the DeckSelector's list of decks according to that.
+        Reloads the DeckSelector's list of decks from the Catalog, in the
+        background. Added and removed decks are applied from their events
+        (see add_decks and remove_decks) without reading it.
         """
-        # delete the current list in DeckSelector class
-        n_of_items = self.count()
-        for i in range(n_of_items):
-            self.removeItem(n_of_items - 1 - i)
+        DBWorker.submit(
+            Catalog.decks,
+            on_result=self._set_decks,
+            key=f"deck-selector-{id(self)}",
+        )
 
-        self.addItems(sorted(DeckDB.get_decks_all()))
+    def add_decks(self, names: Iterable[str]) -> None:
+        """
+        Adds the decks 'names' to the list.
+        """
+        decks = [self.itemText(i) for i in range(self.count())]
+        self._set_decks(sorted(set(decks) | set(names)))
 
-    def mousePressEvent(self, event: QMouseEvent):
+    def remove_decks(self, names: Iterable[str]) -> None:
         """
-        Overrides default implementation to detect clicks. It runs
-        self.add_decks()
+        Removes the decks 'names' from the list.
         """
-        if event.button() == Qt.LeftButton:  # type: ignore
-            self.update_list_of_decks()
+        decks = [self.itemText(i) for i in range(self.count())]
+        self._set_decks([deck for deck in decks if deck not in names])
 
-        super().mousePressEvent(event)  # calls the default behavior
+    def _set_decks(self, decks: List[str]) -> None:
+        """
+        Replaces the list of decks, keeping the selected deck if it still
+        exists.
+        """
+        current = self.currentText()
+        if decks == [self.itemText(i) for i in range(self.count())]:
+            return
 
-    @override
-    def decks_updated_reciever(self):
-        self.update_list_of_decks()
+        # delete the current list in DeckSelector class
+        n_of_items = self.count()
+        for i in range(n_of_items):
+            self.removeItem(n_of_items - 1 - i)
+
+        self.addItems(decks)
+        if current in decks:
+            self.setCurrentText(current)
@@ -1,27 +1,36 @@
-import json
-from typing import Dict, Tuple, override
+from typing import Dict, List, Tuple
 
-from PySide6.QtCore import Signal
+from PySide6.QtCore import QTimer, Qt, Signal
 from PySide6.QtGui import QCloseEvent
 from PySide6.QtWidgets import (
     QHBoxLayout,
-    QTableWidget,
-    QTableWidgetItem,
+    QHeaderView,
+    QLineEdit,
+    QMessageBox,
+    QTableView,
     QTreeWidget,
     QTreeWidgetItem,
+    QVBoxLayout,
     QWidget,
 )
 
-from db.deck_db import DeckDB
-from db.problem_db import ProblemDB
-from db.tag_db import TagDB
-from ui.ui_utils import DeckUpdReciever, ProblemsUpdReciever, TagsUpdReciever
+from db.stats_db import Counts, StatsDB
+from db.tag_query import TagQuery
+from ui.db_worker import DBWorker
+from ui.problem_model import ProblemTableModel
+from ui.event_bus import (
+    CollectionReplaced,
+    DeckAdded,
+    DeckRemoved,
+    Event,
+    EventBus,
+    ProblemsChanged,
+    TagsAdded,
+)
 from utils.constants import PROGRAM_NAME
 
 
-class BrowserWindow(
-    QWidget, ProblemsUpdReciever, DeckUpdReciever, TagsUpdReciever
-):
+class BrowserWindow(QWidget):
     closed = Signal(bool)
 
     def __init__(self):
@@ -34,13 +43,27 @@ class BrowserWindow(
 
         # self._add_categories_selector()
         self._add_tree_selector()
+        self._add_search_input()
+        self._add_tag_query_input()
         self._add_table_widget()
 
         self._add_subwidgets_to_main_layout()
 
+        EventBus.subscribe(ProblemsChanged, self._problems_changed)
+        for event_type in (DeckAdded, DeckRemoved, TagsAdded):
+            EventBus.subscribe(event_type, self._categories_changed)
+        EventBus.subscribe(CollectionReplaced, self._collection_replaced)
+
         self.show()
 
     def closeEvent(self, event: QCloseEvent, /) -> None:
+        for listener in (
+            self._problems_changed,
+            self._categories_changed,
+            self._collection_replaced,
+        ):
+            EventBus.unsubscribe(listener)
+        self.problem_model.cancel()
         self.closed.emit(True)
         return super().closeEvent(event)
 
@@ -78,16 +101,34 @@ class BrowserWindow(
                 return  # do nothing
 
         type_of_filter = current_type_of_item
-        filter = current_item.text(0)
+        filter = current_item.data(0, Qt.ItemDataRole.UserRole)
         self._update_qtablewidget(filter=(type_of_filter, filter))
 
     def _update_tree_selector(self):
+        """
+        Reloads the decks and tags of the tree selector in the background.
+        """
+        DBWorker.submit(
+            lambda: (StatsDB.get_deck_counts(), StatsDB.get_tag_counts()),
+            on_result=self._set_tree_selector,
+            key=f"browser-categories-{id(self)}",
+        )
+
+    def _set_tree_selector(
+        self, categories: Tuple[List[Counts], List[Counts]]
+    ) -> None:
+        deck_counts, tag_counts = categories
         categories_selector = self.main_subwidgets.get(
             "categories_selector", None
         )
         if categories_selector is not None and isinstance(
             categories_selector, QTreeWidget
         ):
+            expanded = {
+                categories_selector.topLevelItem(i).text(0)
+                for i in range(categories_selector.topLevelItemCount())
+                if categories_selector.topLevelItem(i).isExpanded()
+            }
             categories_selector.clear()
             categories_selector.setHeaderLabel("Category")
             all_item = QTreeWidgetItem()
@@ -100,73 +141,113 @@ class BrowserWindow(
             categories_selector.insertTopLevelItem(1, decks_item)
             categories_selector.insertTopLevelItem(2, tags_item)
 
-            list_of_decks = DeckDB.get_decks_all()
-            for deck in sorted(list_of_decks):
+            # items show their problem count; the name is kept in UserRole
+            for deck, n_problems, _, _ in deck_counts:
                 deck_item = QTreeWidgetItem()
-                deck_item.setText(0, deck)
+                deck_item.setText(0, f"{deck} ({n_problems})")
+                deck_item.setData(0, Qt.ItemDataRole.UserRole, deck)
                 decks_item.addChild(deck_item)
 
-            tags = TagDB.get_all_tags()
-            for tag in sorted(tags):
+            for tag, n_problems, _, _ in tag_counts:
                 tag_item = QTreeWidgetItem()
-                tag_item.setText(0, tag)
+                tag_item.setText(0, f"{tag} ({n_problems})")
+                tag_item.setData(0, Qt.ItemDataRole.UserRole, tag)
                 tags_item.addChild(tag_item)
 
-    def _add_table_widget(self) -> None:
-        qtablewidget = self.main_subwidgets.get("qtablewidget", None)
-        table_widget = QTableWidget()
-        if qtablewidget is None:
-            self.main_subwidgets["qtablewidget"] = table_widget
+            for item in (decks_item, tags_item):
+                item.setExpanded(item.text(0) in expanded)
+
+    def _add_search_input(self) -> None:
+        search_input = QLineEdit()
+        search_input.setPlaceholderText("Search questions and answers")
+        self.main_subwidgets["search_input"] = search_input
+
+        # search as the user types, once typing pauses.
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self._apply_search)
+        search_input.textChanged.connect(self.search_timer.start)
+
+    def _apply_search(self) -> None:
+        search_input = self.main_subwidgets["search_input"]
+        assert isinstance(search_input, QLineEdit)
+        query = search_input.text().strip()
+        if query == "":
             self._update_qtablewidget()
+        else:
+            self._update_qtablewidget(filter=("search", query))
 
-    def _add_subwidgets_to_main_layout(self):
-        for widget in self.main_subwidgets.values():
-            self.main_layout.addWidget(widget)
-
-    @override
-    def problems_updated_reciever(self) -> None:
-        self._update_qtablewidget()
+    def _add_tag_query_input(self) -> None:
+        tag_query_input = QLineEdit()
+        tag_query_input.setPlaceholderText(
+            "Filter by tags, e.g. algebra AND (proof OR induction) AND NOT easy"
+        )
+        tag_query_input.returnPressed.connect(self._apply_tag_query)
+        self.main_subwidgets["tag_query_input"] = tag_query_input
+
+    def _apply_tag_query(self) -> None:
+        tag_query_input = self.main_subwidgets["tag_query_input"]
+        assert isinstance(tag_query_input, QLineEdit)
+        query = tag_query_input.text().strip()
+        if query == "":
+            self._update_qtablewidget()
+            return
 
-    @override
-    def decks_updated_reciever(self) -> None:
-        self._update_tree_selector()
+        try:
+            TagQuery.parse(query)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"{e}")
+            return
 
-    def _update_qtablewidget(self, filter: Tuple[str, str] | None = None):
+        self._update_qtablewidget(filter=("tag_query", query))
 
+    def _add_table_widget(self) -> None:
         qtablewidget = self.main_subwidgets.get("qtablewidget", None)
-        if qtablewidget is not None and isinstance(qtablewidget, QTableWidget):
-
-            if filter is not None:
-                if filter[0] == "deck":
-                    problems = ProblemDB.get_problems_by_deck(filter[1])
-                else:
-                    problems = ProblemDB.get_problems_by_tag(filter[1])
-
-            else:
-                problems = ProblemDB.get_all_problems()
+        if qtablewidget is None:
+            self.problem_model = ProblemTableModel(self)
+            self.problem_model.fetch_failed.connect(self._listing_failed)
 
-            qtablewidget.clear()
-            qtablewidget.setColumnCount(4)
-            qtablewidget.setHorizontalHeaderLabels(
-                ["question", "solution", "deck", "creation date"]
+            table_view = QTableView()
+            table_view.setModel(self.problem_model)
+            table_view.setSelectionBehavior(
+                QTableView.SelectionBehavior.SelectRows
             )
+            # fixed row heights: the view never measures off-screen rows.
+            table_view.verticalHeader().setSectionResizeMode(
+                QHeaderView.ResizeMode.Fixed
+            )
+            self.main_subwidgets["qtablewidget"] = table_view
+            self._update_qtablewidget()
 
-            i = 0
-            for problem in problems:
+    def _add_subwidgets_to_main_layout(self):
+        self.main_layout.addWidget(self.main_subwidgets["categories_selector"])
+
+        table_layout = QVBoxLayout()
+        table_layout.addWidget(self.main_subwidgets["search_input"])
+        table_layout.addWidget(self.main_subwidgets["tag_query_input"])
+        table_layout.addWidget(self.main_subwidgets["qtablewidget"])
+        self.main_layout.addLayout(table_layout)
 
-                qtablewidget.setRowCount(i + 1)
-                deck = DeckDB.get_deck_by_id(problem["problem_deck"])
-                content = json.loads(problem["problem_content"])
-                date = problem["problem_creation_date"]
+    def _problems_changed(self, event: ProblemsChanged) -> None:
+        self.problem_model.apply_changes(event)
+        self._update_tree_selector()
 
-                qtablewidget.setItem(
-                    i, 0, QTableWidgetItem(content["question"])
-                )
-                qtablewidget.setItem(i, 1, QTableWidgetItem(content["answer"]))
-                qtablewidget.setItem(i, 2, QTableWidgetItem(deck))
-                qtablewidget.setItem(i, 3, QTableWidgetItem(date))
-                i += 1
+    def _categories_changed(self, event: Event) -> None:
+        self._update_tree_selector()
 
-    @override
-    def tags_updated_reciever(self):
+    def _collection_replaced(self, event: Event) -> None:
+        self.problem_model.refresh()
         self._update_tree_selector()
+
+    def _update_qtablewidget(self, filter: Tuple[str, str] | None = None):
+        """
+        Lists the problems matching 'filter' (see ProblemTableModel). Rows
+        are loaded in the background, page by page as the table is scrolled.
+        """
+        self.problem_model.set_filter(filter)
+
+    def _listing_failed(self, error: Exception) -> None:
+        QMessageBox.critical(
+            self, "Error", f"The problems could not be listed: {error}"
+        )
@@ -0,0 +1,220 @@
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+# number of items delivered at once by DBWorker.stream.
+CHUNK_SIZE = 250
+
+
+class DBTask(QRunnable):
+    """
+    A database call run by DBWorker. Its results are handed back to the GUI
+    thread through a _TaskRelay; once cancelled, nothing is delivered
+    anymore and a streaming task stops at its next chunk.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[..., Any],
+        args: tuple,
+        chunk_size: int | None,
+    ):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.chunk_size = chunk_size
+        self.cancelled = False
+        self.relay: _TaskRelay | None = None
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def run(self) -> None:
+        relay = self.relay
+        assert relay is not None
+        try:
+            if self.cancelled:
+                return
+
+            result = self.fn(*self.args)
+            if self.chunk_size is not None:
+                chunk: List[Any] = []
+                for item in result:
+                    if self.cancelled:
+                        return
+                    chunk.append(item)
+                    if len(chunk) >= self.chunk_size:
+                        relay.chunk.emit(chunk)
+                        chunk = []
+                if chunk:
+                    relay.chunk.emit(chunk)
+                result = None
+
+            if not self.cancelled:
+                relay.result.emit(result)
+
+        except Exception as e:
+            if not self.cancelled:
+                relay.error.emit(e)
+        finally:
+            relay.finished.emit()
+
+
+class _TaskRelay(QObject):
+    """
+    Lives in the GUI thread: signals emitted by a DBTask on the worker
+    thread are queued here and the callbacks run on the GUI thread, unless
+    the task was cancelled in the meantime.
+    """
+
+    result = Signal(object)
+    chunk = Signal(object)
+    error = Signal(object)
+    finished = Signal()
+
+    def __init__(
+        self,
+        task: DBTask,
+        on_result: Callable[[Any], None] | None,
+        on_chunk: Callable[[List[Any]], None] | None,
+        on_error: Callable[[Exception], None] | None,
+        on_finished: Callable[["_TaskRelay"], None],
+    ):
+        super().__init__()
+        self.task = task
+        self.on_result = on_result
+        self.on_chunk = on_chunk
+        self.on_error = on_error
+        self.on_finished = on_finished
+
+        self.result.connect(self._deliver_result)
+        self.chunk.connect(self._deliver_chunk)
+        self.error.connect(self._deliver_error)
+        self.finished.connect(self._deliver_finished)
+
+    @Slot(object)
+    def _deliver_result(self, value: Any) -> None:
+        if not self.task.cancelled and self.on_result is not None:
+            self.on_result(value)
+
+    @Slot(object)
+    def _deliver_chunk(self, chunk: List[Any]) -> None:
+        if not self.task.cancelled and self.on_chunk is not None:
+            self.on_chunk(chunk)
+
+    @Slot(object)
+    def _deliver_error(self, error: Exception) -> None:
+        if self.task.cancelled:
+            return
+        if self.on_error is not None:
+            self.on_error(error)
+        else:
+            print(f"Database error: {error}")
+
+    @Slot()
+    def _deliver_finished(self) -> None:
+        self.on_finished(self)
+
+
+class DBWorker(QObject):
+    """
+    Runs database calls (DeckDB, TagDB, ProblemDB, Scheduler...) off the GUI
+    thread, so the Qt event loop never waits on SQLite. Calls run one at a
+    time, in submission order, on a dedicated thread with its own
+    connection; their results come back to callbacks on the GUI thread.
+
+    Calls submitted with a 'key' replace each other: submitting a new call
+    with the key of a pending one cancels the older call.
+    """
+
+    _instance: "DBWorker | None" = None
+
+    def __init__(self):
+        super().__init__()
+        self.pool = QThreadPool(self)
+        # a single thread keeps calls in order: a refresh submitted after a
+        # write always sees it.
+        self.pool.setMaxThreadCount(1)
+        self.pool.setExpiryTimeout(-1)
+        self.relays: Set[_TaskRelay] = set()
+        self.keyed_tasks: Dict[str, DBTask] = {}
+
+    @staticmethod
+    def instance() -> "DBWorker":
+        if DBWorker._instance is None:
+            DBWorker._instance = DBWorker()
+        return DBWorker._instance
+
+    @staticmethod
+    def submit(
+        fn: Callable[..., Any],
+        *args: Any,
+        on_result: Callable[[Any], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+        key: str | None = None,
+    ) -> DBTask:
+        """
+        Runs fn(*args) on the database thread and calls on_result with its
+        return value (or on_error with the exception it raised) on the GUI
+        thread.
+        """
+        return DBWorker.instance()._start(
+            fn, args, None, on_result, None, on_error, key
+        )
+
+    @staticmethod
+    def stream(
+        fn: Callable[..., Iterable[Any]],
+        *args: Any,
+        on_chunk: Callable[[List[Any]], None],
+        on_done: Callable[[Any], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+        key: str | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> DBTask:
+        """
+        Iterates fn(*args) on the database thread and hands its items to
+        on_chunk on the GUI thread, in lists of up to 'chunk_size' items.
+        on_done is called (with None) once every item has been delivered.
+        """
+        return DBWorker.instance()._start(
+            fn, args, chunk_size, on_done, on_chunk, on_error, key
+        )
+
+    @staticmethod
+    def cancel(key: str) -> None:
+        """
+        Cancels the pending call submitted with 'key', if any.
+        """
+        task = DBWorker.instance().keyed_tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def _start(
+        self,
+        fn: Callable[..., Any],
+        args: tuple,
+        chunk_size: int | None,
+        on_result: Callable[[Any], None] | None,
+        on_chunk: Callable[[List[Any]], None] | None,
+        on_error: Callable[[Exception], None] | None,
+        key: str | None,
+    ) -> DBTask:
+        task = DBTask(fn, args, chunk_size)
+        task.relay = _TaskRelay(
+            task, on_result, on_chunk, on_error, self._task_finished
+        )
+        self.relays.add(task.relay)
+
+        if key is not None:
+            DBWorker.cancel(key)
+            self.keyed_tasks[key] = task
+
+        self.pool.start(task)
+        return task
+
+    def _task_finished(self, relay: _TaskRelay) -> None:
+        self.relays.discard(relay)
+        for key, task in list(self.keyed_tasks.items()):
+            if task is relay.task:
+                del self.keyed_tasks[key]
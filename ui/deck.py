@@ -1,5 +1,5 @@
-from typing import override
-from PySide6.QtCore import Signal
+from typing import List
+from PySide6.QtCore import Qt, Signal
 from PySide6.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -21,17 +21,26 @@ from PySide6.QtGui import (
     QCloseEvent,
 )
 from utils.constants import PROGRAM_NAME
+from db.catalog import Catalog
 from db.deck_db import DeckDB
-from ui.ui_utils import DeckUpdEmitter, DeckUpdReciever
+from db.stats_db import Counts, StatsDB
+from ui.db_worker import DBWorker
+from ui.event_bus import (
+    CollectionReplaced,
+    DeckAdded,
+    DeckRemoved,
+    Event,
+    EventBus,
+    ProblemsChanged,
+)
 
 
-class AddDeckPopup(QWidget, DeckUpdEmitter):
+class AddDeckPopup(QWidget):
     """
     QWidget that works as a popup that prompts the user to add a new deck.
     """
 
     closed = Signal(bool)
-    decks_updated = Signal(bool)
 
     def __init__(self):
         super().__init__()
@@ -67,30 +76,16 @@ class AddDeckPopup(QWidget, DeckUpdEmitter):
                 "Please provide a name for the deck.",
             )
 
-        elif not DeckDB.deck_exists(deck_final_name):
-
-            try:
-                DeckDB.add_deck(deck_final_name)
-            except Exception as e:
-                self.add_deck_error = QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"There was a problem adding the deck '{deck_final_name}': {e}.".strip(
-                        "."
-                    ),
-                )
-                return
-
-            else:
-                self.add_deck_success = QMessageBox.information(
-                    self,
-                    "Success",
-                    f"The deck '{deck_final_name}' has been added to the DB.",
-                )
-
-            self.decks_updated_emitter()
-            self.closed.emit(True)
-            self.close()
+        elif not Catalog.deck_exists(deck_final_name):
+            # the deck is added in the background: no second add until then.
+            self.add_deck_button.setEnabled(False)
+            self.add_deck_shortcut.setEnabled(False)
+            DBWorker.submit(
+                DeckDB.add_deck,
+                deck_final_name,
+                on_result=lambda _: self._deck_added(deck_final_name),
+                on_error=lambda e: self._deck_not_added(deck_final_name, e),
+            )
 
         else:
             self.deck_name_error = QMessageBox.critical(
@@ -99,20 +94,62 @@ class AddDeckPopup(QWidget, DeckUpdEmitter):
                 f"A deck with name '{deck_final_name}' already exists.",
             )
 
+    def _deck_added(self, deck_name: str) -> None:
+        self.add_deck_success = QMessageBox.information(
+            self,
+            "Success",
+            f"The deck '{deck_name}' has been added to the DB.",
+        )
+        EventBus.publish(DeckAdded([deck_name]))
+        self.closed.emit(True)
+        self.close()
+
+    def _deck_not_added(self, deck_name: str, e: Exception) -> None:
+        self.add_deck_button.setEnabled(True)
+        self.add_deck_shortcut.setEnabled(True)
+        self.add_deck_error = QMessageBox.critical(
+            self,
+            "Error",
+            f"There was a problem adding the deck '{deck_name}': {e}.".strip(
+                "."
+            ),
+        )
+
     def closeEvent(self, event: QCloseEvent, /) -> None:
         self.closed.emit(True)
         return super().closeEvent(event)
 
-    @override
-    def decks_updated_emitter(self) -> None:
-        self.decks_updated.emit(True)
 
+class DeckListWidget(QListWidget):
+    """
+    List of the decks with their problem and due counts, reloaded whenever
+    decks or problems change.
+    """
 
-class DeckListWidget(QListWidget, DeckUpdEmitter, DeckUpdReciever):
-    decks_updated = Signal(bool)
+    review_requested = Signal(str)
 
     def __init__(self):
         super().__init__()
+        self.itemDoubleClicked.connect(
+            lambda item: self.review_requested.emit(self.deck_name(item))
+        )
+
+        for event_type in (
+            DeckAdded,
+            DeckRemoved,
+            ProblemsChanged,
+            CollectionReplaced,
+        ):
+            EventBus.subscribe(event_type, self._collection_changed)
+        self._update_list_of_decks()
+
+    @staticmethod
+    def deck_name(item: QListWidgetItem) -> str:
+        """
+        Returns the name of the deck shown by 'item' (its text also shows
+        the deck's counts).
+        """
+        return item.data(Qt.ItemDataRole.UserRole)
 
     def contextMenuEvent(self, event: QContextMenuEvent) -> None:
         """
@@ -123,6 +160,12 @@ class DeckListWidget(QListWidget, DeckUpdEmitter, DeckUpdReciever):
 
         if item is not None:  # type: ignore
             context_menu = QMenu()
+            review_action = QAction("Review")
+            review_action.triggered.connect(
+                lambda: self.review_requested.emit(self.deck_name(item))
+            )
+            context_menu.addAction(review_action)
+
             delete_action = QAction("Delete")
             delete_action.triggered.connect(lambda: self.delete_deck(item))
 
@@ -132,36 +175,46 @@ class DeckListWidget(QListWidget, DeckUpdEmitter, DeckUpdReciever):
 
     def delete_deck(self, deck_to_delete: QListWidgetItem) -> None:
         """
-        Deletes the current deck from the self consulting the DB.
+        Deletes the current deck from the self consulting the DB. The deck is
+        removed in the background.
         """
-        try:
-            DeckDB.remove_deck(deck_to_delete.text())
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"{e}")
-            return
+        deck_name = self.deck_name(deck_to_delete)
+        DBWorker.submit(
+            DeckDB.remove_deck,
+            deck_name,
+            on_result=lambda _: EventBus.publish(DeckRemoved([deck_name])),
+            on_error=lambda e: QMessageBox.critical(self, "Error", f"{e}"),
+        )
+
+    def _collection_changed(self, event: Event) -> None:
         self._update_list_of_decks()
-        self.decks_updated_emitter()
 
     def _update_list_of_decks(self) -> None:
         """
-        Updates the current list of decks according to DB.
+        Updates the current list of decks according to DB. The decks are
+        loaded in the background; a newer update replaces a pending one.
         """
+        DBWorker.submit(
+            StatsDB.get_deck_counts,
+            on_result=self._set_decks,
+            key=f"deck-list-{id(self)}",
+        )
+
+    def _set_decks(self, deck_counts: List[Counts]) -> None:
+        selected = self.currentItem()
+        selected_name = self.deck_name(selected) if selected else None
 
         # remove all items from the current list
         n_of_decks_in_mem = self.count()
         for i in range(n_of_decks_in_mem):
             self.takeItem(n_of_decks_in_mem - 1 - i)
 
-        # get a list of current decks in DB
-        decks_in_db = sorted(DeckDB.get_decks_all())
-
-        # add decks to self
-        self.addItems(decks_in_db)
-
-    @override
-    def decks_updated_reciever(self) -> None:
-        self._update_list_of_decks()
-
-    @override
-    def decks_updated_emitter(self) -> None:
-        self.decks_updated.emit(True)
+        # add decks to self, with their counts
+        for deck, n_problems, n_due, _ in deck_counts:
+            item = QListWidgetItem(
+                f"{deck}    ({n_problems} problems, {n_due} due)"
+            )
+            item.setData(Qt.ItemDataRole.UserRole, deck)
+            self.addItem(item)
+            if deck == selected_name:
+                self.setCurrentItem(item)
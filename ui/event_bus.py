@@ -0,0 +1,166 @@
+from typing import Callable, Dict, FrozenSet, Iterable, List, Type, TypeVar
+
+from PySide6.QtCore import QObject, QTimer
+
+
+class Event:
+    """
+    Base class of the events sent through the EventBus. Events of the same
+    type published before the bus flushes are merged into one (see
+    Event.merge), so a burst of changes reaches each listener once.
+    """
+
+    __slots__ = ()
+
+    def merge(self, other: "Event") -> "Event":
+        """
+        Returns the event equivalent to 'self' followed by 'other', an event
+        of the same type.
+        """
+        return self
+
+
+class _NamesEvent(Event):
+    __slots__ = ("names",)
+
+    def __init__(self, names: Iterable[str]):
+        self.names: FrozenSet[str] = frozenset(names)
+
+    def merge(self, other: Event) -> Event:
+        assert isinstance(other, _NamesEvent)
+        return type(self)(self.names | other.names)
+
+
+class DeckAdded(_NamesEvent):
+    """
+    The decks 'names' were added.
+    """
+
+    __slots__ = ()
+
+
+class DeckRemoved(_NamesEvent):
+    """
+    The decks 'names' were removed.
+    """
+
+    __slots__ = ()
+
+
+class TagsAdded(_NamesEvent):
+    """
+    The tags 'names' were added.
+    """
+
+    __slots__ = ()
+
+
+class ProblemsChanged(Event):
+    """
+    Ids of the problems inserted, changed and deleted, so that listeners
+    can patch what they show instead of reloading it.
+    """
+
+    __slots__ = ("inserted", "changed", "deleted")
+
+    def __init__(
+        self,
+        inserted: Iterable[int] = (),
+        changed: Iterable[int] = (),
+        deleted: Iterable[int] = (),
+    ):
+        self.inserted: FrozenSet[int] = frozenset(inserted)
+        self.changed: FrozenSet[int] = frozenset(changed)
+        self.deleted: FrozenSet[int] = frozenset(deleted)
+
+    def merge(self, other: Event) -> Event:
+        assert isinstance(other, ProblemsChanged)
+        # a problem deleted, then inserted again (e.g. by a restore) exists.
+        return ProblemsChanged(
+            (self.inserted | other.inserted) - other.deleted,
+            (self.changed | other.changed) - other.deleted,
+            (self.deleted - other.inserted) | other.deleted,
+        )
+
+
+class CollectionReplaced(Event):
+    """
+    Anything in the collection may have changed (e.g. after an import, a
+    restore or a profile switch): listeners reload everything they show.
+    """
+
+    __slots__ = ()
+
+
+E = TypeVar("E", bound=Event)
+
+
+class EventBus(QObject):
+    """
+    Delivers the changes made to the collection to the widgets that show
+    it. Widgets publish typed events and listeners subscribe to the types
+    they care about.
+
+    Delivery is deferred to the next turn of the event loop (a single-shot
+    timer of 0 ms): events published until then are merged by type, and each
+    listener is called once per type with the merged event, in the order the
+    types were first published. The bus is only used from the GUI thread;
+    DBWorker callbacks run there.
+    """
+
+    _instance: "EventBus | None" = None
+
+    def __init__(self):
+        super().__init__()
+        self.listeners: Dict[Type[Event], List[Callable[[Event], None]]] = {}
+        self.pending: Dict[Type[Event], Event] = {}
+        self.flush_scheduled = False
+
+    @staticmethod
+    def instance() -> "EventBus":
+        if EventBus._instance is None:
+            EventBus._instance = EventBus()
+        return EventBus._instance
+
+    @staticmethod
+    def subscribe(event_type: Type[E], listener: Callable[[E], None]) -> None:
+        """
+        Calls 'listener' with the (merged) events of type 'event_type'.
+        """
+        listeners = EventBus.instance().listeners.setdefault(event_type, [])
+        if listener not in listeners:
+            listeners.append(listener)  # type: ignore
+
+    @staticmethod
+    def unsubscribe(listener: Callable[..., None]) -> None:
+        """
+        Stops calling 'listener', whatever the types it was subscribed to.
+        Windows unsubscribe their listeners when they are closed.
+        """
+        for listeners in EventBus.instance().listeners.values():
+            if listener in listeners:
+                listeners.remove(listener)
+
+    @staticmethod
+    def publish(event: Event) -> None:
+        """
+        Queues 'event' for delivery on the next turn of the event loop.
+        """
+        bus = EventBus.instance()
+        pending = bus.pending.get(type(event))
+        bus.pending[type(event)] = (
+            event if pending is None else pending.merge(event)
+        )
+
+        if not bus.flush_scheduled:
+            bus.flush_scheduled = True
+            QTimer.singleShot(0, bus._flush)
+
+    def _flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        self.flush_scheduled = False
+
+        for event_type, event in pending.items():
+            # listeners may unsubscribe while being called.
+            for listener in list(self.listeners.get(event_type, [])):
+                listener(event)
@@ -0,0 +1,223 @@
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWebEngineCore import QWebEngineProfile
+from PySide6.QtWebEngineWidgets import QWebEngineView
+
+from db.math_cache import MathCache
+from ui.web import (
+    RENDERED_TITLE,
+    mathjax_html,
+    render_key,
+    store_renders,
+    take_rendered,
+)
+from utils.constants import user_media_qurl
+
+# time (in ms) without edits after which the preview is typeset.
+PREVIEW_DELAY = 150
+# maximum time (in ms) an edit waits while edits keep coming.
+MAX_PREVIEW_WAIT = 600
+# budget (in ms) of the time from an edit to the preview showing it.
+LATENCY_BUDGET = 400.0
+# number of latencies kept (see MathPreview.latencies).
+MAX_LATENCIES = 100
+
+REGIONS = ("question", "answer")
+
+# the page is loaded once; regions are then replaced with setRegions (see
+# ui.web.RENDER_SCRIPT).
+PREVIEW_BODY = """
+<div id="question"></div>
+<hr>
+<div id="answer"></div>
+"""
+
+
+class MathPreview(QWebEngineView):
+    """
+    Live preview of a problem's question and answer. The MathJax page is
+    loaded once; later edits are sent to it with runJavaScript and only the
+    regions that changed are typeset again, unless their render is in the
+    MathCache. Renders of text being typed are not cached: only those of
+    the saved problem are (see MathPreview.store_renders). Edits are
+    debounced: the preview is typeset PREVIEW_DELAY ms after the last edit,
+    or at the latest MAX_PREVIEW_WAIT ms after the first one not shown yet.
+
+    The time from the last edit of each render to the preview showing it is
+    kept in MathPreview.latencies, and the time from its first edit, which
+    includes the debounce, in MathPreview.first_edit_latencies; renders
+    over LATENCY_BUDGET (from the last edit) are reported.
+    """
+
+    def __init__(self, profile: QWebEngineProfile):
+        super().__init__(profile)
+        self.loaded = False
+        # contents to show, and contents shown (or being typeset).
+        self.contents: Dict[str, str] = {region: "" for region in REGIONS}
+        self.shown: Dict[str, str] = dict(self.contents)
+        # perf_counter() of the first and last edits not sent yet.
+        self.first_edit: float | None = None
+        self.last_edit: float | None = None
+        # perf_counter() of the first and last edits of each render being
+        # typeset.
+        self.renders: Dict[int, Tuple[float, float]] = {}
+        self.n_renders = 0
+        # renders of the regions shown, by render key, until the problem is
+        # saved.
+        self.typeset: Dict[bytes, str] = {}
+        self.latencies: Deque[float] = deque(maxlen=MAX_LATENCIES)
+        self.first_edit_latencies: Deque[float] = deque(maxlen=MAX_LATENCIES)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(PREVIEW_DELAY)
+        self.timer.timeout.connect(self._push)
+
+        self.loadFinished.connect(self._page_loaded)
+        self.titleChanged.connect(self._rendered)
+        self.reload_page()
+
+    def set_contents(self, question: str, answer: str) -> None:
+        """
+        Shows 'question' and 'answer' once the edits stop (see PREVIEW_DELAY
+        and MAX_PREVIEW_WAIT).
+        """
+        now = time.perf_counter()
+        self.contents = {"question": question, "answer": answer}
+        self.last_edit = now
+        if self.first_edit is None:
+            self.first_edit = now
+
+        if (now - self.first_edit) * 1000 >= MAX_PREVIEW_WAIT:
+            self._push()
+        else:
+            self.timer.start()
+
+    def store_renders(self, question: str, answer: str) -> None:
+        """
+        Adds the renders of 'question' and 'answer', the contents of a saved
+        problem, to the MathCache if the preview typeset them.
+        """
+        store_renders(
+            {
+                key: self.typeset[key]
+                for key in (render_key(question), render_key(answer))
+                if key in self.typeset
+            }
+        )
+
+    def reload_page(self) -> None:
+        """
+        Loads the preview page again, e.g. after the current user changed,
+        as images are resolved from the user's media directory.
+        """
+        self.loaded = False
+        self.shown = {region: "" for region in REGIONS}
+        self.renders.clear()
+        self.typeset.clear()
+        self.setHtml(mathjax_html(PREVIEW_BODY), baseUrl=user_media_qurl())
+
+    def _page_loaded(self, ok: bool) -> None:
+        self.loaded = ok
+        if ok:
+            self._push()
+
+    def _push(self) -> None:
+        """
+        Sends the regions that changed since the last push to the page.
+        """
+        self.timer.stop()
+        if not self.loaded:
+            # pushed once the page is loaded.
+            return
+
+        changed = {
+            region: content
+            for region, content in self.contents.items()
+            if content != self.shown[region]
+        }
+        first_edit, last_edit = self.first_edit, self.last_edit
+        self.first_edit = None
+        self.last_edit = None
+        if not changed:
+            return
+
+        self.shown.update(changed)
+        self.n_renders += 1
+        if first_edit is not None and last_edit is not None:
+            self.renders[self.n_renders] = (first_edit, last_edit)
+
+        keys = {
+            region: render_key(content)
+            for region, content in changed.items()
+            if content.strip() != ""
+        }
+        # the cache has a db file and a lock of its own, so the lookup
+        # does not wait for the DBWorker; if another thread is using the
+        # cache, the regions are typeset instead.
+        try:
+            cached = MathCache.get_many(keys.values(), touch=False, wait=False)
+        except Exception as e:
+            print(f"Failed to read cached renders: {e}")
+            cached = {}
+        self._send(changed, keys, cached, self.n_renders)
+
+    def _send(
+        self,
+        changed: Dict[str, str],
+        keys: Dict[str, bytes],
+        cached: Dict[bytes, str],
+        stamp: int,
+    ) -> None:
+        """
+        Sends the 'changed' regions to the page: those whose render is in
+        'cached' as they are, the others to be typeset.
+        """
+        regions: Dict[str, str] = dict(changed)
+        typeset: Dict[str, str] = {}
+        for region, key in keys.items():
+            if key in cached:
+                regions[region] = cached[key]
+            else:
+                typeset[region] = key.hex()
+
+        page = self.page()
+        if page is not None:
+            page.runJavaScript(
+                f"setRegions({json.dumps(regions)}, {json.dumps(typeset)}, "
+                f"'{RENDERED_TITLE}{stamp}');"
+            )
+
+    def _rendered(self, title: str) -> None:
+        if not title.startswith(RENDERED_TITLE):
+            return
+        now = time.perf_counter()
+        stamp = int(title[len(RENDERED_TITLE) :])
+        take_rendered(self, self._keep_renders)
+
+        # renders are typeset in order.
+        for n in [n for n in self.renders if n <= stamp]:
+            first_edit, last_edit = self.renders.pop(n)
+            latency = (now - last_edit) * 1000
+            first_edit_latency = (now - first_edit) * 1000
+            self.latencies.append(latency)
+            self.first_edit_latencies.append(first_edit_latency)
+            if latency > LATENCY_BUDGET:
+                print(
+                    f"Preview rendered in {latency:.0f} ms "
+                    f"({first_edit_latency:.0f} ms since the first edit, "
+                    f"budget {LATENCY_BUDGET:.0f} ms)"
+                )
+
+    def _keep_renders(self, renders: Dict[bytes, str]) -> None:
+        # only the renders of the regions still shown are kept.
+        shown = {render_key(content) for content in self.shown.values()}
+        self.typeset = {
+            key: html
+            for key, html in {**self.typeset, **renders}.items()
+            if key in shown
+        }
@@ -0,0 +1,359 @@
+import bisect
+from collections import OrderedDict
+from typing import Any, Dict, List, Set, Tuple
+
+from PySide6.QtCore import (
+    QAbstractTableModel,
+    QModelIndex,
+    QPersistentModelIndex,
+    Qt,
+    Signal,
+)
+
+from db.problem_db import ProblemDB
+from ui.db_worker import DBWorker
+from ui.event_bus import ProblemsChanged
+
+# rows fetched from the db at once, both when the view scrolls past the last
+# fetched row and when evicted rows are shown again.
+FETCH_SIZE = 500
+# maximum number of rows whose contents are kept in memory.
+MAX_CACHED_ROWS = 20 * FETCH_SIZE
+# maximum number of problems shown for a full-text search.
+SEARCH_RESULTS_LIMIT = 500
+# changes to more problems than this reload the listing instead of patching
+# it.
+MAX_PATCHED_PROBLEMS = FETCH_SIZE
+
+HEADERS = ("question", "solution", "deck", "creation date")
+
+# a listing row: (problem_id, question, answer, deck_name, creation_date).
+Row = Tuple[int, str, str, str, str]
+
+ModelIndex = QModelIndex | QPersistentModelIndex
+
+
+class ProblemTableModel(QAbstractTableModel):
+    """
+    Lists the problems matching a filter, sorted by id. Rows are fetched
+    lazily, FETCH_SIZE at a time, as the view scrolls down (canFetchMore /
+    fetchMore) with the keyset pagination of
+    ProblemDB.get_problems_listing_page, so opening a large collection costs
+    one page.
+
+    The model keeps the (sorted) ids of every fetched row, but the contents
+    of at most MAX_CACHED_ROWS of them, in least recently used order. A row
+    whose contents were evicted is shown empty while its block of FETCH_SIZE
+    rows is read again, starting from the id before the block's first one.
+
+    Full-text searches are sorted by relevance instead and are read at once,
+    as they are limited to SEARCH_RESULTS_LIMIT problems.
+
+    ProblemTableModel.apply_changes patches the rows of the problems that
+    were inserted, changed or deleted, so views keep their scroll position
+    and selection.
+
+    Every db call runs on the DBWorker; the model never blocks the GUI
+    thread. Failed calls are reported with the fetch_failed signal.
+    """
+
+    fetch_failed = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filter: Tuple[str, str] | None = None
+        self.ids: List[int] = []
+        self.rows: OrderedDict[int, Row] = OrderedDict()
+        # keyset cursor of the next page, or None once every row is fetched.
+        self.cursor: Tuple[Any, ...] | None = None
+        self.fetching = False
+        # first rows of the blocks being read again.
+        self.loading_blocks: Set[int] = set()
+        # patched problems that may belong to the page being fetched.
+        self.deferred_ids: Set[int] = set()
+        # problems being read again to be patched.
+        self.patch_ids: Set[int] = set()
+
+    def set_filter(self, filter: Tuple[str, str] | None) -> None:
+        """
+        Lists the problems matching 'filter': None (all problems), ("deck",
+        deck_name), ("tag", tag_name), ("tag_query", query) (see TagQuery) or
+        ("search", words) (see ProblemDB.search_listing).
+        """
+        self.cancel()
+        self.beginResetModel()
+        self.filter = filter
+        self.ids = []
+        self.rows.clear()
+        self.cursor = None
+        self.fetching = False
+        self.loading_blocks.clear()
+        self.deferred_ids.clear()
+        self.patch_ids.clear()
+        self.endResetModel()
+
+        if self._is_search():
+            assert filter is not None
+            self.fetching = True
+            DBWorker.submit(
+                lambda: list(
+                    ProblemDB.search_listing(filter[1], SEARCH_RESULTS_LIMIT)
+                ),
+                on_result=lambda rows: self._fetched((rows, None)),
+                on_error=self._fetch_failed,
+                key=self._key("fetch"),
+            )
+        else:
+            self._fetch_page(None)
+
+    def refresh(self) -> None:
+        """
+        Lists the current filter's problems again, from the first page.
+        """
+        self.set_filter(self.filter)
+
+    def apply_changes(self, changes: ProblemsChanged) -> None:
+        """
+        Updates the listing after 'changes'. Deleted problems are removed at
+        once; inserted and changed ones are read again (only those), then
+        added, updated or removed depending on whether they match the filter.
+        Full-text searches, whose ranking may change, and large changes are
+        listed again instead.
+        """
+        upserted = (changes.inserted | changes.changed) - changes.deleted
+        if self._is_search() or (
+            len(upserted) + len(changes.deleted) > MAX_PATCHED_PROBLEMS
+        ):
+            self.refresh()
+            return
+
+        for problem_id in changes.deleted:
+            self._remove(problem_id)
+
+        if upserted:
+            # a pending read is replaced by one of every problem to patch,
+            # and cancelled when the filter changes.
+            self.patch_ids |= upserted
+            problem_ids = set(self.patch_ids)
+            DBWorker.submit(
+                ProblemDB.get_problems_listing_by_ids,
+                problem_ids,
+                self.filter,
+                on_result=lambda rows: self._patched(problem_ids, rows),
+                on_error=self._fetch_failed,
+                key=self._key("patch"),
+            )
+
+    def cancel(self) -> None:
+        """
+        Cancels every pending db call of the model.
+        """
+        DBWorker.cancel(self._key("fetch"))
+        DBWorker.cancel(self._key("patch"))
+        for first in self.loading_blocks:
+            DBWorker.cancel(self._key(f"block-{first}"))
+
+    def problem_id(self, row: int) -> int:
+        return self.ids[row]
+
+    def rowCount(self, parent: ModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent: ModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> Any:
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return HEADERS[section]
+        return section + 1
+
+    def data(
+        self, index: ModelIndex, role: int = Qt.ItemDataRole.DisplayRole
+    ) -> Any:
+        if not index.isValid() or role not in (
+            Qt.ItemDataRole.DisplayRole,
+            Qt.ItemDataRole.UserRole,
+        ):
+            return None
+
+        problem_id = self.ids[index.row()]
+        if role == Qt.ItemDataRole.UserRole:
+            return problem_id
+
+        row = self.rows.get(problem_id)
+        if row is None:
+            self._load_block(index.row())
+            return ""
+        self.rows.move_to_end(problem_id)
+        return row[index.column() + 1]
+
+    def canFetchMore(self, parent: ModelIndex = QModelIndex()) -> bool:
+        return (
+            not parent.isValid()
+            and not self.fetching
+            and self.cursor is not None
+        )
+
+    def fetchMore(self, parent: ModelIndex = QModelIndex()) -> None:
+        if self.canFetchMore(parent):
+            self._fetch_page(self.cursor)
+
+    def _is_search(self) -> bool:
+        return self.filter is not None and self.filter[0] == "search"
+
+    def _fetch_page(self, after: Tuple[Any, ...] | None) -> None:
+        self.fetching = True
+        DBWorker.submit(
+            ProblemDB.get_problems_listing_page,
+            self.filter,
+            "id",
+            after,
+            FETCH_SIZE,
+            on_result=self._fetched,
+            on_error=self._fetch_failed,
+            key=self._key("fetch"),
+        )
+
+    def _fetched(self, page: Tuple[List[Row], Tuple[Any, ...] | None]) -> None:
+        rows, self.cursor = page
+        self.fetching = False
+        if self.deferred_ids:
+            self.apply_changes(ProblemsChanged(changed=self.deferred_ids))
+            self.deferred_ids = set()
+        if not rows:
+            return
+
+        # rows patched in since the page was requested are listed already.
+        if self.ids and not self._is_search():
+            rows = [row for row in rows if row[0] > self.ids[-1]]
+            if not rows:
+                return
+
+        first = len(self.ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for row in rows:
+            self.ids.append(row[0])
+            self.rows[row[0]] = row
+        self.endInsertRows()
+        self._evict()
+
+    def _fetch_failed(self, error: Exception) -> None:
+        self.fetching = False
+        self.fetch_failed.emit(error)
+
+    def _load_block(self, row: int) -> None:
+        """
+        Reads again the contents of the block of FETCH_SIZE rows holding
+        'row'. Only id-sorted listings evict rows.
+        """
+        first = row - row % FETCH_SIZE
+        if first in self.loading_blocks:
+            return
+        self.loading_blocks.add(first)
+
+        ids = self.ids[first : first + FETCH_SIZE]
+        DBWorker.submit(
+            ProblemDB.get_problems_listing_page,
+            self.filter,
+            "id",
+            (ids[0] - 1,),
+            len(ids),
+            on_result=lambda page: self._block_loaded(first, page[0]),
+            on_error=self._fetch_failed,
+            key=self._key(f"block-{first}"),
+        )
+
+    def _block_loaded(self, first: int, rows: List[Row]) -> None:
+        self.loading_blocks.discard(first)
+        for row in rows:
+            self.rows[row[0]] = row
+
+        # the block may have moved since it was requested.
+        rows_by_id: Dict[int, Row] = {row[0]: row for row in rows}
+        shown = [
+            i
+            for i in range(first, min(first + FETCH_SIZE, len(self.ids)))
+            if self.ids[i] in rows_by_id
+        ]
+        if shown:
+            self.dataChanged.emit(
+                self.index(shown[0], 0),
+                self.index(shown[-1], len(HEADERS) - 1),
+            )
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self.rows) > MAX_CACHED_ROWS:
+            self.rows.popitem(last=False)
+
+    def _patched(self, problem_ids: Set[int], rows: List[Row]) -> None:
+        self.patch_ids -= problem_ids
+        self._patch(problem_ids, rows)
+
+    def _patch(self, problem_ids: Set[int], rows: List[Row]) -> None:
+        """
+        Applies the rows read again for 'problem_ids' (those that still match
+        the filter).
+        """
+        rows_by_id: Dict[int, Row] = {row[0]: row for row in rows}
+        for problem_id in sorted(problem_ids):
+            row = rows_by_id.get(problem_id)
+            if row is None:
+                self._remove(problem_id)
+                continue
+
+            position = bisect.bisect_left(self.ids, problem_id)
+            if position < len(self.ids) and self.ids[position] == problem_id:
+                self.rows[problem_id] = row
+                self.dataChanged.emit(
+                    self.index(position, 0),
+                    self.index(position, len(HEADERS) - 1),
+                )
+            elif position < len(self.ids) or (
+                not self.fetching
+                and (self.cursor is None or problem_id <= self.cursor[0])
+            ):
+                self.beginInsertRows(QModelIndex(), position, position)
+                self.ids.insert(position, problem_id)
+                self.rows[problem_id] = row
+                self.endInsertRows()
+            elif self.fetching:
+                # patched again once the page is in.
+                self.deferred_ids.add(problem_id)
+            # otherwise, fetchMore lists it in its turn.
+        self._evict()
+
+    def _remove(self, problem_id: int) -> None:
+        row = self._row_of(problem_id)
+        if row is None:
+            return
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.ids[row]
+        self.rows.pop(problem_id, None)
+        self.endRemoveRows()
+
+    def _row_of(self, problem_id: int) -> int | None:
+        """
+        Returns the row of 'problem_id', or None if it is not listed.
+        """
+        if self._is_search():
+            try:
+                return self.ids.index(problem_id)
+            except ValueError:
+                return None
+
+        row = bisect.bisect_left(self.ids, problem_id)
+        if row < len(self.ids) and self.ids[row] == problem_id:
+            return row
+        return None
+
+    def _key(self, name: str) -> str:
+        return f"problem-model-{id(self)}-{name}"
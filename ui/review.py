@@ -0,0 +1,330 @@
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
+
+from PySide6.QtCore import QTimer, Signal
+from PySide6.QtGui import QCloseEvent, QKeySequence, QShortcut
+from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtWidgets import (
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QStackedWidget,
+    QVBoxLayout,
+    QWidget,
+)
+
+from db.math_cache import MathCache
+from db.problem import Problem
+from db.scheduler import (
+    FEEDBACK_AGAIN,
+    FEEDBACK_EASY,
+    FEEDBACK_GOOD,
+    FEEDBACK_HARD,
+    RELEARN_DELAY,
+    Scheduler,
+)
+from ui.db_worker import DBWorker
+from ui.event_bus import EventBus, ProblemsChanged
+from ui.web import (
+    RENDERED_TITLE,
+    NoInternetProfile,
+    problem_html,
+    render_key,
+    store_rendered,
+)
+from utils.constants import PROGRAM_NAME, user_media_qurl
+
+# number of due problems kept loaded ahead of the current one.
+PREFETCH_SIZE = 10
+# number of problems typeset ahead of the current one, each in its own
+# offscreen web view.
+PRERENDER_SIZE = 3
+
+
+class ReviewWindow(QWidget):
+    """
+    Review session over the due problems of a deck (or of every deck). Due
+    problems are loaded in the background ahead of time, and the next
+    PRERENDER_SIZE of them are already typeset in hidden web views, so
+    moving on to the next problem only has to switch the visible view.
+    Problems whose renders are in the MathCache are shown without
+    typesetting.
+    """
+
+    closed = Signal(bool)
+
+    def __init__(self, deck_name: str | None = None):
+        super().__init__()
+        self.deck_name = deck_name
+        title = deck_name if deck_name is not None else "All decks"
+        self.setWindowTitle(f"{PROGRAM_NAME} - Review - {title}")
+
+        # session state
+        self.queue: Deque[Problem] = deque()  # loaded, not yet rendered
+        # renders of the queued problems found in the MathCache.
+        self.cached: Dict[bytes, str] = {}
+        self.rendered: Deque[Tuple[QWebEngineView, Problem]] = deque()
+        self.current: Tuple[QWebEngineView, Problem] | None = None
+        self.seen_ids: Set[int] = set()
+        self.loading = False
+        self.exhausted = False
+        self.n_reviewed = 0
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        # one visible view and PRERENDER_SIZE offscreen ones
+        self.profile = NoInternetProfile()
+        self.views_stack = QStackedWidget()
+        self.free_views: List[QWebEngineView] = []
+        for _ in range(PRERENDER_SIZE + 1):
+            view = QWebEngineView(self.profile)
+            view.titleChanged.connect(
+                lambda title, view=view: (
+                    store_rendered(view)
+                    if title.startswith(RENDERED_TITLE)
+                    else None
+                )
+            )
+            self.views_stack.addWidget(view)
+            self.free_views.append(view)
+        self.message_label = QLabel()
+        self.views_stack.addWidget(self.message_label)
+        layout.addWidget(self.views_stack)
+
+        # buttons
+        self.show_answer_button = QPushButton("Show answer")
+        self.show_answer_button.clicked.connect(self.show_answer)
+        layout.addWidget(self.show_answer_button)
+
+        self.feedback_buttons: Dict[int, QPushButton] = {}
+        feedback_layout = QHBoxLayout()
+        for i, (name, feedback) in enumerate(
+            [
+                ("Again", FEEDBACK_AGAIN),
+                ("Hard", FEEDBACK_HARD),
+                ("Good", FEEDBACK_GOOD),
+                ("Easy", FEEDBACK_EASY),
+            ]
+        ):
+            button = QPushButton(f"{name} ({i + 1})")
+            button.clicked.connect(
+                lambda _=False, feedback=feedback: self.answer(feedback)
+            )
+            feedback_layout.addWidget(button)
+            self.feedback_buttons[feedback] = button
+
+            shortcut = QShortcut(QKeySequence(str(i + 1)), self)
+            shortcut.activated.connect(
+                lambda feedback=feedback: self.answer(feedback)
+            )
+        layout.addLayout(feedback_layout)
+
+        self.show_answer_shortcut = QShortcut(QKeySequence("Space"), self)
+        self.show_answer_shortcut.activated.connect(self.show_answer)
+
+        self._set_answer_shown(False)
+        self._show_message("Loading...")
+        self._prefetch()
+
+    def show_answer(self) -> None:
+        if self.current is None:
+            return
+        view, _ = self.current
+        view.page().runJavaScript(
+            "document.getElementById('answer-block').style.visibility = "
+            "'visible';"
+        )
+        self._set_answer_shown(True)
+
+    def answer(self, feedback: int) -> None:
+        """
+        Stores 'feedback' for the current problem in the background and
+        moves on to the next one.
+        """
+        if self.current is None or not self.show_answer_button.isHidden():
+            return
+        _, problem = self.current
+        # reviews change the due counts.
+        DBWorker.submit(
+            Scheduler.review,
+            problem.problem_id,
+            feedback,
+            on_result=lambda _, problem_id=problem.problem_id: (
+                EventBus.publish(ProblemsChanged(changed=[problem_id]))
+            ),
+            on_error=lambda e, problem_id=problem.problem_id: print(
+                f"Failed to save review of problem {problem_id}: {e}"
+            ),
+        )
+        self.n_reviewed += 1
+        if feedback == FEEDBACK_AGAIN:
+            # the problem is due again after RELEARN_DELAY: it may be loaded
+            # again, and is looked for once the delay is over, even if no
+            # other problem is due by then.
+            self.seen_ids.discard(problem.problem_id)
+            QTimer.singleShot(
+                (RELEARN_DELAY + 1) * 1000, self, self._relearn_due
+            )
+        self._show_next()
+
+    def closeEvent(self, event: QCloseEvent, /) -> None:
+        self.closed.emit(True)
+        self.html_views_cleanup()
+        return super().closeEvent(event)
+
+    def html_views_cleanup(self) -> None:
+        for i in range(self.views_stack.count()):
+            view = self.views_stack.widget(i)
+            if isinstance(view, QWebEngineView):
+                view.stop()
+                page = view.page()
+                if page:
+                    page.deleteLater()
+                # give some time to delete the WebEnginePage Object before
+                # the QWebEngineView One
+                QTimer.singleShot(0, view.deleteLater)
+
+    def _prefetch(self) -> None:
+        """
+        Starts loading more due problems if fewer than PREFETCH_SIZE are
+        waiting and no load is running.
+        """
+        if self.loading or self.exhausted:
+            return
+        if len(self.queue) + len(self.rendered) >= PREFETCH_SIZE:
+            return
+
+        self.loading = True
+        DBWorker.submit(
+            self._load_due,
+            self.deck_name,
+            set(self.seen_ids),
+            on_result=self._on_loaded,
+            on_error=self._on_load_failed,
+        )
+
+    @staticmethod
+    def _load_due(
+        deck_name: str | None, exclude: Set[int]
+    ) -> Tuple[List[Problem], Dict[bytes, str]]:
+        """
+        Returns the next due problems and their renders found in the
+        MathCache. Runs on the DBWorker.
+        """
+        problems = Scheduler.get_due(
+            deck_name, limit=PREFETCH_SIZE, exclude=exclude
+        )
+        try:
+            cached = MathCache.get_many(
+                render_key(source)
+                for problem in problems
+                for source in ReviewWindow._sources(problem)
+            )
+        except Exception as e:
+            # the problems are typeset instead.
+            print(f"Failed to read cached renders: {e}")
+            cached = {}
+        return (problems, cached)
+
+    def _relearn_due(self) -> None:
+        if self.loading:
+            # the running load may have started before the problem was due.
+            QTimer.singleShot(1000, self, self._relearn_due)
+            return
+        self.exhausted = False
+        self._prefetch()
+
+    def _on_loaded(
+        self, loaded: Tuple[List[Problem], Dict[bytes, str]]
+    ) -> None:
+        problems, cached = loaded
+        self.cached.update(cached)
+        self.loading = False
+        if not problems:
+            self.exhausted = True
+
+        for problem in problems:
+            self.seen_ids.add(problem.problem_id)
+            self.queue.append(problem)
+
+        self._render_ahead()
+        if self.current is None:
+            self._show_next()
+        else:
+            self._prefetch()
+
+    def _on_load_failed(self, error: Exception) -> None:
+        print(f"Failed to load due problems: {error}")
+        self._on_loaded(([], {}))
+
+    def _render_ahead(self) -> None:
+        """
+        Typesets queued problems in the free offscreen views.
+        """
+        while self.free_views and self.queue:
+            view = self.free_views.pop()
+            problem = self.queue.popleft()
+            view.setHtml(
+                self._problem_html(problem), baseUrl=user_media_qurl()
+            )
+            self.rendered.append((view, problem))
+
+    def _show_next(self) -> None:
+        if self.current is not None:
+            self.free_views.append(self.current[0])
+            self.current = None
+
+        self._render_ahead()
+        if self.rendered:
+            self.current = self.rendered.popleft()
+            self.views_stack.setCurrentWidget(self.current[0])
+            self._set_answer_shown(False)
+        elif self.loading or self.queue:
+            self._show_message("Loading...")
+        else:
+            self._show_message(
+                f"Congratulations! No more problems are due.\n"
+                f"Reviewed in this session: {self.n_reviewed}."
+            )
+
+        self._update_status()
+        self._render_ahead()
+        self._prefetch()
+
+    def _show_message(self, message: str) -> None:
+        self.message_label.setText(message)
+        self.views_stack.setCurrentWidget(self.message_label)
+        self.show_answer_button.setHidden(True)
+        for button in self.feedback_buttons.values():
+            button.setHidden(True)
+
+    def _set_answer_shown(self, shown: bool) -> None:
+        self.show_answer_button.setHidden(shown)
+        for button in self.feedback_buttons.values():
+            button.setHidden(not shown)
+
+    def _update_status(self) -> None:
+        waiting = len(self.queue) + len(self.rendered)
+        more = "" if self.exhausted else "+"
+        self.status_label.setText(
+            f"Reviewed: {self.n_reviewed}    Up next: {waiting}{more}"
+        )
+
+    def _problem_html(self, problem: Problem) -> str:
+        # the answer is laid out (and typeset) but hidden until revealed.
+        question, answer = self._sources(problem)
+        cached = {
+            key: self.cached.pop(key)
+            for key in (render_key(question), render_key(answer))
+            if key in self.cached
+        }
+        return problem_html(question, answer, cached, answer_hidden=True)
+
+    @staticmethod
+    def _sources(problem: Problem) -> Tuple[str, str]:
+        content = problem.content
+        return (content.get("question", ""), content.get("answer", ""))
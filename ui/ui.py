@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from PySide6.QtWidgets import (
     QApplication,
     QLayout,
@@ -8,54 +10,61 @@ from PySide6.QtWidgets import (
     QPushButton,
     QMessageBox,
     QLabel,
+    QFileDialog,
+    QInputDialog,
 )
 from PySide6.QtGui import QCloseEvent
-from PySide6.QtCore import Qt, Signal
-from typing import List, Dict, override, Tuple
+from PySide6.QtCore import QCoreApplication, QTimer, Qt
+from typing import TYPE_CHECKING, List, Dict, Tuple
+import importlib
 
-from ui.add_problem import AddProblemWindow
 from ui.deck import AddDeckPopup, DeckListWidget
-from ui.browser import BrowserWindow
-
-from ui.ui_utils import (
-    DeckUpdEmitter,
-    DeckUpdReciever,
-    ProblemsUpdReciever,
-    ProblemsUpdEmitter,
-    TagsUpdReciever,
-    TagsUpdEmitter,
-)
+from ui.db_worker import DBWorker
+from ui.event_bus import CollectionReplaced, EventBus
+from db.archive import Archive
+from db.backup import Backup
+from db.catalog import Catalog
+from db.db import switch_user
+from db.media_db import MediaDB
 from utils.program_paths import ProgramPaths
 from utils.constants import PROGRAM_NAME
 
-USER_DIR = ProgramPaths.get_user_dir()
+# the windows that show problems pull in QtWebEngine, by far the slowest
+# part of the start up: they are imported on first use or, once the main
+# window is painted, in the background (see MainWindow._preload).
+if TYPE_CHECKING:
+    from ui.add_problem import AddProblemWindow
+    from ui.browser import BrowserWindow
+    from ui.review import ReviewWindow
 
+# modules imported by MainWindow._preload, one per idle step.
+PRELOADED_MODULES = ("ui.web", "ui.review", "ui.add_problem", "ui.browser")
+# delay (ms) before the preload starts, so the main window paints first.
+PRELOAD_DELAY = 200
 
-class MainWindow(
-    QMainWindow,
-    DeckUpdEmitter,
-    DeckUpdReciever,
-    ProblemsUpdReciever,
-    ProblemsUpdEmitter,
-    TagsUpdEmitter,
-    TagsUpdReciever,
-):
-    decks_updated = Signal()
-
-    def __init__(self):
+
+class MainWindow(QMainWindow):
+    def __init__(self, preload: bool = True):
         super().__init__()
 
-        self.setWindowTitle(f"{PROGRAM_NAME}")
+        self._update_window_title()
         self.menu = self.menuBar()
         self.file_menu = self.menu.addMenu("File")
 
+        # listed again each time it is opened, as profiles are directories
+        # that can be added outside the program.
+        self.profile_menu = self.menu.addMenu("Profile")
+        self.profile_menu.aboutToShow.connect(self._populate_profile_menu)
+
         self.child_window: Dict[
-            str, AddProblemWindow | AddDeckPopup | BrowserWindow | None
+            str,
+            AddProblemWindow
+            | AddDeckPopup
+            | BrowserWindow
+            | ReviewWindow
+            | None,
         ] = {}
 
-        self.decks_updated_recievers: List[DeckUpdReciever] = []
-        self.problems_updated_recievers: List[ProblemsUpdReciever] = []
-
         # create main_container
         self.main_container = QWidget()
         self.setCentralWidget(self.main_container)
@@ -76,9 +85,31 @@ class MainWindow(
             elif isinstance(container, QWidget):
                 self.main_container.addWidget(container)
 
+        # Export/Import QActions
+        self.file_menu.addAction(
+            "Export collection...", self._export_collection
+        )
+        self.file_menu.addAction(
+            "Import collection...", self._import_collection
+        )
+
+        self.file_menu.addAction(
+            "Delete unused media files", self._collect_media_garbage
+        )
+
+        # Backup QActions
+        self.file_menu.addAction("Back up now", self._create_backup)
+        self.file_menu.addAction("Restore backup...", self._restore_backup)
+
         # Exit QAction
         self.file_menu.addAction("Exit", self.close)
 
+        self._preload_queue = list(PRELOADED_MODULES) if preload else []
+        self._warm_view = None
+        self._warm_profile = None
+        if self._preload_queue:
+            QTimer.singleShot(PRELOAD_DELAY, self._preload)
+
     def _create_buttons_container(self) -> QHBoxLayout:
         add_buttons_container = QHBoxLayout()
 
@@ -94,9 +125,14 @@ class MainWindow(
         browser_button = QPushButton("Browser")
         browser_button.clicked.connect(self._show_browser_window)
 
+        # review button
+        review_button = QPushButton("Review")
+        review_button.clicked.connect(self._review_selected_deck)
+
         add_buttons_container.addWidget(add_new_deck_button)
         add_buttons_container.addWidget(add_new_problem_button)
         add_buttons_container.addWidget(browser_button)
+        add_buttons_container.addWidget(review_button)
 
         return add_buttons_container
 
@@ -105,9 +141,8 @@ class MainWindow(
         decks_container_label.setTextFormat(Qt.RichText)  # pyright: ignore
 
         deck_list_widget = DeckListWidget()
-        self.decks_updated_recievers.append(deck_list_widget)
-        deck_list_widget.decks_updated_reciever()
-        deck_list_widget.decks_updated.connect(self.decks_updated_reciever)
+        deck_list_widget.review_requested.connect(self._show_review_window)
+        self.deck_list_widget = deck_list_widget
 
         return (decks_container_label, deck_list_widget)
 
@@ -131,7 +166,48 @@ class MainWindow(
         else:
             QApplication.quit()
 
+    def _preload(self) -> None:
+        """
+        Imports the next module of the preload queue, then, once they are
+        all imported, starts the web engine with an empty hidden page so the
+        first problem shown does not wait for it. Each step runs from the
+        event loop, leaving the main window responsive in between.
+        """
+        if self._preload_queue:
+            importlib.import_module(self._preload_queue.pop(0))
+            QTimer.singleShot(0, self._preload)
+            return
+
+        from PySide6.QtWebEngineWidgets import QWebEngineView
+        from ui.web import NoInternetProfile, mathjax_html
+
+        # the profile must outlive the view's page (see _preload_finished).
+        self._warm_profile = NoInternetProfile()
+        self._warm_view = QWebEngineView(self._warm_profile)
+        self._warm_view.loadFinished.connect(self._preload_finished)
+        self._warm_view.setHtml(mathjax_html(""))
+
+    def _preload_finished(self) -> None:
+        if self._warm_view is None:
+            return
+
+        # the page, then the view, are deleted before the profile is
+        # released, as QtWebEngine requires.
+        view = self._warm_view
+        self._warm_view = None
+        view.stop()
+        page = view.page()
+        if page:
+            page.deleteLater()
+        view.destroyed.connect(self._release_warm_profile)
+        QTimer.singleShot(0, view.deleteLater)
+
+    def _release_warm_profile(self) -> None:
+        self._warm_profile = None
+
     def _show_browser_window(self):
+        from ui.browser import BrowserWindow
+
         # avoid destroying the window if it already exists
         window = self.child_window.get("browser", None)
         if window is None:
@@ -139,14 +215,13 @@ class MainWindow(
             self.child_window["browser"].closed.connect(
                 lambda: self._set_child_window_to_none("browser")
             )
-            self.problems_updated_recievers.append(
-                self.child_window["browser"]
-            )
 
         if self.child_window["browser"] is not None:
             self.child_window["browser"].show()
 
     def _show_add_problem_window(self):
+        from ui.add_problem import AddProblemWindow
+
         # avoid destroying the window if it already exists
         window = self.child_window.get("add_problem", None)
         if window is None:
@@ -154,12 +229,6 @@ class MainWindow(
             self.child_window["add_problem"].closed.connect(
                 lambda: self._set_child_window_to_none("add_problem")
             )
-            self.child_window["add_problem"].problem_added.connect(
-                self.problems_updated_emitter
-            )
-            self.child_window["add_problem"].tags_updated.connect(
-                self.tags_updated_reciever
-            )
 
         # to avoid pyright error
         if self.child_window["add_problem"] is not None:
@@ -173,53 +242,282 @@ class MainWindow(
                 lambda: self._set_child_window_to_none("deck_dialog")
             )
 
-            self.child_window["deck_dialog"].decks_updated.connect(
-                self.decks_updated_reciever
-            )
-
         # to avoid pyright error
         if self.child_window["deck_dialog"] is not None:
             self.child_window["deck_dialog"].show()
 
-    def _set_child_window_to_none(self, window_name: str) -> None:
-        self.child_window[f"{window_name}"] = None
+    def _review_selected_deck(self) -> None:
+        """
+        Starts a review of the deck selected in the list of decks, or of all
+        decks if none is selected.
+        """
+        item = self.deck_list_widget.currentItem()
+        self._show_review_window(
+            DeckListWidget.deck_name(item) if item is not None else None
+        )
+
+    def _show_review_window(self, deck_name: str | None) -> None:
+        from ui.review import ReviewWindow
+
+        # a review session is tied to its deck: replace any other one.
+        window = self.child_window.get("review", None)
+        if window is not None:
+            if isinstance(window, ReviewWindow) and (
+                window.deck_name == deck_name
+            ):
+                window.show()
+                window.activateWindow()
+                return
+            window.close()
+
+        self.child_window["review"] = ReviewWindow(deck_name)
+        self.child_window["review"].closed.connect(
+            lambda: self._set_child_window_to_none("review")
+        )
+
+        # to avoid pyright error
+        if self.child_window["review"] is not None:
+            self.child_window["review"].show()
+
+    def _export_collection(self) -> None:
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export collection", "collection.zip", "Archives (*.zip)"
+        )
+        if path == "":
+            return
+
+        DBWorker.submit(
+            Archive.export_collection,
+            path,
+            on_result=lambda n: QMessageBox.information(
+                self, "Success", f"{n} problems have been exported."
+            ),
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The collection could not be exported: {e}"
+            ),
+        )
+
+    def _import_collection(self) -> None:
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import collection", "", "Archives (*.zip)"
+        )
+        if path == "":
+            return
+
+        DBWorker.submit(
+            Archive.import_collection,
+            path,
+            on_result=self._collection_imported,
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The collection could not be imported: {e}"
+            ),
+        )
+
+    def _collection_imported(self, n_added: int) -> None:
+        self._collection_replaced()
+        QMessageBox.information(
+            self, "Success", f"{n_added} problems have been imported."
+        )
+
+    def _collect_media_garbage(self) -> None:
+        """
+        Counts the unused media files in the background and, once the user
+        confirmed, deletes them.
+        """
+        DBWorker.submit(
+            MediaDB.collect_garbage,
+            True,
+            on_result=self._confirm_media_garbage,
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The media files could not be cleaned up: {e}"
+            ),
+        )
+
+    def _confirm_media_garbage(
+        self, unused: Tuple[int, int, List[str]]
+    ) -> None:
+        n_files, n_bytes, kept = unused
+        # files the store did not name may be used in ways it does not
+        # track: they are listed, never deleted.
+        kept_note = ""
+        if kept:
+            names = ", ".join(kept[:10]) + (", ..." if len(kept) > 10 else "")
+            kept_note = (
+                f"\n\n{len(kept)} other unused files were not added through "
+                f"{PROGRAM_NAME} and are kept: {names}"
+            )
+        if n_files == 0:
+            QMessageBox.information(
+                self,
+                "Information",
+                "There are no unused media files to delete." + kept_note,
+            )
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Confirmation",
+            f"{n_files} media files ({n_bytes / 2**20:.1f} MiB) are not "
+            "used by any problem. Delete them permanently?" + kept_note,
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No,
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        DBWorker.submit(
+            MediaDB.collect_garbage,
+            on_result=lambda freed: QMessageBox.information(
+                self,
+                "Success",
+                f"{freed[0]} unused media files ({freed[1] / 2**20:.1f} MiB) "
+                "have been deleted.",
+            ),
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The media files could not be cleaned up: {e}"
+            ),
+        )
+
+    def _create_backup(self) -> None:
+        DBWorker.submit(
+            Backup.create_backup,
+            on_result=lambda path: QMessageBox.information(
+                self,
+                "Success",
+                (
+                    f"The database has been backed up to '{path}'."
+                    if path is not None
+                    else "A backup is already running."
+                ),
+            ),
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The database could not be backed up: {e}"
+            ),
+        )
+
+    def _restore_backup(self) -> None:
+        path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Restore backup",
+            ProgramPaths.get_user_backups_dir(),
+            "Backups (*.db)",
+        )
+        if path == "":
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Confirmation",
+            "Replace the current collection with this backup? A backup of "
+            "the current collection is made first.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No,
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        DBWorker.submit(
+            Backup.restore_backup,
+            path,
+            on_result=lambda _: self._backup_restored(),
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The backup could not be restored: {e}"
+            ),
+        )
+
+    def _backup_restored(self) -> None:
+        self._collection_replaced()
+        QMessageBox.information(
+            self, "Success", "The backup has been restored."
+        )
+
+    def _update_window_title(self) -> None:
+        self.setWindowTitle(f"{PROGRAM_NAME} - {ProgramPaths.get_username()}")
+
+    def _populate_profile_menu(self) -> None:
+        self.profile_menu.clear()
+
+        current = ProgramPaths.get_username()
+        for username in ProgramPaths.get_list_of_users():
+            action = self.profile_menu.addAction(username)
+            action.setCheckable(True)
+            action.setChecked(username == current)
+            action.triggered.connect(
+                lambda _=False, name=username: self._switch_profile(name)
+            )
 
-    @override
-    def decks_updated_reciever(self) -> None:
-        self.decks_updated_emitter()
+        self.profile_menu.addSeparator()
+        self.profile_menu.addAction("New profile...", self._new_profile)
 
-    @override
-    def decks_updated_emitter(self) -> None:
-        for element in self.decks_updated_recievers:
-            element.decks_updated_reciever()
+    def _new_profile(self) -> None:
+        username, ok = QInputDialog.getText(
+            self, "New profile", "Name of the new profile:"
+        )
+        username = username.strip()
+        if not ok or username == "":
+            return
 
-        print(self.child_window.keys())
-        for element in self.child_window.values():
-            if element is not None and isinstance(element, DeckUpdReciever):
-                element.decks_updated_reciever()
+        if username in ProgramPaths.get_list_of_users():
+            QMessageBox.warning(
+                self, "Warning", f"The profile '{username}' already exists."
+            )
+            return
 
-    @override
-    def problems_updated_reciever(self) -> None:
-        self.problems_updated_emitter()
+        self._switch_profile(username)
 
-    @override
-    def problems_updated_emitter(self) -> None:
-        for element in self.problems_updated_recievers:
-            element.problems_updated_reciever()
+    def _switch_profile(self, username: str) -> None:
+        if username == ProgramPaths.get_username():
+            return
 
-    @override
-    def tags_updated_emitter(self) -> None:
-        for window in self.child_window.values():
-            if window is not None and isinstance(window, TagsUpdReciever):
-                window.tags_updated_reciever()
+        # the open windows show the current profile's data.
+        open_windows = [
+            window for window in self.child_window.values() if window
+        ]
+        if open_windows:
+            reply = QMessageBox.question(
+                self,
+                "Warning",
+                "There are active windows opened. "
+                + "Would you like to close them and discard any work?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No,
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            # a window may refuse to close (e.g. unsaved input the user
+            # chose to keep); the switch is abandoned then.
+            closed = [window.close() for window in open_windows]
+            if not all(closed):
+                return
+
+        DBWorker.submit(
+            switch_user,
+            username,
+            on_result=lambda _: self._profile_switched(),
+            on_error=lambda e: QMessageBox.critical(
+                self, "Error", f"The profile could not be opened: {e}"
+            ),
+        )
+
+    def _profile_switched(self) -> None:
+        self._update_window_title()
+        self._collection_replaced()
+
+    def _set_child_window_to_none(self, window_name: str) -> None:
+        self.child_window[f"{window_name}"] = None
 
-    @override
-    def tags_updated_reciever(self) -> None:
-        self.tags_updated_emitter()
+    def _collection_replaced(self) -> None:
+        Catalog.invalidate()
+        EventBus.publish(CollectionReplaced())
 
 
-def initializeGui():
+def initializeGui(preload: bool = True):
+    # QtWebEngine is imported after the QApplication is created; it needs
+    # OpenGL contexts shared from the start.
+    QCoreApplication.setAttribute(
+        Qt.ApplicationAttribute.AA_ShareOpenGLContexts
+    )
     app = QApplication()
-    window = MainWindow()
+    window = MainWindow(preload)
     window.show()
     app.exec()
@@ -0,0 +1,265 @@
+# QtWebEngine helpers, kept in a module of their own so that importing the
+# main window does not load the web engine: only the windows that show
+# problems import this module (see MainWindow._preload).
+
+import functools
+import hashlib
+import json
+from typing import Callable, Dict
+
+from PySide6.QtWebEngineCore import (
+    QWebEngineProfile,
+    QWebEngineUrlRequestInfo,
+    QWebEngineUrlRequestInterceptor,
+)
+from PySide6.QtWebEngineWidgets import QWebEngineView
+
+from db.math_cache import MathCache
+from ui.db_worker import DBWorker
+from utils.constants import MAIN_DIR, MATHJAX3_PATH
+
+# MathJax's configuration. The SVG output keeps its glyphs in each formula
+# (fontCache 'local') and the assistive MathML is left out, so a typeset
+# region is self-contained html that can be cached and shown again without
+# MathJax (see MathCache). Pages typeset their regions explicitly (see
+# RENDER_SCRIPT), hence no typesetting on startup.
+MATHJAX_CONFIG = {
+    "tex": {"inlineMath": {"[+]": [["$", "$"]]}},
+    "svg": {"fontCache": "local"},
+    "options": {"enableAssistiveMml": False},
+    "startup": {"typeset": False},
+}
+
+
+@functools.cache
+def mathjax_config_version() -> str:
+    """
+    Identifies the output of the bundled MathJax with MATHJAX_CONFIG in the
+    keys of the MathCache: a hash of the bundle's contents and of the
+    configuration, so upgrading MathJax in place or changing its
+    configuration invalidates the cached renders. The bundle is read once.
+    """
+    sha256 = hashlib.sha256()
+    with open(MAIN_DIR / MATHJAX3_PATH, "rb") as bundle:
+        while block := bundle.read(1 << 20):
+            sha256.update(block)
+    sha256.update(json.dumps(MATHJAX_CONFIG, sort_keys=True).encode())
+    return sha256.hexdigest()[:16]
+
+
+# the rules of MathJax's SVG stylesheet that typeset math relies on, for the
+# pages showing cached renders without loading MathJax.
+SVG_STYLE = """
+mjx-container[jax="SVG"] { direction: ltr; }
+mjx-container[jax="SVG"] > svg {
+  overflow: visible; min-height: 1px; min-width: 1px;
+}
+mjx-container[jax="SVG"] > svg a { fill: blue; stroke: blue; }
+mjx-container[jax="SVG"][display="true"] {
+  display: block; text-align: center; margin: 1em 0;
+}
+mjx-container[jax="SVG"][display="true"][width="full"] { display: flex; }
+mjx-container[jax="SVG"][justify="left"] { text-align: left; }
+mjx-container[jax="SVG"][justify="right"] { text-align: right; }
+g[data-mml-node="merror"] > g { fill: red; stroke: red; }
+g[data-mml-node="merror"] > rect[data-background] {
+  fill: yellow; stroke: none;
+}
+g[data-mml-node="mtable"] > line[data-line],
+svg[data-table] > g > line[data-line],
+g[data-mml-node="mtable"] > rect[data-frame],
+svg[data-table] > g > rect[data-frame] { stroke-width: 70px; fill: none; }
+g[data-mml-node="mtable"] > .mjx-dashed,
+svg[data-table] > g > .mjx-dashed { stroke-dasharray: 140; }
+g[data-mml-node="mtable"] > .mjx-dotted,
+svg[data-table] > g > .mjx-dotted {
+  stroke-linecap: round; stroke-dasharray: 0,140;
+}
+g[data-mml-node="mtable"] > g > svg { overflow: visible; }
+"""
+
+# typesetRegions typesets the elements of the page whose ids are the keys
+# of 'keys' and keeps their html, by key, for takeRendered; setRegions first
+# replaces the contents of regions. Typesetting calls are chained, as
+# MathJax requires, and the title is set to 'stamp' once they are done, so
+# the view can tell when the page is typeset (see store_rendered).
+RENDER_SCRIPT = """
+var renderQueue = null;
+var rendered = {};
+function typesetRegions(keys, stamp) {
+  renderQueue = (renderQueue || MathJax.startup.promise)
+    .then(function () {
+      var elements = [];
+      for (var id in keys) {
+        elements.push(document.getElementById(id));
+      }
+      return MathJax.typesetPromise(elements);
+    })
+    .then(function () {
+      for (var id in keys) {
+        rendered[keys[id]] = document.getElementById(id).innerHTML;
+      }
+    })
+    .catch(function (error) {
+      console.log(error.message);
+    })
+    .then(function () {
+      document.title = stamp;
+    });
+}
+function setRegions(regions, keys, stamp) {
+  renderQueue = (renderQueue || MathJax.startup.promise).then(function () {
+    for (var id in regions) {
+      var element = document.getElementById(id);
+      MathJax.typesetClear([element]);
+      element.innerHTML = regions[id];
+    }
+  });
+  typesetRegions(keys, stamp);
+}
+function takeRendered() {
+  var taken = rendered;
+  rendered = {};
+  return taken;
+}
+"""
+# prefix of the titles set by RENDER_SCRIPT.
+RENDERED_TITLE = "rendered-"
+
+
+def mathjax_html(body: str, load_mathjax: bool = True) -> str:
+    """
+    Returns a complete HTML document with 'body' as its body and, if
+    'load_mathjax', MathJax loaded from the bundled copy (with $...$ enabled
+    for inline math) along with RENDER_SCRIPT. Nothing is typeset until the
+    page calls typesetRegions or setRegions.
+    """
+    html_header: str = f"<head>\n<style>{SVG_STYLE}</style>\n"
+    if load_mathjax:
+        html_header += (
+            f"<script>MathJax = {json.dumps(MATHJAX_CONFIG)};</script>\n"
+            f'<script src="file://{MAIN_DIR}/{MATHJAX3_PATH}"></script>\n'
+            f"<script>{RENDER_SCRIPT}</script>\n"
+        )
+    html_header += "</head>"
+
+    return (
+        f"<!DOCTYPE html>\n<html>\n{html_header}\n"
+        f"<body>\n{body}\n</body>\n</html>"
+    )
+
+
+def render_key(source: str) -> bytes:
+    """
+    Returns the MathCache key of the render of 'source' by the bundled
+    MathJax.
+    """
+    return MathCache.key(source, mathjax_config_version())
+
+
+def problem_html(
+    question: str,
+    answer: str,
+    cached: Dict[bytes, str],
+    answer_hidden: bool = False,
+) -> str:
+    """
+    Returns the page of a problem: its 'question', then its 'answer' (in an
+    element with id 'answer-block', laid out but invisible if
+    'answer_hidden'). Regions whose render is in 'cached' (see render_key)
+    are shown as they are; the others are typeset once the page is loaded
+    and their renders kept for take_rendered. MathJax is not loaded at all
+    if every region is cached.
+    """
+    regions: Dict[str, str] = {}
+    keys: Dict[str, str] = {}
+    for region, source in (("question", question), ("answer", answer)):
+        key = render_key(source)
+        if source.strip() == "" or key in cached:
+            regions[region] = cached.get(key, source)
+        else:
+            regions[region] = source
+            keys[region] = key.hex()
+
+    visibility = ' style="visibility: hidden"' if answer_hidden else ""
+    body = (
+        f'<div id="question">{regions["question"]}</div>\n'
+        f'<div id="answer-block"{visibility}>\n<hr>\n'
+        f'<div id="answer">{regions["answer"]}</div>\n</div>'
+    )
+    if keys:
+        body += (
+            f"\n<script>typesetRegions({json.dumps(keys)}, "
+            f"'{RENDERED_TITLE}0');</script>"
+        )
+    return mathjax_html(body, load_mathjax=bool(keys))
+
+
+def take_rendered(
+    view: QWebEngineView, on_rendered: Callable[[Dict[bytes, str]], None]
+) -> None:
+    """
+    Calls 'on_rendered' with the regions typeset by the page of 'view' since
+    the last call, by render key (see render_key).
+    """
+    page = view.page()
+    if page is not None:
+        page.runJavaScript(
+            "takeRendered();",
+            0,
+            lambda rendered: on_rendered(
+                {
+                    bytes.fromhex(key): html
+                    for key, html in (rendered or {}).items()
+                }
+            ),
+        )
+
+
+def store_renders(renders: Dict[bytes, str]) -> None:
+    """
+    Adds 'renders' (by render key) to the MathCache, in the background.
+    """
+    if renders:
+        DBWorker.submit(
+            MathCache.put_many,
+            list(renders.items()),
+            on_error=lambda e: print(f"Failed to cache renders: {e}"),
+        )
+
+
+def store_rendered(view: QWebEngineView) -> None:
+    """
+    Adds the regions typeset by the page of 'view' since the last call to
+    the MathCache, in the background.
+    """
+    take_rendered(view, store_renders)
+
+
+class NoInternetProfile(QWebEngineProfile):
+    """
+    Custom QWebEngineProfile object that returns one with the default profile
+    (off-the-record) and with internet access blocked.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        self.defaultProfile()
+        self.interceptor = self.BlockedRequestInterceptor()
+        self.setUrlRequestInterceptor(self.interceptor)
+
+    class BlockedRequestInterceptor(QWebEngineUrlRequestInterceptor):
+        """
+        Custom class of QWebEngineUrlRequestInterceptor that sets a
+        QWebEngineProfile to block any access to internet.
+        """
+
+        def interceptRequest(self, info: QWebEngineUrlRequestInfo):
+            url = info.requestUrl()
+            if url.scheme() in ["file", "data"]:
+                # Allow local files and local data
+                info.block(False)
+            else:
+                # Block all requests
+                info.block(True)
@@ -1,14 +1,27 @@
-from PySide6.QtCore import QUrl
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 from .program_paths import ProgramPaths
 from pathlib import Path
 
+if TYPE_CHECKING:
+    from PySide6.QtCore import QUrl
+
 # General
 PROGRAM_NAME = "Maths Problems"
 MAIN_DIR = Path(__file__).resolve().parent.parent
 
 # Mathjax paths
 MATHJAX4_PATH = "lib/mathjax4/tex-mml-chtml.js"
-MATHJAX3_PATH = "lib/mathjax3/es5/tex-mml-chtml.js"
+MATHJAX3_PATH = "lib/mathjax3/es5/tex-mml-svg.js"
+
 
 # QtWebEngineView
-USER_MEDIA_QURL: QUrl = QUrl.fromLocalFile(ProgramPaths.get_user_media_dir())
\ No newline at end of file
+def user_media_qurl() -> QUrl:
+    """
+    Base URL of the current user's media, for the HTML of problems. Read on
+    each use, as the current user can change (see db.db.switch_user).
+    """
+    from PySide6.QtCore import QUrl
+
+    return QUrl.fromLocalFile(ProgramPaths.get_user_media_dir())
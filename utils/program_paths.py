@@ -1,15 +1,63 @@
 from pathlib import Path
+import re
 import sys
 import os
 
+# profile used when none has been selected yet.
+DEFAULT_USERNAME = "user0"
+# file, in the program dir, that remembers the last selected profile.
+LAST_USER_FILE = "last_user"
+
+_USERNAME_RE = re.compile(r"[\w\- ]+")
+
+
+class UserProfile:
+    """
+    Resolved paths of a user's profile. Directories are created once, when
+    the profile is resolved, so reading the paths never touches the
+    filesystem.
+    """
+
+    __slots__ = (
+        "name",
+        "user_dir",
+        "db_path",
+        "math_cache_path",
+        "media_dir",
+        "backups_dir",
+    )
+
+    def __init__(self, program_dir: str, name: str):
+        self.name = name
+        self.user_dir = os.path.join(program_dir, name)
+        self.db_path = os.path.join(self.user_dir, name + ".db")
+        self.math_cache_path = os.path.join(self.user_dir, "math_cache.db")
+        self.media_dir = self.user_dir + "/media/"
+        self.backups_dir = self.user_dir + "/backups/"
+
+        for path in (self.user_dir, self.media_dir, self.backups_dir):
+            os.makedirs(path, exist_ok=True)
+
 
 class ProgramPaths:
+    """
+    Paths of the program's data. The current user's profile is resolved on
+    first use (the last selected profile, or DEFAULT_USERNAME) and cached
+    for the rest of the process; ProgramPaths.select_user switches it.
+    """
+
+    _program_dir: str | None = None
+    _profile: UserProfile | None = None
+
     @staticmethod
     def get_program_dir() -> str:
         """
         Returns the program data folder's path as a string object. It depends
         on the OS on top of which the program is running.
         """
+        if ProgramPaths._program_dir is not None:
+            return ProgramPaths._program_dir
+
         match sys.platform:
             case "win32":
                 raise Exception(
@@ -20,7 +68,10 @@ class ProgramPaths:
                     "The program has not been implemented for macOS yet!"
                 )
             case "linux":
-                return os.path.join(Path.home(), ".local/share/maths_problems")
+                ProgramPaths._program_dir = os.path.join(
+                    Path.home(), ".local/share/maths_problems"
+                )
+                return ProgramPaths._program_dir
             case _:
                 raise Exception(
                     "The program doesn't support the '"
@@ -31,73 +82,96 @@ class ProgramPaths:
     @staticmethod
     def get_list_of_users() -> list[str]:
         """
-        Returns a list containing all existing users in current system.
-        It checks directories under ../maths_problems/, each one corresponding to
-        user.
+        Returns a sorted list containing all existing users in current
+        system. It checks directories under ../maths_problems/, each one
+        corresponding to user.
         """
-        users: list[str] = os.listdir(ProgramPaths.get_program_dir())
+        program_dir = ProgramPaths.get_program_dir()
+        if not os.path.isdir(program_dir):
+            return []
 
         users_final: list[str] = []
 
-        for item in users:
-            if os.path.isdir(
-                os.path.join(ProgramPaths.get_program_dir(), item)
-            ):
+        for item in os.listdir(program_dir):
+            if os.path.isdir(os.path.join(program_dir, item)):
                 users_final.append(item)
 
-        return users_final
+        return sorted(users_final)
 
     @staticmethod
-    def get_username() -> str:
+    def get_profile() -> UserProfile:
         """
-        Returns a string containing the current user's name.
+        Returns the current user's profile, resolving it on first use.
         """
-        # TODO
-        return "user0"
+        if ProgramPaths._profile is None:
+            ProgramPaths._profile = UserProfile(
+                ProgramPaths.get_program_dir(),
+                ProgramPaths._last_username(),
+            )
+        return ProgramPaths._profile
 
     @staticmethod
-    def get_user_dir() -> str:
+    def select_user(username: str, remember: bool = True) -> UserProfile:
         """
-        Returns the current directory of user's data.
-        If there is no directory, it will be created.
-        It creates the user's media directory if it doesn't exists.
+        Makes 'username' the current user (creating its profile if it does
+        not exist) and, if 'remember', selects it again on the next start.
+        Open database connections are not touched: see db.db.switch_user.
         """
-        user_path: str = os.path.join(
-            ProgramPaths.get_program_dir(), ProgramPaths.get_username()
+        username = username.strip()
+        if not _USERNAME_RE.fullmatch(username):
+            raise Exception(
+                f"Invalid profile name '{username}': use letters, digits, "
+                "spaces, '-' and '_' only."
+            )
+
+        ProgramPaths._profile = UserProfile(
+            ProgramPaths.get_program_dir(), username
         )
-        user_media_path: str = user_path + "/media/"
-        # print("user_dir_path ", user_path)
-        # print("user_media_path: ", user_media_path)
+        if remember:
+            with open(
+                os.path.join(ProgramPaths.get_program_dir(), LAST_USER_FILE),
+                "w",
+            ) as file:
+                file.write(username)
 
-        if not os.path.exists(user_path):
-            os.makedirs(user_path)
+        return ProgramPaths._profile
 
-        if not os.path.exists(os.path.join(user_media_path)):
-            # print(user_media_path, "doesn't exists!")
-            os.makedirs(user_media_path)
+    @staticmethod
+    def get_username() -> str:
+        """
+        Returns a string containing the current user's name.
+        """
+        return ProgramPaths.get_profile().name
 
-        return os.path.join(user_path)
+    @staticmethod
+    def get_user_dir() -> str:
+        """
+        Returns the current directory of user's data. It and the user's media
+        directory are created when the profile is resolved.
+        """
+        return ProgramPaths.get_profile().user_dir
 
     @staticmethod
     def user_db_exists(path: str) -> bool:
         """
         Returns True if there is a database for the current user, otherwise False.
         """
-        return os.path.exists(
-            os.path.join(
-                ProgramPaths.get_user_dir(),
-                ProgramPaths.get_username() + ".db",
-            )
-        )
+        return os.path.exists(ProgramPaths.get_user_db_path())
 
     @staticmethod
     def get_user_db_path() -> str:
         """
         Returns the path for the current user's database.
         """
-        return os.path.join(
-            ProgramPaths.get_user_dir(), ProgramPaths.get_username() + ".db"
-        )
+        return ProgramPaths.get_profile().db_path
+
+    @staticmethod
+    def get_user_math_cache_path() -> str:
+        """
+        Returns the path for the current user's cache of typeset math (see
+        db/math_cache.py).
+        """
+        return ProgramPaths.get_profile().math_cache_path
 
     @staticmethod
     def get_user_media_dir() -> str:
@@ -105,4 +179,31 @@ class ProgramPaths:
         Returns the path for the current user's media directory with a
         trailing '/'.
         """
-        return ProgramPaths.get_user_dir() + "/media/"
+        return ProgramPaths.get_profile().media_dir
+
+    @staticmethod
+    def get_user_backups_dir() -> str:
+        """
+        Returns the path for the current user's backups directory with a
+        trailing '/'.
+        """
+        return ProgramPaths.get_profile().backups_dir
+
+    @staticmethod
+    def _last_username() -> str:
+        """
+        Returns the last selected user, if it still exists, or
+        DEFAULT_USERNAME.
+        """
+        program_dir = ProgramPaths.get_program_dir()
+        try:
+            with open(os.path.join(program_dir, LAST_USER_FILE)) as file:
+                username = file.read().strip()
+        except OSError:
+            return DEFAULT_USERNAME
+
+        if _USERNAME_RE.fullmatch(username) and os.path.isdir(
+            os.path.join(program_dir, username)
+        ):
+            return username
+        return DEFAULT_USERNAME